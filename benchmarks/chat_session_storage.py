@@ -0,0 +1,189 @@
+"""
+Checks that each ChatSessionStorage backend behaves the same, then measures
+append and read throughput with many concurrent sessions.
+
+    uv run -m benchmarks.chat_session_storage --sessions 200 --messages 50
+
+The mem and sqlite backends always run (sqlite on a temporary file). Pass
+--redis-host to include Redis; the benchmark only touches keys of the
+sessions it creates, but they are left behind, so use a scratch database.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from typing import Callable, Dict, List
+
+from src.config.config import RedisConfig, SqliteConfig
+from src.repository.chat_session import ChatSessionStorage, Record
+from src.repository.mem_chat_session_storage import MemChatSessionStorage
+from src.repository.redis_chat_session_storage import RedisChatSessionStorage
+from src.repository.redis_client import close_connection_pools
+from src.repository.sqlite_chat_session_storage import SqliteChatSessionStorage
+
+
+def _check(condition: bool, message: str) -> None:
+    if not condition:
+        raise AssertionError(message)
+
+
+async def check_conformance(storage: ChatSessionStorage) -> None:
+    session_id = f"conformance-{uuid.uuid4().hex}"
+
+    created = await storage.create_session(session_id, "system prompt")
+    _check(
+        [r.message for r in created.history] == ["system prompt"],
+        "a new session holds only its system prompt",
+    )
+    again = await storage.create_session(session_id, "another prompt")
+    _check(
+        [r.message for r in again.history] == ["system prompt"],
+        "creating an existing session keeps its history",
+    )
+
+    for i in range(3):
+        updated = await storage.add_message(
+            session_id, Record(user_id="42", role="user", message=f"m{i}")
+        )
+        _check(len(updated.history) == i + 2, "add_message returns the full history")
+    _check(updated.history[-1].user_id == "42", "user IDs round-trip as strings")
+    _check(
+        await storage.add_message(
+            f"missing-{uuid.uuid4().hex}", Record("42", "user", "x")
+        )
+        is None,
+        "add_message to an unknown session returns None",
+    )
+
+    await storage.set_summary(
+        session_id, Record(user_id="bot", role="assistant", message="summary"), 2
+    )
+    fetched = await storage.get_session(session_id)
+    _check(
+        [r.message for r in fetched.history] == ["system prompt", "m0", "m1", "m2"],
+        "get_session returns the history in order",
+    )
+    _check(
+        fetched.summary is not None
+        and fetched.summary.message == "summary"
+        and fetched.summary_until == 2,
+        "get_session returns the summary",
+    )
+    _check(
+        await storage.get_session(f"missing-{uuid.uuid4().hex}") is None,
+        "get_session of an unknown session returns None",
+    )
+
+    # Concurrent appends to one session must neither lose nor duplicate records.
+    await asyncio.gather(
+        *(
+            storage.add_message(session_id, Record("42", "user", f"c{i}"))
+            for i in range(20)
+        )
+    )
+    fetched = await storage.get_session(session_id)
+    _check(len(fetched.history) == 24, "concurrent appends are all kept once")
+
+    _check(
+        session_id in [s async for s in storage.scan_session_ids()],
+        "scan_session_ids lists the session",
+    )
+    infos = {info.id: info async for info in storage.list_sessions()}
+    _check(
+        session_id in infos and infos[session_id].length == 24,
+        "list_sessions lists the session with its length",
+    )
+    exported = {str(s.id): s async for s in storage.get_all_sessions()}
+    _check(
+        session_id in exported and len(exported[session_id].history) == 24,
+        "get_all_sessions yields the session with its history",
+    )
+    async for first in storage.watch_created_sessions():
+        _check(first is None, "the created-session feed starts with None")
+        break
+
+
+async def measure(
+    storage: ChatSessionStorage, sessions: int, messages: int
+) -> Dict[str, float]:
+    prefix = uuid.uuid4().hex
+    session_ids = [f"bench-{prefix}-{i}" for i in range(sessions)]
+    await asyncio.gather(*(storage.create_session(s, "system") for s in session_ids))
+
+    async def converse(session_id: str) -> None:
+        for i in range(messages):
+            await storage.add_message(
+                session_id, Record("42", "user", f"message {i} " * 20)
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*(converse(s) for s in session_ids))
+    append_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(storage.get_session(s) for s in session_ids))
+    read_seconds = time.perf_counter() - start
+
+    return {
+        "appends/s": sessions * messages / append_seconds,
+        "reads/s": sessions / read_seconds,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    tmp = tempfile.mkdtemp()
+    backends: List[tuple[str, Callable[[], ChatSessionStorage]]] = [
+        ("mem", MemChatSessionStorage),
+        (
+            "sqlite",
+            lambda: SqliteChatSessionStorage(
+                SqliteConfig(path=os.path.join(tmp, "bench.db"))
+            ),
+        ),
+    ]
+    if args.redis_host:
+        backends.append(
+            (
+                "redis",
+                lambda: RedisChatSessionStorage(
+                    RedisConfig(
+                        host=args.redis_host,
+                        port=args.redis_port,
+                        password=None,
+                        db=args.redis_db,
+                        max_connections=64,
+                    )
+                ),
+            )
+        )
+
+    for name, create in backends:
+        storage = create()
+        try:
+            await check_conformance(storage)
+            results = await measure(storage, args.sessions, args.messages)
+        finally:
+            await storage.close()
+        print(
+            f"{name:>7}: conformant, "
+            + ", ".join(f"{v:>9.0f} {k}" for k, v in results.items())
+        )
+
+    await close_connection_pools()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--redis-host")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--redis-db", type=int, default=15)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Measures how long the bot takes from a cold process to serving messages, with
+only OpenAI, only Gemini or both providers enabled.
+
+Each run starts the real `src.main` in a fresh process and a temporary
+directory, with an mcp.json that spawns benchmarks.fake_mcp_server. Discord
+is never contacted: logging in and connecting to the gateway each sleep for
+half of --gateway-latency seconds. The startup phases come from the
+startup_phase_seconds histogram, and "ready" is the wall time from spawning
+the process until both the gateway and the MCP servers are up.
+
+    uv run -m benchmarks.cold_start --runs 5 --mcp-servers 2
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import yaml
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PROVIDERS = {
+    "openai": ["openai"],
+    "gemini": ["gemini"],
+    "both": ["openai", "gemini"],
+}
+_PHASES = ("import", "config", "agents", "mcp", "gateway")
+
+
+def write_config(directory: str, providers: List[str], mcp_servers: int) -> None:
+    llm = {"agentName": "bench", "systemPrompt": "You are a benchmark."}
+    if "openai" in providers:
+        llm["openai"] = {
+            "apiKey": "sk-bench",
+            "model": "gpt-4.1-mini",
+            "chatHistory": {"storage": "mem"},
+        }
+    if "gemini" in providers:
+        llm["gemini"] = {"apiKey": "bench", "model": "gemini-2.0-flash"}
+
+    with open(os.path.join(directory, "config.yaml"), "w") as f:
+        yaml.safe_dump(
+            {
+                "discord": {"botToken": "bench", "guilds": []},
+                "llm": llm,
+                "tracing": {"enabled": False},
+            },
+            f,
+        )
+    with open(os.path.join(directory, "mcp.json"), "w") as f:
+        json.dump(
+            {
+                "servers": {
+                    f"fake-{i}": {
+                        "command": sys.executable,
+                        "args": ["-m", "benchmarks.fake_mcp_server"],
+                        "env": {"PYTHONPATH": _REPO_ROOT},
+                    }
+                    for i in range(mcp_servers)
+                }
+            },
+            f,
+        )
+
+
+def simulate_gateway(latency: float) -> None:
+    import discord
+
+    async def static_login(self, token: str) -> dict:
+        await asyncio.sleep(latency / 2)
+        return {"id": "1", "username": "bench", "discriminator": "0", "avatar": None}
+
+    async def connect(self, *, reconnect: bool = True) -> None:
+        await asyncio.sleep(latency / 2)
+        self._ready.set()
+        # Holds the connection open until the bot shuts down.
+        await asyncio.Event().wait()
+
+    discord.http.HTTPClient.static_login = static_login
+    discord.Client.connect = connect
+
+
+async def serve_until_ready(bot_main, timeout: float) -> Dict[str, float]:
+    from src.metrics import registry
+
+    startup_phase = registry.histogram(
+        "startup_phase_seconds", "", label_names=("phase",)
+    )
+
+    def phase_seconds() -> Dict[str, float]:
+        return {key[0]: totals[0] for key, (_, totals) in startup_phase.values.items()}
+
+    task = asyncio.create_task(bot_main.main())
+    deadline = time.perf_counter() + timeout
+    while not {"mcp", "gateway"} <= phase_seconds().keys():
+        if task.done() or time.perf_counter() > deadline:
+            raise RuntimeError(f"Bot did not start, phases seen: {phase_seconds()}")
+        await asyncio.sleep(0.005)
+    phases = phase_seconds()
+
+    task.cancel()
+    await task
+    return phases
+
+
+def run_child(args: argparse.Namespace) -> None:
+    start = time.perf_counter()
+    bot_main = importlib.import_module("src.main")
+    import_seconds = time.perf_counter() - start
+
+    simulate_gateway(args.gateway_latency)
+    phases = asyncio.run(serve_until_ready(bot_main, args.timeout))
+    # The parent times "ready" by when this line arrives.
+    print(json.dumps({"import": import_seconds, **phases}), flush=True)
+
+
+def run_once(args: argparse.Namespace, providers: List[str]) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        write_config(directory, providers, args.mcp_servers)
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.cold_start",
+                "--child",
+                f"--gateway-latency={args.gateway_latency}",
+                f"--timeout={args.timeout}",
+            ],
+            cwd=directory,
+            env={**os.environ, "PYTHONPATH": _REPO_ROOT},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        line = process.stdout.readline()
+        ready = time.perf_counter() - start
+        process.wait()
+        if not line:
+            raise RuntimeError(f"Bot with {providers} exited with {process.returncode}")
+        return {**json.loads(line), "ready": ready}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mcp-servers", type=int, default=2)
+    parser.add_argument(
+        "--gateway-latency", type=float, default=1.0, help="seconds to log in and connect"
+    )
+    parser.add_argument("--providers", choices=_PROVIDERS, action="append")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    print(f"{'':>8}" + "".join(f"{p:>9}" for p in (*_PHASES, "ready")) + "  (s, median)")
+    for name in args.providers or _PROVIDERS:
+        runs = [run_once(args, _PROVIDERS[name]) for _ in range(args.runs)]
+        print(
+            f"{name:>8}"
+            + "".join(
+                f"{statistics.median(run.get(p, 0.0) for run in runs):>9.2f}"
+                for p in (*_PHASES, "ready")
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
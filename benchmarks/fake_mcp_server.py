@@ -0,0 +1,28 @@
+"""
+Minimal stdio MCP server for the offline benchmarks.
+
+    python -m benchmarks.fake_mcp_server
+"""
+
+import time
+
+from mcp.server.fastmcp import FastMCP
+
+server = FastMCP("fake", log_level="WARNING")
+
+
+@server.tool()
+def echo(text: str) -> str:
+    """Returns the given text."""
+    return text
+
+
+@server.tool()
+def sleep(seconds: float) -> str:
+    """Blocks for the given number of seconds, like a slow tool would."""
+    time.sleep(seconds)
+    return "done"
+
+
+if __name__ == "__main__":
+    server.run()
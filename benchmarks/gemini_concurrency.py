@@ -0,0 +1,91 @@
+"""
+Shows that concurrent Gemini conversations overlap instead of queueing behind
+each other on the event loop.
+
+The Gemini model is replaced by a fake that answers after a fixed latency, so
+the benchmark runs offline:
+
+    uv run -m benchmarks.gemini_concurrency --sessions 16 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import time
+from typing import AsyncGenerator
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+
+from src.config.config import (
+    Config,
+    DiscordConfig,
+    GeminiConfig,
+    LLMConfig,
+    StreamingConfig,
+)
+from src.llm.gemini import GeminiAgent
+
+
+class FakeGeminiLlm(BaseLlm):
+    latency: float = 0.5
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(self.latency)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text="pong")])
+        )
+
+
+def build_agent(latency: float) -> GeminiAgent:
+    config = Config(
+        discord=DiscordConfig(bot_token=None, guilds=[], streaming=StreamingConfig()),
+        llm=LLMConfig(
+            openai=None,
+            gemini=GeminiConfig(api_key="offline", model="fake-gemini"),
+            agent_name="benchmark",
+            system_prompt="",
+        ),
+    )
+    agent = GeminiAgent(config=config, mcp_server_manager=None)
+    agent._agent.model = FakeGeminiLlm(model="fake-gemini", latency=latency)
+    return agent
+
+
+async def run(sessions: int, latency: float) -> None:
+    agent = build_agent(latency)
+    for i in range(sessions):
+        await agent.start_new_chat_session(session_id=f"session-{i}")
+
+    start = time.perf_counter()
+    await agent.send_message(message="ping", user_id="user", session_id="session-0")
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            agent.send_message(message="ping", user_id="user", session_id=f"session-{i}")
+            for i in range(sessions)
+        )
+    )
+    concurrent = time.perf_counter() - start
+
+    print(f"model latency:          {latency:.3f}s")
+    print(f"single session:         {single:.3f}s")
+    print(f"{sessions} concurrent sessions: {concurrent:.3f}s")
+    print(f"serialised would take:  {single * sessions:.3f}s")
+    print(f"overlap factor:         {single * sessions / concurrent:.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    asyncio.run(run(sessions=args.sessions, latency=args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+End-to-end load benchmark of the Discord handlers.
+
+Synthetic messages and slash command interactions are fed to the real
+DiscordEventHandler and DiscordSlashCommandHandler. The LLMs are stubs with
+configurable latency and output, each turn calls a tool on a fake stdio MCP
+server, and the history goes to an in-process storage (or Redis with
+--storage redis). Everything runs offline:
+
+    uv run -m benchmarks.load --concurrency 1,8,32 --messages 20 --latency 0.2
+
+For each concurrency level it reports the p50/p95/p99 latency of the
+handlers and of a whole turn (message received to reply sent), the
+throughput in turns per second, and the lag of the event loop.
+"""
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import sys
+import tempfile
+import time
+from typing import AsyncIterator, List
+
+import discord
+
+from src.config.config import (
+    ChatHistoryConfig,
+    Config,
+    DiscordConfig,
+    LLMConfig,
+    MemStorageConfig,
+    RedisConfig,
+    SchedulerConfig,
+    SessionCacheConfig,
+    SessionLifecycleConfig,
+    SqliteConfig,
+    StreamingConfig,
+    WriteBehindConfig,
+)
+from src.discord.event_handler import DiscordEventHandler
+from src.discord.slash_command_handler import DiscordSlashCommandHandler
+from src.llm.llm import LLMInteractor
+from src.llm.mcp_server import MCPServerManager
+from src.repository.chat_session import ChatSessionStorage, Record
+from src.repository.redis_client import close_connection_pools
+from src.repository.storage_factory import create_chat_session_storage
+
+GUILD_ID = 1
+_ids = itertools.count(1000)
+
+
+class StubAgent(LLMInteractor):
+    """
+    Answers after a fixed latency with a fixed number of tokens, keeping the
+    history in a real storage and calling a tool on every turn.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        storage: ChatSessionStorage,
+        mcp_server_manager: MCPServerManager | None,
+        latency: float,
+        tokens: int,
+    ):
+        self._name = name
+        self._storage = storage
+        self._mcp_server_manager = mcp_server_manager
+        self._latency = latency
+        self._tokens = tokens
+        self._session_ids = set()
+
+    async def start_new_chat_session(self, session_id: str) -> None:
+        await self._storage.create_session(session_id=session_id, system_prompt=None)
+        self._session_ids.add(session_id)
+
+    async def send_message(self, message: str, user_id: str, session_id: str) -> str:
+        chunks = self.stream_message(
+            message=message, user_id=user_id, session_id=session_id
+        )
+        return "".join([chunk async for chunk in chunks])
+
+    async def stream_message(
+        self, message: str, user_id: str, session_id: str
+    ) -> AsyncIterator[str]:
+        chat_session = await self._storage.add_message(
+            session_id, Record(user_id=user_id, role="user", message=message)
+        )
+        if chat_session is None:
+            raise ValueError(f"Unknown session ID: {session_id}")
+
+        if self._mcp_server_manager is not None:
+            for server in self._mcp_server_manager.get():
+                await server.call_tool("echo", {"text": message})
+
+        # Spread the latency over the tokens, like a streaming model would.
+        delay = self._latency / max(self._tokens, 1)
+        chunks = []
+        for i in range(self._tokens):
+            await asyncio.sleep(delay)
+            chunks.append(f"tok{i} ")
+            yield chunks[-1]
+
+        await self._storage.add_message(
+            session_id, Record(user_id="bot", role="assistant", message="".join(chunks))
+        )
+
+    def get_name(self) -> str:
+        return self._name
+
+    async def is_known_chat_session(self, session_id: str) -> bool:
+        return session_id in self._session_ids
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.bot = False
+        self.guild_permissions = discord.Permissions(administrator=True)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+
+
+class FakeChannel:
+    """
+    Channel or thread that records when the bot replies, after an optional
+    simulated Discord API latency.
+    """
+
+    def __init__(self, api_latency: float, channel_type=discord.ChannelType.text):
+        self.id = next(_ids)
+        self.type = channel_type
+        self._api_latency = api_latency
+        self.replied = asyncio.Event()
+        self.messages: List[str] = []
+
+    async def send(self, content: str = None, **kwargs):
+        await asyncio.sleep(self._api_latency)
+        self.messages.append(content)
+        self.replied.set()
+        return FakeMessage(self, FakeUser(0), content or "", self._api_latency)
+
+    async def trigger_typing(self):
+        await asyncio.sleep(self._api_latency)
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content: str, api_latency: float):
+        self.id = next(_ids)
+        self.channel = channel
+        self.author = author
+        self.guild = FakeGuild(GUILD_ID)
+        self.content = content
+        self.thread: FakeChannel | None = None
+        self._api_latency = api_latency
+
+    async def reply(self, content: str = None, **kwargs):
+        # Queue notices are replies; they do not count as the bot's answer.
+        await asyncio.sleep(self._api_latency)
+        return FakeMessage(self.channel, FakeUser(0), content or "", self._api_latency)
+
+    async def edit(self, content: str = None, **kwargs):
+        await asyncio.sleep(self._api_latency)
+        self.content = content
+        return self
+
+    async def create_thread(self, name: str, auto_archive_duration: int = 60):
+        await asyncio.sleep(self._api_latency)
+        self.thread = FakeChannel(self._api_latency, discord.ChannelType.public_thread)
+        return self.thread
+
+
+class FakeInteraction:
+    def __init__(self, channel: FakeChannel, api_latency: float):
+        self._channel = channel
+        self._api_latency = api_latency
+        self.message: FakeMessage | None = None
+
+    async def respond(self, content: str = None, **kwargs):
+        await asyncio.sleep(self._api_latency)
+        self.message = FakeMessage(
+            self._channel, FakeUser(0), content, self._api_latency
+        )
+        return FakeInteractionResponse(self.message)
+
+
+class FakeInteractionResponse:
+    def __init__(self, message: FakeMessage):
+        self._message = message
+
+    async def original_response(self) -> FakeMessage:
+        return self._message
+
+
+class FakeApplicationContext:
+    def __init__(self, api_latency: float):
+        self.guild = FakeGuild(GUILD_ID)
+        self.author = FakeUser(next(_ids))
+        self.channel = FakeChannel(api_latency)
+        self.interaction = FakeInteraction(self.channel, api_latency)
+
+    async def respond(self, content: str = None, **kwargs):
+        return await self.interaction.respond(content, **kwargs)
+
+
+class LoopLagMonitor:
+    """
+    Measures how late a periodic timer fires, which is how long the event
+    loop was blocked or saturated.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self._interval = interval
+        self.samples: List[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self._interval)
+            self.samples.append(time.perf_counter() - start - self._interval)
+
+    def __enter__(self) -> "LoopLagMonitor":
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._task.cancel()
+
+
+def percentiles(samples: List[float]) -> str:
+    if len(samples) < 2:
+        return "n/a"
+    q = statistics.quantiles(samples, n=100, method="inclusive")
+    return f"p50 {q[49] * 1000:7.1f}ms  p95 {q[94] * 1000:7.1f}ms  p99 {q[98] * 1000:7.1f}ms"
+
+
+def build_chat_history(args: argparse.Namespace, tmp: str) -> ChatHistoryConfig:
+    return ChatHistoryConfig(
+        storage=args.storage,
+        redis=RedisConfig(
+            host=args.redis_host,
+            port=args.redis_port,
+            password=None,
+            db=args.redis_db,
+            max_connections=64,
+        )
+        if args.storage == "redis"
+        else None,
+        sqlite=SqliteConfig(path=f"{tmp}/load.db") if args.storage == "sqlite" else None,
+        cache=SessionCacheConfig(),
+        mem=MemStorageConfig(),
+        lifecycle=SessionLifecycleConfig(idle_ttl_seconds=3600, archive_path=None),
+        write_behind=WriteBehindConfig(enabled=args.write_behind),
+    )
+
+
+async def run_level(
+    concurrency: int,
+    args: argparse.Namespace,
+    chat_handler,
+    command,
+) -> None:
+    command_latency: List[float] = []
+    dispatch_latency: List[float] = []
+    turn_latency: List[float] = []
+
+    async def conversation() -> None:
+        ctx = FakeApplicationContext(args.api_latency)
+        start = time.perf_counter()
+        await command.callback(ctx)
+        command_latency.append(time.perf_counter() - start)
+
+        # The session lives in the thread the command created.
+        thread = ctx.interaction.message.thread
+        for i in range(args.messages):
+            thread.replied.clear()
+            message = FakeMessage(
+                thread, FakeUser(next(_ids)), f"message {i}", args.api_latency
+            )
+            start = time.perf_counter()
+            await chat_handler(message)
+            dispatch_latency.append(time.perf_counter() - start)
+            await thread.replied.wait()
+            turn_latency.append(time.perf_counter() - start)
+
+    with LoopLagMonitor() as lag:
+        start = time.perf_counter()
+        await asyncio.gather(*(conversation() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    print(f"concurrency {concurrency}: {len(turn_latency) / elapsed:.1f} turns/s")
+    print(f"  /chat command   {percentiles(command_latency)}")
+    print(f"  on_message      {percentiles(dispatch_latency)}")
+    print(f"  turn            {percentiles(turn_latency)}")
+    print(
+        f"  event loop lag  {percentiles(lag.samples)}"
+        f"  max {max(lag.samples, default=0) * 1000:.1f}ms"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    tmp = tempfile.mkdtemp()
+    chat_history = build_chat_history(args, tmp)
+    storage = create_chat_session_storage(chat_history)
+    await storage.start()
+
+    mcp_server_manager = None
+    if not args.no_mcp:
+        mcp_server_manager = MCPServerManager(
+            mcp_server_config={
+                "servers": {
+                    "fake": {
+                        "command": sys.executable,
+                        "args": ["-m", "benchmarks.fake_mcp_server"],
+                    }
+                }
+            }
+        )
+        await mcp_server_manager.start()
+
+    agent = StubAgent("openai", storage, mcp_server_manager, args.latency, args.tokens)
+    config = Config(
+        discord=DiscordConfig(
+            bot_token=None,
+            guilds=[GUILD_ID],
+            streaming=StreamingConfig(enabled=False),
+        ),
+        llm=LLMConfig(openai=None, gemini=None, agent_name="load", system_prompt=None),
+        scheduler=SchedulerConfig(
+            max_concurrent_turns=args.workers, max_queued_turns=100000
+        ),
+    )
+
+    bot = discord.Bot(None, intents=discord.Intents.default())
+    event_handler = DiscordEventHandler(bot, {"openai": agent}, config)
+    event_handler.initialize()
+    slash_command_handler = DiscordSlashCommandHandler(bot, {"openai": agent}, config)
+    slash_command_handler.initialize()
+    await event_handler.start()
+
+    # The handlers register on the bot; call them as the gateway would.
+    (chat_handler,) = bot._event_handlers["on_message"]
+    command = next(c for c in bot.pending_application_commands if c.name == "chat")
+    openai_command = next(c for c in command.subcommands if c.name == "openai")
+
+    try:
+        for concurrency in args.concurrency:
+            await run_level(concurrency, args, chat_handler, openai_command)
+    finally:
+        await event_handler.stop()
+        if mcp_server_manager is not None:
+            await mcp_server_manager.stop()
+        await storage.flush()
+        await storage.close()
+        await close_connection_pools()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--concurrency",
+        type=lambda s: [int(c) for c in s.split(",")],
+        default=[1, 8, 32],
+        help="comma-separated numbers of concurrent conversations",
+    )
+    parser.add_argument("--messages", type=int, default=20, help="per conversation")
+    parser.add_argument("--latency", type=float, default=0.2, help="LLM latency (s)")
+    parser.add_argument("--tokens", type=int, default=50, help="tokens per reply")
+    parser.add_argument(
+        "--api-latency", type=float, default=0.0, help="Discord API latency (s)"
+    )
+    parser.add_argument("--workers", type=int, default=8, help="concurrent turns")
+    parser.add_argument("--no-mcp", action="store_true")
+    parser.add_argument(
+        "--storage", choices=("mem", "sqlite", "redis"), default="mem"
+    )
+    parser.add_argument("--write-behind", action="store_true")
+    parser.add_argument("--redis-host", default="localhost")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--redis-db", type=int, default=15)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compares the JSON and compact record encodings of the Redis chat history:
+encode/decode throughput and the size of the stored entries.
+
+    uv run -m benchmarks.record_codec --records 20000
+
+With --redis-host, both encodings are also written to that Redis and the
+memory it reports for each list is printed. The keys are deleted afterwards.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+import redis.asyncio as redis
+
+from src.repository.chat_session import Record
+from src.repository.record_codec import RecordCodec
+
+_WORDS = (
+    "the bot server tool call message channel guild reply model token "
+    "session history context summary redis python discord request"
+).split()
+
+
+def make_records(count: int, seed: int = 0) -> List[Record]:
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        # Mostly chat-sized messages with the occasional long answer.
+        length = rng.choice((8, 20, 40, 60, 400))
+        message = " ".join(rng.choice(_WORDS) for _ in range(length))
+        role = "user" if i % 2 == 0 else "assistant"
+        records.append(
+            Record(
+                user_id=str(rng.randrange(10**17, 10**18)) if role == "user" else "bot",
+                role=role,
+                message=message,
+                token_count=len(message) // 4,
+            )
+        )
+    return records
+
+
+def measure(codec: RecordCodec, records: List[Record]) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    encoded = [codec.encode(r) for r in records]
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for data in encoded:
+        codec.decode(data)
+    decode_seconds = time.perf_counter() - start
+
+    return encode_seconds, decode_seconds, sum(len(data) for data in encoded)
+
+
+async def redis_memory(
+    host: str, port: int, codecs: dict, records: List[Record]
+) -> dict:
+    client = redis.Redis(host=host, port=port)
+    usage = {}
+    try:
+        for name, codec in codecs.items():
+            key = f"benchmark:record_codec:{name}"
+            await client.delete(key)
+            for i in range(0, len(records), 1000):
+                await client.rpush(key, *(codec.encode(r) for r in records[i : i + 1000]))
+            usage[name] = await client.memory_usage(key, samples=0)
+            await client.delete(key)
+    finally:
+        await client.aclose()
+    return usage
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--redis-host")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    args = parser.parse_args()
+
+    records = make_records(args.records)
+    codecs = {
+        "json": RecordCodec(record_format="json"),
+        "compact": RecordCodec(record_format="compact"),
+    }
+
+    print(f"{args.records} records")
+    for name, codec in codecs.items():
+        encode_seconds, decode_seconds, size = measure(codec, records)
+        print(
+            f"{name:>8}: encode {args.records / encode_seconds:>10.0f} rec/s, "
+            f"decode {args.records / decode_seconds:>10.0f} rec/s, "
+            f"{size / args.records:>7.1f} bytes/rec"
+        )
+
+    if args.redis_host:
+        usage = asyncio.run(
+            redis_memory(args.redis_host, args.redis_port, codecs, records)
+        )
+        for name, size in usage.items():
+            print(f"{name:>8}: {size / 1024:.0f} KiB in Redis")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Measures the per-message overhead of tracing: off, sampled and full.
+
+Each simulated turn opens the turn span and, through the OpenAI agents SDK's
+tracing API, a trace with model and tool call spans, with task switches in
+between. Spans go to a fake exporter that takes --export-latency seconds per batch, so a
+slow Langfuse can be simulated without any network:
+
+    uv run -m benchmarks.tracing_overhead --messages 5000 --spans 8
+
+Every mode runs in its own process, since the tracer provider is global.
+With nest_asyncio installed, a run with it applied shows what the bot used
+to pay on every task switch.
+"""
+
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+from typing import Sequence
+
+from agents.tracing import custom_span
+from agents.tracing import trace as agents_trace
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from src.config.config import TracingConfig
+from src.metrics import registry
+from src.tracing import Tracing, is_sampled, turn_span
+
+_MODES = {"off": None, "sampled": 0.1, "full": 1.0}
+
+
+class SlowExporter(SpanExporter):
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        time.sleep(self._latency)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+async def simulate_turn(guild_id: str, spans: int) -> None:
+    with turn_span(agent="openai", guild_id=guild_id, session_id="bench"):
+        # Like OpenAiAgent, skip the SDK's tracing for turns that are not sampled.
+        with agents_trace("Agent workflow", disabled=not is_sampled()):
+            for i in range(spans):
+                with custom_span(
+                    "tool" if i % 2 else "llm", data={"step": i, "input": "x" * 200}
+                ):
+                    await asyncio.sleep(0)
+
+
+async def run_mode(args: argparse.Namespace) -> None:
+    ratio = _MODES[args.mode]
+    tracing = Tracing(
+        TracingConfig(
+            langfuse=TracingConfig.LangfuseConfig(None, None, None),
+            enabled=ratio is not None,
+            sample_ratio=ratio or 0.0,
+            max_queue_size=args.queue_size,
+            export_interval_ms=100,
+        ),
+        exporter=SlowExporter(args.export_latency),
+    )
+    tracing.start()
+
+    async def worker(worker_id: int) -> None:
+        for _ in range(args.messages // args.concurrency):
+            await simulate_turn(str(worker_id), args.spans)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    tracing.stop()
+
+    dropped = registry.counter("tracing_dropped_spans_total", "").get()
+    exported = registry.counter(
+        "tracing_exported_spans_total", "", label_names=("result",)
+    ).get(result="success")
+    print(
+        f"{args.label or args.mode:>20}: "
+        f"{elapsed / args.messages * 1e6:8.1f} us/message, "
+        f"{exported:8.0f} spans exported, {dropped:8.0f} dropped"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--spans", type=int, default=8, help="child spans per turn")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--export-latency", type=float, default=0.05, help="seconds per export batch"
+    )
+    parser.add_argument("--queue-size", type=int, default=2048)
+    parser.add_argument("--mode", choices=_MODES)
+    parser.add_argument("--nest-asyncio", action="store_true")
+    parser.add_argument("--label")
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        if args.nest_asyncio:
+            import nest_asyncio
+
+            nest_asyncio.apply()
+        asyncio.run(run_mode(args))
+        return
+
+    runs = [[f"--mode={mode}"] for mode in _MODES]
+    try:
+        import nest_asyncio  # noqa: F401
+
+        runs.append(["--mode=off", "--nest-asyncio", "--label=off + nest_asyncio"])
+    except ImportError:
+        pass
+
+    common = [
+        f"--messages={args.messages}",
+        f"--spans={args.spans}",
+        f"--concurrency={args.concurrency}",
+        f"--export-latency={args.export_latency}",
+        f"--queue-size={args.queue_size}",
+    ]
+    for run in runs:
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.tracing_overhead", *common, *run],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
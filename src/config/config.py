@@ -1,16 +1,34 @@
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Literal
 
 import yaml
 
-from src.llm import llm
+
+@dataclass
+class StreamingConfig:
+    enabled: bool = False
+    edit_interval_ms: int = 1200
+
+
+@dataclass
+class ShardingConfig:
+    # Total number of shards, and the ones this process connects; None
+    # leaves the count to Discord's recommendation and runs every shard.
+    shard_count: int | None = None
+    shard_ids: List[int] | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.shard_count is not None or self.shard_ids is not None
 
 
 @dataclass
 class DiscordConfig:
     bot_token: str | None
-    guilds: List[str] | None
+    guilds: List[int] | None
+    streaming: StreamingConfig
+    sharding: ShardingConfig = field(default_factory=ShardingConfig)
 
 
 @dataclass
@@ -19,12 +37,60 @@ class RedisConfig:
     port: int | None
     password: str | None
     db: int | None
+    max_connections: int | None
+    scan_count: int = 500
+    # How long a command waits for a free pooled connection before failing.
+    pool_timeout_seconds: float = 10.0
+
+
+@dataclass
+class SqliteConfig:
+    path: str = "chat_sessions.db"
+    max_batch_size: int = 256
+
+
+@dataclass
+class SessionCacheConfig:
+    max_sessions: int = 1024
+    max_bytes: int = 64 * 1024 * 1024
+
+
+@dataclass
+class MemStorageConfig:
+    max_bytes: int | None = 256 * 1024 * 1024
+    max_records: int | None = None
+    idle_ttl_seconds: float | None = 7 * 24 * 60 * 60
+
+
+@dataclass
+class SessionLifecycleConfig:
+    idle_ttl_seconds: int | None = 24 * 60 * 60
+    archive_after_seconds: int = 60 * 60
+    archive_interval_seconds: int = 60
+    archive_path: str | None = "chat_session_archive.db"
+
+
+@dataclass
+class WriteBehindConfig:
+    enabled: bool = False
+    flush_interval_ms: int = 50
+    flush_max_records: int = 256
+    # "buffered": add_message returns once the record is buffered.
+    # "flushed": add_message returns once the record is written to Redis.
+    durability: Literal["buffered", "flushed"] = "buffered"
 
 
 @dataclass
 class ChatHistoryConfig:
-    storage: Literal["mem", "redis"]
+    storage: Literal["mem", "redis", "sqlite"]
     redis: RedisConfig | None
+    sqlite: SqliteConfig | None
+    cache: SessionCacheConfig
+    mem: MemStorageConfig
+    lifecycle: SessionLifecycleConfig
+    write_behind: WriteBehindConfig
+    record_format: Literal["compact", "json"] = "compact"
+    compress_threshold_bytes: int = 1024
 
 
 @dataclass
@@ -36,6 +102,51 @@ class TracingConfig:
         host: str | None
 
     langfuse: LangfuseConfig
+    enabled: bool = True
+    # Share of turns traced, and overrides of it by guild ID.
+    sample_ratio: float = 1.0
+    guild_sample_ratios: Dict[int, float] = field(default_factory=dict)
+    max_queue_size: int = 2048
+    max_export_batch_size: int = 256
+    export_interval_ms: int = 5000
+    export_timeout_ms: int = 10000
+
+
+@dataclass
+class ContextWindowConfig:
+    max_tokens: int = 16000
+    model_max_tokens: Dict[str, int] = field(default_factory=dict)
+    compaction: bool = True
+    summary_model: str | None = None
+
+    def budget_for(self, model: str | None) -> int:
+        return self.model_max_tokens.get(model, self.max_tokens)
+
+
+@dataclass
+class RateLimitConfig:
+    # The provider's limits for the model; None leaves that one unchecked.
+    requests_per_minute: int | None = None
+    tokens_per_minute: int | None = None
+    # Calls in flight are capped between these, halving on a rate limit and
+    # growing back by one as calls succeed.
+    max_concurrency: int = 16
+    min_concurrency: int = 1
+    # Longest a turn waits for room before it is turned down.
+    max_wait_seconds: float = 30.0
+
+
+@dataclass
+class QuotaConfig:
+    user_turns_per_minute: int | None = None
+    guild_turns_per_minute: int | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return (
+            self.user_turns_per_minute is not None
+            or self.guild_turns_per_minute is not None
+        )
 
 
 @dataclass
@@ -43,13 +154,15 @@ class OpenAIConfig:
     api_key: str | None
     model: str | None
     chat_history: ChatHistoryConfig | None
-    tracing: TracingConfig | None
+    context_window: ContextWindowConfig
+    rate_limit: RateLimitConfig | None = None
 
 
 @dataclass
 class GeminiConfig:
     api_key: str | None
     model: str | None
+    rate_limit: RateLimitConfig | None = None
 
 
 @dataclass
@@ -58,12 +171,49 @@ class LLMConfig:
     gemini: GeminiConfig | None
     agent_name: str | None
     system_prompt: str | None
+    quotas: QuotaConfig = field(default_factory=QuotaConfig)
+
+
+@dataclass
+class SchedulerConfig:
+    max_concurrent_turns: int = 8
+    max_queued_turns: int = 256
+    # Longest a turn may take, tool calls included; None for no limit.
+    turn_timeout_seconds: float | None = 180.0
+    # Abort a session's running turn when a newer message arrives for it.
+    latest_message_wins: bool = False
+
+
+@dataclass
+class MetricsConfig:
+    enabled: bool = False
+    host: str = "0.0.0.0"
+    port: int = 9100
+    path: str = "/metrics"
+
+
+@dataclass
+class ClusterConfig:
+    enabled: bool = False
+    # Identifies this process in session leases; defaults to host and PID.
+    replica_id: str | None = None
+    lease_ttl_ms: int = 30000
+    redis: RedisConfig | None = None
+    # "all" runs turns in the gateway process; "gateway" queues them for
+    # separate worker processes (`python -m src.worker`).
+    role: Literal["all", "gateway"] = "all"
+    job_partitions: int = 16
+    job_reclaim_after_ms: int = 30000
 
 
 @dataclass
 class Config:
     discord: DiscordConfig
     llm: LLMConfig
+    scheduler: SchedulerConfig = field(default_factory=SchedulerConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    tracing: TracingConfig | None = None
+    cluster: ClusterConfig = field(default_factory=ClusterConfig)
 
 
 def _load_config_from_yaml(filename: str):
@@ -86,15 +236,53 @@ def _load_config_from_json(filename: str):
             return None
 
 
+def _is_provider_enabled(provider: Dict[str, Any] | None) -> bool:
+    # A provider is enabled by having a section, unless it says otherwise.
+    return bool(provider) and provider.get("enabled", True)
+
+
+def _load_rate_limit_config(rate_limit: Dict[str, Any] | None) -> RateLimitConfig | None:
+    if rate_limit is None:
+        return None
+    return RateLimitConfig(
+        requests_per_minute=rate_limit.get("requestsPerMinute"),
+        tokens_per_minute=rate_limit.get("tokensPerMinute"),
+        max_concurrency=rate_limit.get("maxConcurrency", RateLimitConfig.max_concurrency),
+        min_concurrency=rate_limit.get("minConcurrency", RateLimitConfig.min_concurrency),
+        max_wait_seconds=rate_limit.get(
+            "maxWaitSeconds", RateLimitConfig.max_wait_seconds
+        ),
+    )
+
+
 def load_config() -> Config:
     config = _load_config_from_yaml("config.yaml")
     if config is None:
         raise ValueError("Failed to load configuration from YAML file.")
 
+    cluster = config.get("cluster") or {}
+
+    # Tracing used to be configured under llm.openai, before it covered Gemini.
+    tracing = config.get("tracing") or (config.get("llm").get("openai") or {}).get(
+        "tracing"
+    )
+
     config = Config(
         discord=DiscordConfig(
             bot_token=config.get("discord").get("botToken"),
-            guilds=config.get("discord").get("guilds"),
+            guilds=[int(guild) for guild in config.get("discord").get("guilds") or []],
+            streaming=StreamingConfig(
+                enabled=(config.get("discord").get("streaming") or {})
+                .get("enabled", StreamingConfig.enabled),
+                edit_interval_ms=(config.get("discord").get("streaming") or {})
+                .get("editIntervalMs", StreamingConfig.edit_interval_ms),
+            ),
+            sharding=ShardingConfig(
+                shard_count=(config.get("discord").get("sharding") or {})
+                .get("shardCount"),
+                shard_ids=(config.get("discord").get("sharding") or {})
+                .get("shardIds"),
+            ),
         ),
         llm=LLMConfig(
             openai=OpenAIConfig(
@@ -104,7 +292,8 @@ def load_config() -> Config:
                     storage=config.get("llm")
                     .get("openai")
                     .get("chatHistory")
-                    .get("storage"),
+                    .get("storage")
+                    or "mem",
                     redis=RedisConfig(
                         host=config.get("llm")
                         .get("openai")
@@ -122,39 +311,248 @@ def load_config() -> Config:
                         .get("openai")
                         .get("chatHistory")
                         .get("redisDb"),
+                        max_connections=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get("redisMaxConnections", 32),
+                        scan_count=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get("redisScanCount", RedisConfig.scan_count),
+                        pool_timeout_seconds=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get(
+                            "redisPoolTimeoutSeconds",
+                            RedisConfig.pool_timeout_seconds,
+                        ),
                     )
                     if config.get("llm").get("openai").get("chatHistory").get("storage")
                     == "redis"
                     else None,
-                ),
-                tracing=TracingConfig(
-                    langfuse=TracingConfig.LangfuseConfig(
-                        secret_key=config.get("llm")
-                        .get("openai")
-                        .get("tracing")
-                        .get("langfuse")
-                        .get("secretKey"),
-                        public_key=config.get("llm")
-                        .get("openai")
-                        .get("tracing")
-                        .get("langfuse")
-                        .get("publicKey"),
-                        host=config.get("llm")
+                    sqlite=SqliteConfig(
+                        path=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get("sqlitePath", SqliteConfig.path),
+                        max_batch_size=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get("sqliteMaxBatchSize", SqliteConfig.max_batch_size),
+                    )
+                    if config.get("llm").get("openai").get("chatHistory").get("storage")
+                    == "sqlite"
+                    else None,
+                    cache=SessionCacheConfig(
+                        max_sessions=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get("cacheMaxSessions", SessionCacheConfig.max_sessions),
+                        max_bytes=config.get("llm")
                         .get("openai")
-                        .get("tracing")
-                        .get("langfuse")
-                        .get("host"),
+                        .get("chatHistory")
+                        .get("cacheMaxBytes", SessionCacheConfig.max_bytes),
+                    ),
+                    mem=MemStorageConfig(
+                        max_bytes=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get("memMaxBytes", MemStorageConfig.max_bytes),
+                        max_records=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get("memMaxRecords", MemStorageConfig.max_records),
+                        idle_ttl_seconds=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get("memIdleTtlSeconds", MemStorageConfig.idle_ttl_seconds),
+                    ),
+                    lifecycle=SessionLifecycleConfig(
+                        idle_ttl_seconds=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get(
+                            "redisIdleTtlSeconds",
+                            SessionLifecycleConfig.idle_ttl_seconds,
+                        ),
+                        archive_after_seconds=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get(
+                            "archiveAfterSeconds",
+                            SessionLifecycleConfig.archive_after_seconds,
+                        ),
+                        archive_interval_seconds=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get(
+                            "archiveIntervalSeconds",
+                            SessionLifecycleConfig.archive_interval_seconds,
+                        ),
+                        archive_path=config.get("llm")
+                        .get("openai")
+                        .get("chatHistory")
+                        .get("archivePath", SessionLifecycleConfig.archive_path),
+                    ),
+                    write_behind=WriteBehindConfig(
+                        enabled=(
+                            config.get("llm")
+                            .get("openai")
+                            .get("chatHistory")
+                            .get("writeBehind")
+                            or {}
+                        ).get("enabled", WriteBehindConfig.enabled),
+                        flush_interval_ms=(
+                            config.get("llm")
+                            .get("openai")
+                            .get("chatHistory")
+                            .get("writeBehind")
+                            or {}
+                        ).get("flushIntervalMs", WriteBehindConfig.flush_interval_ms),
+                        flush_max_records=(
+                            config.get("llm")
+                            .get("openai")
+                            .get("chatHistory")
+                            .get("writeBehind")
+                            or {}
+                        ).get("flushMaxRecords", WriteBehindConfig.flush_max_records),
+                        durability=(
+                            config.get("llm")
+                            .get("openai")
+                            .get("chatHistory")
+                            .get("writeBehind")
+                            or {}
+                        ).get("durability", WriteBehindConfig.durability),
+                    ),
+                    record_format=config.get("llm")
+                    .get("openai")
+                    .get("chatHistory")
+                    .get("recordFormat", ChatHistoryConfig.record_format),
+                    compress_threshold_bytes=config.get("llm")
+                    .get("openai")
+                    .get("chatHistory")
+                    .get(
+                        "compressThresholdBytes",
+                        ChatHistoryConfig.compress_threshold_bytes,
                     ),
                 ),
-            ),
+                context_window=ContextWindowConfig(
+                    max_tokens=(config.get("llm").get("openai").get("contextWindow") or {})
+                    .get("maxTokens", ContextWindowConfig.max_tokens),
+                    model_max_tokens=(config.get("llm").get("openai").get("contextWindow") or {})
+                    .get("models") or {},
+                    compaction=(config.get("llm").get("openai").get("contextWindow") or {})
+                    .get("compaction", ContextWindowConfig.compaction),
+                    summary_model=(config.get("llm").get("openai").get("contextWindow") or {})
+                    .get("summaryModel"),
+                ),
+                rate_limit=_load_rate_limit_config(
+                    config.get("llm").get("openai").get("rateLimit")
+                ),
+            )
+            if _is_provider_enabled(config.get("llm").get("openai"))
+            else None,
             gemini=GeminiConfig(
                 api_key=config.get("llm").get("gemini").get("apiKey"),
                 model=config.get("llm").get("gemini").get("model"),
-            ),
+                rate_limit=_load_rate_limit_config(
+                    config.get("llm").get("gemini").get("rateLimit")
+                ),
+            )
+            if _is_provider_enabled(config.get("llm").get("gemini"))
+            else None,
             agent_name=config.get("llm").get("agentName"),
             system_prompt=config.get("llm").get("systemPrompt"),
+            quotas=QuotaConfig(
+                user_turns_per_minute=(config.get("llm").get("quotas") or {})
+                .get("userTurnsPerMinute"),
+                guild_turns_per_minute=(config.get("llm").get("quotas") or {})
+                .get("guildTurnsPerMinute"),
+            ),
+        ),
+        scheduler=SchedulerConfig(
+            max_concurrent_turns=(config.get("scheduler") or {})
+            .get("maxConcurrentTurns", SchedulerConfig.max_concurrent_turns),
+            max_queued_turns=(config.get("scheduler") or {})
+            .get("maxQueuedTurns", SchedulerConfig.max_queued_turns),
+            turn_timeout_seconds=(config.get("scheduler") or {})
+            .get("turnTimeoutSeconds", SchedulerConfig.turn_timeout_seconds),
+            latest_message_wins=(config.get("scheduler") or {})
+            .get("latestMessageWins", SchedulerConfig.latest_message_wins),
+        ),
+        metrics=MetricsConfig(
+            enabled=(config.get("metrics") or {})
+            .get("enabled", MetricsConfig.enabled),
+            host=(config.get("metrics") or {}).get("host", MetricsConfig.host),
+            port=(config.get("metrics") or {}).get("port", MetricsConfig.port),
+            path=(config.get("metrics") or {}).get("path", MetricsConfig.path),
+        ),
+        tracing=TracingConfig(
+            langfuse=TracingConfig.LangfuseConfig(
+                secret_key=(tracing.get("langfuse") or {}).get("secretKey"),
+                public_key=(tracing.get("langfuse") or {}).get("publicKey"),
+                host=(tracing.get("langfuse") or {}).get("host"),
+            ),
+            enabled=tracing.get("enabled", TracingConfig.enabled),
+            sample_ratio=tracing.get("sampleRatio", TracingConfig.sample_ratio),
+            guild_sample_ratios={
+                int(guild): ratio
+                for guild, ratio in (tracing.get("guildSampleRatios") or {}).items()
+            },
+            max_queue_size=tracing.get("maxQueueSize", TracingConfig.max_queue_size),
+            max_export_batch_size=tracing.get(
+                "maxExportBatchSize", TracingConfig.max_export_batch_size
+            ),
+            export_interval_ms=tracing.get(
+                "exportIntervalMs", TracingConfig.export_interval_ms
+            ),
+            export_timeout_ms=tracing.get(
+                "exportTimeoutMs", TracingConfig.export_timeout_ms
+            ),
+        )
+        if tracing
+        else None,
+        cluster=ClusterConfig(
+            enabled=cluster.get("enabled", ClusterConfig.enabled),
+            replica_id=cluster.get("replicaId"),
+            lease_ttl_ms=cluster.get("leaseTtlMs", ClusterConfig.lease_ttl_ms),
+            redis=RedisConfig(
+                host=cluster.get("redisHost"),
+                port=cluster.get("redisPort"),
+                password=cluster.get("redisPassword"),
+                db=cluster.get("redisDb"),
+                max_connections=cluster.get("redisMaxConnections", 32),
+                pool_timeout_seconds=cluster.get(
+                    "redisPoolTimeoutSeconds", RedisConfig.pool_timeout_seconds
+                ),
+            )
+            if cluster.get("enabled", ClusterConfig.enabled)
+            else None,
+            role=cluster.get("role", ClusterConfig.role),
+            job_partitions=cluster.get("jobPartitions", ClusterConfig.job_partitions),
+            job_reclaim_after_ms=cluster.get(
+                "jobReclaimAfterMs", ClusterConfig.job_reclaim_after_ms
+            ),
         ),
     )
+    if config.llm.openai is None and config.llm.gemini is None:
+        raise ValueError("No LLM provider is enabled in the configuration.")
+    if (
+        config.discord.sharding.shard_ids is not None
+        and config.discord.sharding.shard_count is None
+    ):
+        raise ValueError("discord.sharding.shardIds needs shardCount.")
+    if config.cluster.role != "all" and not config.cluster.enabled:
+        raise ValueError("cluster.role needs cluster.enabled.")
+    if (
+        config.cluster.enabled
+        and config.llm.openai is not None
+        and config.llm.openai.chat_history.storage != "redis"
+    ):
+        raise ValueError(
+            "Running as a cluster needs the chat history in Redis, "
+            "so that every replica sees every session."
+        )
     return config
 
 
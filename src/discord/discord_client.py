@@ -5,6 +5,9 @@ import discord
 
 from ..config import Config
 from ..llm.llm import LLMInteractor
+from ..llm.mcp_server import MCPServerManager
+from ..scheduler.session_lease import SessionLeases
+from ..scheduler.turn_queue import TurnQueue
 from .event_handler import DiscordEventHandler
 from .slash_command_handler import DiscordSlashCommandHandler
 
@@ -15,6 +18,9 @@ class DiscordBot:
         token: str,
         llm_agents: Dict[str, LLMInteractor],
         config: Config,
+        mcp_server_manager: MCPServerManager | None = None,
+        session_leases: SessionLeases | None = None,
+        turn_queue: TurnQueue | None = None,
     ):
         self._token = token
         self._config = config
@@ -25,25 +31,56 @@ class DiscordBot:
             bot=self._bot,
             llm_agents=llm_agents,
             config=config,
+            session_leases=session_leases,
+            turn_queue=turn_queue,
         )
         self._event_handler.initialize()
         self._slash_command_handler = DiscordSlashCommandHandler(
             self._bot,
             llm_agents=llm_agents,
             config=config,
+            mcp_server_manager=mcp_server_manager,
         )
         self._slash_command_handler.initialize()
 
     def _initialize_bot(self):
         intents = discord.Intents.default()
         intents.message_content = True
-        self._bot = discord.Bot(None, intents=intents)
+
+        sharding = self._config.discord.sharding
+        if not sharding.enabled:
+            self._bot = discord.Bot(None, intents=intents)
+            return
+        self._bot = discord.AutoShardedBot(
+            None,
+            intents=intents,
+            shard_count=sharding.shard_count,
+            shard_ids=sharding.shard_ids,
+        )
+        logging.info(
+            f"Running shards {sharding.shard_ids or 'all'} "
+            f"of {sharding.shard_count or 'the recommended number'}."
+        )
+
+    async def login(self):
+        await self._bot.login(self._token)
 
     async def start(self):
-        await self._bot.start(self._token)
+        """
+        Connects to the gateway and serves events until the bot is stopped.
+        Logs in first, unless `login` was already awaited.
+        """
+        await self._event_handler.start()
+        if self._bot.user is None:
+            await self.login()
+        await self._bot.connect()
+
+    async def wait_until_ready(self):
+        await self._bot.wait_until_ready()
 
     async def stop(self):
         await self._bot.close()
+        await self._event_handler.stop()
         logging.info("Discord bot stopped.")
 
 
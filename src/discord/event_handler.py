@@ -1,10 +1,31 @@
 import logging
-from typing import Dict
+from typing import Dict, List
 
 import discord
+import redis.asyncio as redis
 
 from ..config.config import Config
 from ..llm.llm import LLMInteractor
+from ..metrics import registry
+from ..scheduler.session_lease import SessionLeases
+from ..scheduler.turn_queue import TurnQueue
+from ..scheduler.turn_scheduler import Turn, TurnScheduler
+from .instrumentation import observe_api_call
+from .turn_responder import TurnResponder
+
+# The per-message stages do no I/O, so they need much finer buckets.
+_FAST_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+
+_guild_filter_latency = registry.histogram(
+    "discord_guild_filter_seconds",
+    "Time to check whether a message comes from a served guild.",
+    buckets=_FAST_BUCKETS,
+)
+_session_lookup_latency = registry.histogram(
+    "discord_session_lookup_seconds",
+    "Time to find the agent that owns the thread of a message.",
+    buckets=_FAST_BUCKETS,
+)
 
 
 class DiscordEventHandler:
@@ -13,15 +34,35 @@ class DiscordEventHandler:
         bot: discord.Bot,
         llm_agents: Dict[str, LLMInteractor],
         config: Config,
+        session_leases: SessionLeases | None = None,
+        turn_queue: TurnQueue | None = None,
     ):
         self._bot = bot
         self._llm_agents = llm_agents
         self._config = config
+        self._session_leases = session_leases
+        # Set in the gateway role, where turns run in separate workers.
+        self._turn_queue = turn_queue
+        self._responder = TurnResponder(llm_agents=llm_agents, config=config)
+        self._guild_ids = frozenset(config.discord.guilds or [])
+        self._scheduler = TurnScheduler(
+            run_turn=self._run_turn,
+            max_workers=config.scheduler.max_concurrent_turns,
+            max_queued_turns=config.scheduler.max_queued_turns,
+            latest_message_wins=config.scheduler.latest_message_wins,
+        )
 
     def initialize(self):
         self._set_up_on_ready()
         self._set_up_on_chat_session_message()
 
+    async def start(self):
+        if self._turn_queue is None:
+            self._scheduler.start()
+
+    async def stop(self):
+        await self._scheduler.stop()
+
     def _set_up_on_ready(self):
         @self._bot.event
         async def on_ready():
@@ -30,22 +71,99 @@ class DiscordEventHandler:
     def _set_up_on_chat_session_message(self):
         @self._bot.listen(name="on_message")
         async def chat_session_handler(message: discord.Message):
-            if self._is_not_in_target_guilds(message.guild):
+            if message.author.bot:
                 return
 
-            if message.author.bot:
+            with _guild_filter_latency.time():
+                not_in_target_guilds = self._is_not_in_target_guilds(message.guild)
+            if not_in_target_guilds:
+                return
+
+            session_id = str(message.channel.id)
+            with _session_lookup_latency.time():
+                agent = await self._find_agent(session_id)
+            if agent is None:
                 return
 
+            # Replicas serving the same shard all see the message; only the
+            # owner of the session answers it.
+            if self._session_leases is not None and not await self._session_leases.acquire(
+                session_id
+            ):
+                return
+
+            if self._turn_queue is not None:
+                await self._enqueue(message, session_id=session_id, agent=agent)
+                return
+
+            result = self._scheduler.submit(
+                session_id=session_id,
+                guild_id=str(message.guild.id),
+                agent=agent,
+                payload=message,
+            )
+            if not result.accepted:
+                await observe_api_call(
+                    "reply",
+                    message.reply(
+                        "I'm handling too many conversations right now, please try again in a moment."
+                    ),
+                )
+            elif result.position > 0 and not result.coalesced:
+                await observe_api_call(
+                    "reply", message.reply(f"Queued, position {result.position}.")
+                )
+
+    async def _enqueue(self, message: discord.Message, session_id: str, agent: str):
+        try:
+            await self._turn_queue.enqueue(
+                session_id=session_id,
+                guild_id=str(message.guild.id),
+                agent=agent,
+                channel_id=str(message.channel.id),
+                user_id=str(message.author.id),
+                content=message.content,
+            )
+        except redis.RedisError as e:
+            logging.warning(f"Failed to queue a turn of session {session_id}: {e}")
+            await observe_api_call(
+                "reply",
+                message.reply("I can't take messages right now, please try again in a moment."),
+            )
+
+    async def _find_agent(self, session_id: str) -> str | None:
+        for agent, llm_agent in self._llm_agents.items():
+            if await llm_agent.is_known_chat_session(session_id=session_id):
+                return agent
+        return None
+
+    async def _run_turn(self, turn: Turn):
+        if self._session_leases is None:
+            await self._run_owned_turn(turn)
+            return
+
+        # The lease may have lapsed while the turn was queued.
+        if not await self._session_leases.acquire(turn.session_id):
+            logging.warning(
+                f"Dropping a turn of session {turn.session_id}, now owned by another replica."
+            )
+            return
+        async with self._session_leases.hold(turn.session_id):
+            await self._run_owned_turn(turn)
 
-            for agent, llm_agent in self._llm_agents.items():
-                if llm_agent.is_known_chat_session(session_id=str(message.channel.id)):
-                    await message.channel.trigger_typing()
-                    response = await llm_agent.send_message(
-                        message=message.content,
-                        user_id=message.author.id,
-                        session_id=str(message.channel.id),
-                    )
-                    await message.channel.send(content=response)
+    async def _run_owned_turn(self, turn: Turn):
+        messages: List[discord.Message] = turn.payloads
+        latest = messages[-1]
+        await self._responder.respond(
+            agent=turn.agent,
+            guild_id=turn.guild_id,
+            channel=latest.channel,
+            content="\n".join(m.content for m in messages),
+            user_id=str(latest.author.id),
+            session_id=turn.session_id,
+            received_at=turn.enqueued_at,
+            superseded=lambda: turn.superseded,
+        )
 
-    def _is_not_in_target_guilds(self, guild: discord.Guild):
-        return guild.id not in self._config.discord.guilds
+    def _is_not_in_target_guilds(self, guild: discord.Guild | None):
+        return guild is None or guild.id not in self._guild_ids
@@ -0,0 +1,40 @@
+import time
+from typing import Awaitable, TypeVar
+
+import discord
+
+from ..metrics import registry
+
+T = TypeVar("T")
+
+_api_latency = registry.histogram(
+    "discord_send_seconds",
+    "Latency of Discord API calls that post to a channel, by operation.",
+    label_names=("operation",),
+)
+_api_errors = registry.counter(
+    "discord_send_errors_total",
+    "Discord API calls that failed, by operation.",
+    label_names=("operation",),
+)
+_rate_limits = registry.counter(
+    "discord_rate_limits_total",
+    "Discord API calls that still hit a rate limit after the client's own retries.",
+    label_names=("operation",),
+)
+
+
+async def observe_api_call(operation: str, call: Awaitable[T]) -> T:
+    """
+    Awaits a Discord API call, recording its latency and failures.
+    """
+    start = time.perf_counter()
+    try:
+        return await call
+    except discord.HTTPException as e:
+        _api_errors.inc(operation=operation)
+        if e.status == 429:
+            _rate_limits.inc(operation=operation)
+        raise
+    finally:
+        _api_latency.observe(time.perf_counter() - start, operation=operation)
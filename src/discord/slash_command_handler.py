@@ -5,6 +5,7 @@ import discord
 
 from ..config.config import Config
 from ..llm.llm import LLMInteractor
+from ..llm.mcp_server import MCPServerManager
 
 
 class DiscordSlashCommandHandler:
@@ -13,15 +14,24 @@ class DiscordSlashCommandHandler:
         bot: discord.Bot,
         llm_agents: Dict[str, LLMInteractor],
         config: Config,
+        mcp_server_manager: MCPServerManager | None = None,
     ):
         self._bot = bot
         self._llm_agents = llm_agents
         self._config = config
+        self._mcp_server_manager = mcp_server_manager
+        self._guild_ids = frozenset(config.discord.guilds or [])
 
         self._chat_command_group = bot.create_group(name="chat")
+        self._mcp_command_group = bot.create_group(
+            name="mcp",
+            description="manage the MCP servers",
+            default_member_permissions=discord.Permissions(administrator=True),
+        )
 
     def initialize(self):
         self._register_chat_command()
+        self._register_mcp_command()
 
     def _register_chat_command(self):
         # @self._bot.slash_command(
@@ -42,6 +52,11 @@ class DiscordSlashCommandHandler:
                 logging.warning("command cannot be used in a thread channel")
                 return
 
+            openai_agent = self._llm_agents.get("openai")
+            if openai_agent is None:
+                await ctx.respond("OpenAI is not enabled on this bot.", ephemeral=True)
+                return
+
             res = await ctx.interaction.respond("Creating a chat session...")
             original_res = await res.original_response()
             thread = await original_res.create_thread(
@@ -49,12 +64,7 @@ class DiscordSlashCommandHandler:
                 auto_archive_duration=60,
             )
 
-            openai_agent = self._llm_agents.get("openai")
-            if openai_agent is None:
-                logging.error("OpenAI agent not found")
-                return
-
-            openai_agent.start_new_chat_session(session_id=str(thread.id))
+            await openai_agent.start_new_chat_session(session_id=str(thread.id))
             await thread.send(
                 content="Chat session started! You can now send messages."
             )
@@ -72,6 +82,11 @@ class DiscordSlashCommandHandler:
                 logging.warning("command cannot be used in a thread channel")
                 return
 
+            gemini_agent = self._llm_agents.get("gemini")
+            if gemini_agent is None:
+                await ctx.respond("Gemini is not enabled on this bot.", ephemeral=True)
+                return
+
             res = await ctx.interaction.respond("Creating a chat session...")
             original_res = await res.original_response()
             thread = await original_res.create_thread(
@@ -79,16 +94,45 @@ class DiscordSlashCommandHandler:
                 auto_archive_duration=60,
             )
 
-            gemini_agent = self._llm_agents.get("gemini")
-            if gemini_agent is None:
-                logging.error("Gemini agent not found")
-                return
-
-            gemini_agent.start_new_chat_session(session_id=str(thread.id))
+            await gemini_agent.start_new_chat_session(session_id=str(thread.id))
             await thread.send(
                 content="Chat session started! You can now send messages."
             )
 
+    def _register_mcp_command(self):
+        @self._mcp_command_group.command(
+            name="refresh-tools",
+            description="drop the cached tool lists of the MCP servers",
+            guild_ids=self._config.discord.guilds,
+        )
+        async def refresh_tools(
+            ctx: discord.ApplicationContext,
+            server: discord.Option(
+                str, "only refresh this server", required=False, default=None
+            ),
+        ):
+            if self._is_not_in_target_guilds(ctx.guild):
+                return
+
+            if not ctx.author.guild_permissions.administrator:
+                await ctx.respond("Only administrators can do this.", ephemeral=True)
+                return
+
+            if self._mcp_server_manager is None:
+                await ctx.respond("No MCP servers are configured.", ephemeral=True)
+                return
+
+            invalidated = self._mcp_server_manager.invalidate_tools_cache(server)
+            if not invalidated:
+                await ctx.respond(f"Unknown MCP server: {server}", ephemeral=True)
+                return
+
+            logging.info(f"Tool caches invalidated by {ctx.author}: {invalidated}")
+            await ctx.respond(
+                f"Tool lists will be refreshed for: {', '.join(invalidated)}",
+                ephemeral=True,
+            )
+
     def _is_thread_channel(self, channel: discord.abc.GuildChannel):
         return (
             channel.type == discord.ChannelType.public_thread
@@ -96,5 +140,5 @@ class DiscordSlashCommandHandler:
             or channel.type == discord.ChannelType.news_thread
         )
 
-    def _is_not_in_target_guilds(self, guild: discord.Guild):
-        return guild.id not in self._config.discord.guilds
+    def _is_not_in_target_guilds(self, guild: discord.Guild | None):
+        return guild is None or guild.id not in self._guild_ids
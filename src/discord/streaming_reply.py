@@ -0,0 +1,132 @@
+import logging
+import time
+from typing import AsyncIterator
+
+import discord
+
+from ..metrics import registry
+from .instrumentation import observe_api_call
+
+# Discord rejects messages longer than this.
+MESSAGE_LIMIT = 2000
+
+# Appended to a reply whose stream failed or was cancelled part way.
+_INTERRUPTED_NOTE = "\n\n*(reply interrupted)*"
+
+_time_to_first_token = registry.histogram(
+    "discord_time_to_first_visible_token_seconds",
+    "Time from receiving a message to the first streamed token shown in Discord.",
+    label_names=("agent",),
+)
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> tuple[str, str]:
+    """
+    Splits text into a head that fits in one message and the rest, preferring
+    to break at a newline, then at a space.
+    """
+    if len(text) <= limit:
+        return text, ""
+
+    cut = text.rfind("\n", 0, limit)
+    if cut <= 0:
+        cut = text.rfind(" ", 0, limit)
+    if cut <= 0:
+        cut = limit
+    return text[:cut], text[cut:].lstrip("\n")
+
+
+class StreamingReply:
+    """
+    Renders a stream of text chunks into a channel: posts a placeholder, edits
+    it with the accumulated text at most once per edit interval, and rolls over
+    into follow-up messages when the message length limit is reached. If the
+    stream fails or is cancelled, the message being written is marked as
+    interrupted, or deleted if it has nothing to show yet.
+    """
+
+    def __init__(
+        self,
+        channel: discord.abc.Messageable,
+        agent_name: str,
+        edit_interval: float,
+        started_at: float | None = None,
+        placeholder: str = "…",
+    ):
+        self._channel = channel
+        self._agent_name = agent_name
+        self._edit_interval = edit_interval
+        self._started_at = started_at if started_at is not None else time.monotonic()
+        self._placeholder = placeholder
+
+    async def render(self, chunks: AsyncIterator[str]) -> str:
+        message = await observe_api_call(
+            "send", self._channel.send(content=self._placeholder)
+        )
+        # text is what belongs in the current message, shown what it displays.
+        text = ""
+        shown = self._placeholder
+        full_text = ""
+        last_edit = 0.0
+
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                text += chunk
+                full_text += chunk
+
+                while len(text) > MESSAGE_LIMIT:
+                    head, text = split_message(text)
+                    await observe_api_call("edit", message.edit(content=head))
+                    self._observe_first_token()
+                    message = await observe_api_call(
+                        "send", self._channel.send(content=self._placeholder)
+                    )
+                    shown = self._placeholder
+                    last_edit = time.monotonic()
+
+                now = time.monotonic()
+                if text and text != shown and now - last_edit >= self._edit_interval:
+                    await observe_api_call("edit", message.edit(content=text))
+                    self._observe_first_token()
+                    shown = text
+                    last_edit = now
+        except BaseException:
+            await self._abandon(message, text)
+            raise
+
+        if not full_text:
+            await observe_api_call(
+                "edit",
+                message.edit(content="Sorry, I cannot respond at the moment."),
+            )
+        elif not text:
+            # The rollover consumed everything; drop the trailing placeholder.
+            await observe_api_call("delete", message.delete())
+        elif text != shown:
+            await observe_api_call("edit", message.edit(content=text))
+            self._observe_first_token()
+
+        return full_text
+
+    async def _abandon(self, message: discord.Message, text: str) -> None:
+        try:
+            if text:
+                head, _ = split_message(text, MESSAGE_LIMIT - len(_INTERRUPTED_NOTE))
+                await observe_api_call(
+                    "edit", message.edit(content=head + _INTERRUPTED_NOTE)
+                )
+            else:
+                await observe_api_call("delete", message.delete())
+        except discord.HTTPException as e:
+            logging.warning(f"Failed to clean up an interrupted reply: {e}")
+
+    def _observe_first_token(self) -> None:
+        if self._started_at is None:
+            return
+
+        _time_to_first_token.observe(
+            time.monotonic() - self._started_at, agent=self._agent_name
+        )
+        self._started_at = None
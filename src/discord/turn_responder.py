@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import math
+import time
+from typing import AsyncIterator, Callable, Dict, List
+
+import discord
+
+from ..config import Config
+from ..llm.context_window import estimate_tokens
+from ..llm.deadline import turn_deadline
+from ..llm.llm import LLMInteractor
+from ..llm.rate_limit import RateLimitExceeded, TurnQuotas, create_token_buckets
+from ..metrics import registry
+from ..tracing import turn_span
+from .instrumentation import observe_api_call
+from .streaming_reply import StreamingReply
+
+_turn_latency = registry.histogram(
+    "discord_turn_seconds",
+    "Time from receiving a message to the end of its reply.",
+    label_names=("agent",),
+)
+_turn_errors = registry.counter(
+    "discord_turn_errors_total",
+    "Turns that failed with an exception.",
+    label_names=("agent",),
+)
+_cancelled_turns = registry.counter(
+    "discord_cancelled_turns_total",
+    "Turns aborted by their deadline or by a newer message, by reason.",
+    label_names=("agent", "reason"),
+)
+_cancelled_tokens = registry.counter(
+    "discord_cancelled_turn_tokens_total",
+    "Estimated reply tokens generated by aborted turns and thrown away.",
+    label_names=("agent", "reason"),
+)
+_cancel_saved_seconds = registry.counter(
+    "discord_cancelled_turn_saved_seconds_total",
+    "Estimated time superseded turns would still have taken, by a typical turn.",
+    label_names=("agent",),
+)
+
+
+class TurnResponder:
+    """
+    Answers a turn in its channel: runs the agent and posts or streams the
+    reply. The channel only needs to be Messageable, so turn job workers can
+    pass channels that post through the REST API, without a gateway.
+    """
+
+    def __init__(self, llm_agents: Dict[str, LLMInteractor], config: Config):
+        self._llm_agents = llm_agents
+        self._config = config
+        self._quotas = (
+            TurnQuotas(config.llm.quotas, create_token_buckets(config))
+            if config.llm.quotas.enabled
+            else None
+        )
+        # agent -> moving average of how long a turn takes
+        self._turn_seconds: Dict[str, float] = {}
+
+    async def respond(
+        self,
+        agent: str,
+        guild_id: str,
+        channel: discord.abc.Messageable,
+        content: str,
+        user_id: str,
+        session_id: str,
+        received_at: float,
+        superseded: Callable[[], bool] | None = None,
+    ):
+        """
+        Answers the turn within the configured deadline. `superseded` tells,
+        once the turn is cancelled, whether a newer message did it.
+        """
+        timeout = self._config.scheduler.turn_timeout_seconds
+        started_at = time.monotonic()
+        # The reply text generated so far, for the turn's cancellation metrics.
+        generated: List[str] = []
+        deadline: asyncio.Timeout | None = None
+        try:
+            with turn_span(agent=agent, guild_id=guild_id, session_id=session_id):
+                try:
+                    async with turn_deadline(timeout) as deadline:
+                        if self._quotas is not None:
+                            await self._quotas.take(
+                                agent=agent, user_id=user_id, guild_id=guild_id
+                            )
+                        await self._respond(
+                            agent=agent,
+                            channel=channel,
+                            content=content,
+                            user_id=user_id,
+                            session_id=session_id,
+                            received_at=received_at,
+                            generated=generated,
+                        )
+                except RateLimitExceeded as e:
+                    await self._reply_rate_limited(channel, session_id, e)
+                except TimeoutError:
+                    # Only the deadline's own timeout, not one from within.
+                    if deadline is None or not deadline.expired():
+                        raise
+                    self._record_cancelled(agent, "deadline", generated, started_at)
+                    logging.warning(
+                        f"Turn of session {session_id} hit its {timeout:g}s deadline."
+                    )
+                    await observe_api_call(
+                        "send",
+                        channel.send(content="Sorry, I could not answer in time."),
+                    )
+                except asyncio.CancelledError:
+                    if superseded is not None and superseded():
+                        self._record_cancelled(
+                            agent, "superseded", generated, started_at
+                        )
+                    raise
+                else:
+                    elapsed = time.monotonic() - started_at
+                    typical = self._turn_seconds.get(agent, elapsed)
+                    self._turn_seconds[agent] = 0.8 * typical + 0.2 * elapsed
+        except Exception:
+            _turn_errors.inc(agent=agent)
+            raise
+        finally:
+            _turn_latency.observe(time.monotonic() - received_at, agent=agent)
+
+    def _record_cancelled(
+        self, agent: str, reason: str, generated: List[str], started_at: float
+    ) -> None:
+        _cancelled_turns.inc(agent=agent, reason=reason)
+        if generated:
+            _cancelled_tokens.inc(
+                estimate_tokens("".join(generated)), agent=agent, reason=reason
+            )
+        if reason == "superseded" and agent in self._turn_seconds:
+            _cancel_saved_seconds.inc(
+                max(self._turn_seconds[agent] - (time.monotonic() - started_at), 0.0),
+                agent=agent,
+            )
+
+    async def _reply_rate_limited(
+        self,
+        channel: discord.abc.Messageable,
+        session_id: str,
+        error: RateLimitExceeded,
+    ):
+        logging.info(f"Turn of session {session_id} turned down: {error}")
+        if error.reason == "quota":
+            reason = "You are sending messages faster than this bot allows"
+        else:
+            reason = "I am getting more messages than I can answer right now"
+        await observe_api_call(
+            "send",
+            channel.send(
+                content=f"{reason}, please try again in "
+                f"{math.ceil(error.retry_after)}s."
+            ),
+        )
+
+    async def _respond(
+        self,
+        agent: str,
+        channel: discord.abc.Messageable,
+        content: str,
+        user_id: str,
+        session_id: str,
+        received_at: float,
+        generated: List[str],
+    ):
+        llm_agent = self._llm_agents[agent]
+        if self._config.discord.streaming.enabled:
+            await StreamingReply(
+                channel=channel,
+                agent_name=agent,
+                edit_interval=self._config.discord.streaming.edit_interval_ms / 1000,
+                started_at=received_at,
+            ).render(
+                self._tracked(
+                    llm_agent.stream_message(
+                        message=content,
+                        user_id=user_id,
+                        session_id=session_id,
+                    ),
+                    generated,
+                )
+            )
+            return
+
+        await observe_api_call("typing", channel.trigger_typing())
+        response = await llm_agent.send_message(
+            message=content,
+            user_id=user_id,
+            session_id=session_id,
+        )
+        generated.append(response or "")
+        await observe_api_call("send", channel.send(content=response))
+
+    async def _tracked(
+        self, chunks: AsyncIterator[str], generated: List[str]
+    ) -> AsyncIterator[str]:
+        async for chunk in chunks:
+            generated.append(chunk)
+            yield chunk
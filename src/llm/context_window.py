@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List
+
+from ..repository.chat_session import ChatSession, ChatSessionStorage, Record
+
+# Per-message framing the chat APIs add on top of the content itself.
+_MESSAGE_OVERHEAD_TOKENS = 4
+# Share of the budget left for raw turns after a compaction, so that the
+# summary is not rewritten on every single turn.
+_RETAIN_RATIO_AFTER_COMPACTION = 0.5
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English text). It only
+    has to be good enough to keep the context under the model's limit.
+    """
+    return _MESSAGE_OVERHEAD_TOKENS + (len(text) + 3) // 4
+
+
+def record_tokens(record: Record) -> int:
+    if record.token_count is None:
+        record.token_count = estimate_tokens(record.message)
+    return record.token_count
+
+
+@dataclass
+class ContextSelection:
+    records: List[Record]
+    # Records history[summary_until:compact_until] should be folded into the
+    # session summary. Zero when no compaction is needed.
+    compact_until: int = 0
+
+
+class ContextWindow:
+    """
+    Picks the records sent to the model for a turn: the system prompt, the
+    session summary if there is one, and as many recent turns as fit in the
+    token budget.
+    """
+
+    def __init__(self, max_tokens: int):
+        self._max_tokens = max_tokens
+
+    def select(self, session: ChatSession) -> ContextSelection:
+        history = session.history
+        if not history:
+            return ContextSelection(records=[])
+
+        head = history[:1]
+        budget = self._max_tokens - record_tokens(history[0])
+
+        first = 1
+        if session.summary is not None:
+            budget -= record_tokens(session.summary)
+            first = max(session.summary_until, 1)
+
+        turns_tokens = sum(record_tokens(r) for r in history[first:])
+        if turns_tokens <= budget:
+            summary = [session.summary] if session.summary is not None else []
+            return ContextSelection(records=head + summary + history[first:])
+
+        # Slide the window: keep the most recent turns that fit, and always at
+        # least the latest one.
+        start = len(history)
+        remaining = budget
+        while start > first and remaining - record_tokens(history[start - 1]) >= 0:
+            start -= 1
+            remaining -= record_tokens(history[start])
+        start = min(start, len(history) - 1)
+
+        summary = [session.summary] if session.summary is not None else []
+        return ContextSelection(
+            records=head + summary + history[start:],
+            compact_until=self._compaction_target(history, start, budget),
+        )
+
+    def _compaction_target(self, history: List[Record], start: int, budget: int) -> int:
+        # Summarise past the current window start so that the raw turns kept
+        # afterwards only use part of the budget.
+        target = len(history)
+        retained = 0
+        while (
+            target > start
+            and retained + record_tokens(history[target - 1])
+            <= budget * _RETAIN_RATIO_AFTER_COMPACTION
+        ):
+            target -= 1
+            retained += record_tokens(history[target])
+        return min(target, len(history) - 1)
+
+
+class HistoryCompactor:
+    """
+    Summarises turns evicted from the context window into the session summary
+    in background tasks, off the request path. At most one compaction runs per
+    session at a time.
+    """
+
+    def __init__(
+        self,
+        chat_session_storage: ChatSessionStorage,
+        summarize: Callable[[Record | None, List[Record]], Awaitable[str]],
+    ):
+        self._chat_session_storage = chat_session_storage
+        self._summarize = summarize
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def schedule(self, session: ChatSession, compact_until: int) -> None:
+        session_id = str(session.id)
+        if session_id in self._tasks or compact_until <= session.summary_until:
+            return
+
+        task = asyncio.create_task(self._compact(session, compact_until))
+        self._tasks[session_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(session_id, None))
+
+    async def stop(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _compact(self, session: ChatSession, compact_until: int) -> None:
+        evicted = session.history[max(session.summary_until, 1) : compact_until]
+        try:
+            summary = await self._summarize(session.summary, evicted)
+        except Exception as e:
+            logging.error(f"Failed to compact history of session {session.id}: {e}")
+            return
+
+        message = f"Summary of the earlier conversation:\n{summary}"
+        await self._chat_session_storage.set_summary(
+            session_id=session.id,
+            summary=Record(
+                user_id="developer",
+                role="system",
+                message=message,
+                token_count=estimate_tokens(message),
+            ),
+            summary_until=compact_until,
+        )
+        logging.info(
+            f"Compacted {len(evicted)} records of session {session.id} into its summary."
+        )
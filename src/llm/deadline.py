@@ -0,0 +1,40 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator
+
+# Monotonic time by which the running turn must be over, if it has a limit.
+_deadline: ContextVar[float | None] = ContextVar("turn_deadline", default=None)
+
+
+@asynccontextmanager
+async def turn_deadline(
+    seconds: float | None,
+) -> AsyncIterator[asyncio.Timeout | None]:
+    """
+    Cancels the block after the given seconds and raises TimeoutError. Yields
+    the timeout, whose expired() tells the deadline apart from a TimeoutError
+    raised by anything else, or None without a limit. Calls made in the
+    block, e.g. to MCP tools, can bound their own waits with
+    remaining_seconds.
+    """
+    if seconds is None:
+        yield None
+        return
+
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        async with asyncio.timeout(seconds) as timeout:
+            yield timeout
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_seconds() -> float | None:
+    """
+    Returns the time left before the running turn's deadline, or None if it
+    has none.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
@@ -1,14 +1,22 @@
 import os
-from typing import override
+from typing import AsyncIterator, Set, override
 
 from google.adk.agents import Agent
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
-from google.genai import types
+from google.genai import errors, types
 
 from ..config.config import Config, load_config
-from ..llm.llm import LLMInteractor
+from ..llm.llm import (
+    LLMInteractor,
+    active_sessions,
+    observe_llm_call,
+    retry_after_seconds,
+)
 from ..llm.mcp_server import MCPServerManager
+from ..repository.session_index import SessionIndex
+from .gemini_sessions import RedisSessionService
 
 
 class GeminiAgent(LLMInteractor):
@@ -17,12 +25,28 @@ class GeminiAgent(LLMInteractor):
     ) -> None:
         self._config = config
         self._mcp_server_manager = mcp_server_manager
-        self._chat_session_storage = InMemorySessionService()
 
         self._DEFAULT_APP_NAME = "discord-gemini"
         self._DEFAULT_USER_ID = "bot"
 
+        # Replicas of a cluster share the sessions through Redis; a single
+        # process keeps them in memory.
+        self._redis_sessions: RedisSessionService | None = None
+        self._session_ids: Set[str] | SessionIndex
+        if config.cluster.enabled:
+            self._redis_sessions = RedisSessionService(
+                config.cluster.redis,
+                app_name=self._DEFAULT_APP_NAME,
+                user_id=self._DEFAULT_USER_ID,
+            )
+            self._chat_session_storage = self._redis_sessions
+            self._session_ids = SessionIndex(self._redis_sessions)
+        else:
+            self._chat_session_storage = InMemorySessionService()
+            self._session_ids = set()
+
         self._initialize()
+        active_sessions.set_function(lambda: len(self._session_ids), agent=self.get_name())
 
     def _initialize(self):
         os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = "FALSE"
@@ -34,56 +58,137 @@ class GeminiAgent(LLMInteractor):
             instruction=self._config.llm.system_prompt,
             tools=[],
         )
-
-    @override
-    def start_new_chat_session(self, session_id: str) -> None:
-        self._chat_session_storage.create_session(
+        self._runner = Runner(
             app_name=self._DEFAULT_APP_NAME,
-            user_id=self._DEFAULT_USER_ID,
-            session_id=session_id,
+            agent=self._agent,
+            session_service=self._chat_session_storage,
         )
 
+    @override
+    async def start(self) -> None:
+        if isinstance(self._session_ids, SessionIndex):
+            await self._session_ids.start()
+
+    @override
+    async def stop(self) -> None:
+        if isinstance(self._session_ids, SessionIndex):
+            await self._session_ids.stop()
+
+    @override
+    async def start_new_chat_session(self, session_id: str) -> None:
+        if self._redis_sessions is not None:
+            await self._redis_sessions.create(session_id)
+        else:
+            self._chat_session_storage.create_session(
+                app_name=self._DEFAULT_APP_NAME,
+                user_id=self._DEFAULT_USER_ID,
+                session_id=session_id,
+            )
+        self._session_ids.add(session_id)
+
     @override
     async def send_message(self, message: str, user_id: str, session_id: str) -> str:
-        chat_session = self._chat_session_storage.get_session(
-            app_name=self._DEFAULT_APP_NAME,
-            user_id=self._DEFAULT_USER_ID,
-            session_id=str(session_id),
-        )
-        if chat_session is None:
+        if session_id not in self._session_ids:
             raise ValueError(f"Unknown session ID: {session_id}")
 
-        runner = Runner(
-            app_name=self._DEFAULT_APP_NAME,
-            agent=self._agent,
-            session_service=self._chat_session_storage,
-        )
-
         content = types.Content(role="user", parts=[types.Part(text=message)])
 
+        # The event stream is drained rather than left at the final response:
+        # abandoning ADK's generator mid-way finalises it from another context.
         final_response_text = "Sorry, I cannot respond at the moment."
-        for event in runner.run(
-            user_id=self._DEFAULT_USER_ID,
-            session_id=session_id,
-            new_message=content,
-        ):
-            if event.is_final_response():
-                if event.content and event.content.parts:
-                    final_response_text = event.content.parts[0].text
-                elif event.actions and event.actions.escalate:
-                    final_response_text = f"Agent escalated: {event.error_message or 'No specific message.'}"
-                break
+        await self._load_session(session_id)
+        try:
+            with self._observe_call():
+                async for event in self._runner.run_async(
+                    user_id=self._DEFAULT_USER_ID,
+                    session_id=session_id,
+                    new_message=content,
+                ):
+                    if event.is_final_response():
+                        if event.content and event.content.parts:
+                            final_response_text = event.content.parts[0].text
+                        elif event.actions and event.actions.escalate:
+                            final_response_text = f"Agent escalated: {event.error_message or 'No specific message.'}"
+        finally:
+            await self._save_session(session_id)
 
         return final_response_text
 
+    @override
+    async def stream_message(
+        self, message: str, user_id: str, session_id: str
+    ) -> AsyncIterator[str]:
+        if session_id not in self._session_ids:
+            raise ValueError(f"Unknown session ID: {session_id}")
+
+        content = types.Content(role="user", parts=[types.Part(text=message)])
+
+        # With SSE streaming every model response arrives as partial chunks
+        # followed by one aggregated event repeating the whole text.
+        streamed_partial = False
+        await self._load_session(session_id)
+        try:
+            with self._observe_call():
+                async for event in self._runner.run_async(
+                    user_id=self._DEFAULT_USER_ID,
+                    session_id=session_id,
+                    new_message=content,
+                    run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+                ):
+                    text = "".join(
+                        part.text
+                        for part in (event.content.parts if event.content else None) or []
+                        if part.text
+                    )
+                    if event.partial:
+                        streamed_partial = streamed_partial or bool(text)
+                        yield text
+                        continue
+
+                    if event.is_final_response():
+                        if text and not streamed_partial:
+                            yield text
+                        elif not text and event.actions and event.actions.escalate:
+                            yield f"Agent escalated: {event.error_message or 'No specific message.'}"
+                    streamed_partial = False
+        finally:
+            await self._save_session(session_id)
+
+    async def _load_session(self, session_id: str) -> None:
+        if self._redis_sessions is not None:
+            await self._redis_sessions.load(session_id)
+
+    async def _save_session(self, session_id: str) -> None:
+        if self._redis_sessions is not None:
+            await self._redis_sessions.save(session_id)
+
+    def _observe_call(self):
+        return observe_llm_call(
+            agent=self.get_name(),
+            model=self._config.llm.gemini.model,
+            is_rate_limit=lambda e: isinstance(e, errors.APIError) and e.code == 429,
+        )
 
     @override
-    def is_known_chat_session(self, session_id: str) -> bool:
-        return self._chat_session_storage.get_session(
-            app_name=self._DEFAULT_APP_NAME,
-            user_id=self._DEFAULT_USER_ID,
-            session_id=session_id,
-        ) is not None
+    def retry_after(self, error: Exception) -> float | None:
+        if not (isinstance(error, errors.APIError) and error.code == 429):
+            return None
+        delay = retry_after_seconds(getattr(error.response, "headers", None))
+        if delay is not None:
+            return delay
+        # The API states the delay in the error's RetryInfo, e.g. "13s".
+        body = error.details if isinstance(error.details, dict) else {}
+        for detail in (body.get("error") or body).get("details") or []:
+            if detail.get("@type", "").endswith("google.rpc.RetryInfo"):
+                try:
+                    return float(detail.get("retryDelay", "").rstrip("s"))
+                except ValueError:
+                    pass
+        return 0.0
+
+    @override
+    async def is_known_chat_session(self, session_id: str) -> bool:
+        return session_id in self._session_ids
 
     @override
     def get_name(self) -> str:
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, override
+
+import redis.asyncio as redis
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService, Session
+
+from ..config.config import RedisConfig
+from ..repository.redis_client import get_redis_client
+
+
+class RedisSessionService(InMemorySessionService):
+    """
+    ADK session service whose sessions are kept in Redis, so that any replica
+    can carry on a Gemini chat.
+
+    ADK 0.5 calls its session service synchronously, so the sessions are
+    still served from memory: `load` brings the session up to date with Redis
+    before a turn, and `save` writes the events the turn added after it. In
+    between, the session lease guarantees that no other replica writes it.
+    """
+
+    def __init__(self, redis_config: RedisConfig, app_name: str, user_id: str):
+        super().__init__()
+        self._client = get_redis_client(redis_config)
+        self._app_name = app_name
+        self._user_id = user_id
+        self._key_prefix = "gemini_session:"
+        self._sessions_key = "gemini_sessions"
+        self._created_channel = "gemini_session_events:created"
+        self._scan_count = redis_config.scan_count
+
+        # Per session, the events in memory that are also in Redis, and the
+        # ones appended since.
+        self._saved: Dict[str, int] = {}
+        self._unsaved: Dict[str, List[Event]] = {}
+
+    @override
+    def append_event(self, session: Session, event: Event) -> Event:
+        event = super().append_event(session=session, event=event)
+        if not event.partial:
+            self._unsaved.setdefault(session.id, []).append(event)
+        return event
+
+    async def create(self, session_id: str) -> None:
+        self.create_session(
+            app_name=self._app_name, user_id=self._user_id, session_id=session_id
+        )
+        self._saved[session_id] = 0
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.sadd(self._sessions_key, session_id)
+            pipe.publish(self._created_channel, session_id)
+            await pipe.execute()
+
+    async def load(self, session_id: str) -> None:
+        """
+        Reads the events another replica added to the session since this one
+        last saw it, or the whole session if it is not in memory.
+        """
+        key = f"{self._key_prefix}{session_id}"
+        saved = self._saved.get(session_id)
+        length = await self._client.llen(key)
+        if saved == length:
+            return
+
+        if saved is None or saved > length:
+            self._unsaved.pop(session_id, None)
+            self.delete_session(
+                app_name=self._app_name, user_id=self._user_id, session_id=session_id
+            )
+            self.create_session(
+                app_name=self._app_name, user_id=self._user_id, session_id=session_id
+            )
+            saved = 0
+
+        session = self.get_session(
+            app_name=self._app_name, user_id=self._user_id, session_id=session_id
+        )
+        events = await self._client.lrange(key, saved, -1)
+        for data in events:
+            # Skips this class's bookkeeping, which would count them as unsaved.
+            InMemorySessionService.append_event(
+                self, session=session, event=Event.model_validate_json(data)
+            )
+        self._saved[session_id] = saved + len(events)
+        logging.info(f"Loaded {len(events)} events of Gemini session {session_id}.")
+
+    async def save(self, session_id: str) -> None:
+        events = self._unsaved.pop(session_id, [])
+        if not events:
+            return
+        length = await self._client.rpush(
+            f"{self._key_prefix}{session_id}",
+            *(event.model_dump_json() for event in events),
+        )
+        self._saved[session_id] = length
+
+    async def scan_session_ids(self) -> AsyncIterator[str]:
+        async for session_id in self._client.sscan_iter(
+            self._sessions_key, count=self._scan_count
+        ):
+            yield session_id.decode()
+
+    async def watch_created_sessions(self) -> AsyncIterator[str | None]:
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self._created_channel)
+                yield None
+                async for message in pubsub.listen():
+                    yield message["data"].decode()
+            except redis.RedisError as e:
+                logging.warning(f"Lost Gemini session subscription: {e}. Retrying...")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
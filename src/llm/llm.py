@@ -1,9 +1,83 @@
+import time
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Iterator, Mapping
+
+from ..metrics import registry
+
+_call_latency = registry.histogram(
+    "llm_call_seconds",
+    "Latency of a model call, including the tool calls it makes.",
+    label_names=("agent", "model"),
+)
+_call_errors = registry.counter(
+    "llm_errors_total",
+    "Model calls that failed.",
+    label_names=("agent", "model"),
+)
+_rate_limits = registry.counter(
+    "llm_rate_limits_total",
+    "Model calls rejected by the provider's rate limits.",
+    label_names=("agent", "model"),
+)
+active_sessions = registry.gauge(
+    "llm_active_sessions",
+    "Chat sessions known to an agent.",
+    label_names=("agent",),
+)
+
+
+def retry_after_seconds(headers: Mapping[str, str] | None) -> float | None:
+    """
+    Reads how long a rate-limited client should wait from the Retry-After
+    headers of a response, if they give a number.
+    """
+    for header, divisor in (("retry-after-ms", 1000), ("retry-after", 1)):
+        value = (headers or {}).get(header)
+        try:
+            return float(value) / divisor
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+@contextmanager
+def observe_llm_call(
+    agent: str, model: str | None, is_rate_limit: Callable[[Exception], bool]
+) -> Iterator[None]:
+    """
+    Records the latency and failures of the model call made in the block.
+    For a streamed call, the time the caller spends on each chunk is included.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        _call_errors.inc(agent=agent, model=model)
+        if is_rate_limit(e):
+            _rate_limits.inc(agent=agent, model=model)
+        raise
+    finally:
+        _call_latency.observe(time.perf_counter() - start, agent=agent, model=model)
 
 
 class LLMInteractor(ABC):
+    _usage_listener: Callable[[str, int, int], None] | None = None
+
+    async def start(self) -> None:
+        """
+        Prepares the LLM for serving, e.g. loads the known chat sessions.
+        """
+        return None
+
+    async def stop(self) -> None:
+        """
+        Releases the resources acquired by start.
+        """
+        return None
+
     @abstractmethod
-    def start_new_chat_session(self, session_id: str) -> None:
+    async def start_new_chat_session(self, session_id: str) -> None:
         """
         Starts a new chat session with the given session ID.
         """
@@ -21,6 +95,39 @@ class LLMInteractor(ABC):
         """
         raise NotImplementedError
 
+    async def stream_message(
+        self, message: str, user_id: str, session_id: str
+    ) -> AsyncIterator[str]:
+        """
+        Sends a message to the LLM and streams the response back as text
+        chunks. LLMs without streaming support yield the whole response at once.
+
+        Args:
+            message (str): The message to send.
+            session_id (str): The ID of the chat session.
+        """
+        yield await self.send_message(
+            message=message, user_id=user_id, session_id=session_id
+        )
+
+    def retry_after(self, error: Exception) -> float | None:
+        """
+        Returns how long the provider asked to wait if the error is one of
+        its rate limits, 0 if it did not say, and None for other errors.
+        """
+        return None
+
+    def report_usage(self, listener: Callable[[str, int, int], None]) -> None:
+        """
+        Has listener(session_id, requests, tokens) called with what the model
+        calls of each turn used, for LLMs whose provider reports it.
+        """
+        self._usage_listener = listener
+
+    def _report_usage(self, session_id: str, requests: int, tokens: int) -> None:
+        if self._usage_listener is not None:
+            self._usage_listener(session_id, requests, tokens)
+
     @abstractmethod
     def get_name(self) -> str:
         """
@@ -29,8 +136,9 @@ class LLMInteractor(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def is_known_chat_session(self, session_id: str) -> bool:
+    async def is_known_chat_session(self, session_id: str) -> bool:
         """
-        Checks if the given session ID is known.
+        Checks if the given session ID is known. This is called for every
+        message the bot sees, so it should not perform any I/O.
         """
         raise NotImplementedError
@@ -1,53 +1,587 @@
+import asyncio
 import logging
-from typing import Any, Dict
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Set
 
-from agents.mcp import MCPServerStdio
+import mcp.types
+from agents.mcp import MCPServer, MCPServerStdio
+from mcp import ClientSession
+from mcp import Tool as MCPTool
+
+from ..config.config import RedisConfig
+from ..metrics import registry
+from ..repository.redis_client import get_redis_client
+from .deadline import remaining_seconds
+from .tool_result_cache import ToolResultCache
+
+_list_tools_latency = registry.histogram(
+    "mcp_list_tools_seconds",
+    "Latency of listing tools from an MCP server.",
+    label_names=("server",),
+)
+_list_tools_cache_hits = registry.counter(
+    "mcp_list_tools_cache_hits_total",
+    "Tool listings served from the tool-schema cache.",
+    label_names=("server",),
+)
+_list_tools_saved = registry.counter(
+    "mcp_list_tools_saved_seconds_total",
+    "Listing latency avoided by the tool-schema cache, based on the last real listing.",
+    label_names=("server",),
+)
+_server_start_latency = registry.histogram(
+    "mcp_server_start_seconds",
+    "Time to spawn and initialise an MCP server.",
+    label_names=("server", "kind"),
+)
+_server_restarts = registry.counter(
+    "mcp_server_restarts_total",
+    "Restarts of MCP servers after a failed health check or connection attempt.",
+    label_names=("server",),
+)
+_server_up = registry.gauge(
+    "mcp_server_up",
+    "Whether the MCP server is connected.",
+    label_names=("server",),
+)
+
+_tool_call_latency = registry.histogram(
+    "mcp_tool_call_seconds",
+    "Latency of MCP tool calls, including ones answered from the result cache.",
+    label_names=("server", "tool"),
+)
+_tool_call_errors = registry.counter(
+    "mcp_tool_call_errors_total",
+    "MCP tool calls that raised or returned an error result.",
+    label_names=("server", "tool"),
+)
+
+_instance_in_flight = registry.gauge(
+    "mcp_instance_in_flight_calls",
+    "Tool calls queued on or running in an MCP server instance.",
+    label_names=("server", "instance"),
+)
+_pool_scale_ups = registry.counter(
+    "mcp_pool_scale_ups_total",
+    "Instances added to an MCP server pool because of sustained queueing.",
+    label_names=("server",),
+)
+
+_INITIAL_RESTART_BACKOFF_SECONDS = 1.0
+_MAX_RESTART_BACKOFF_SECONDS = 60.0
+
+
+class ManagedMCPServer(MCPServerStdio):
+    """
+    Stdio MCP server whose tool schemas are cached until the server announces
+    a change with `notifications/tools/list_changed`, or until the cache is
+    invalidated explicitly.
+
+    The server process is owned by a supervisor task, which spawns it (on
+    start, or on first use for lazy servers), pings it periodically and
+    respawns it with exponential backoff when it stops answering. Connecting
+    and cleaning up happen in that same task, as the stdio transport requires.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        params: Dict[str, Any],
+        cache_tools_list: bool,
+        timeout: int,
+        lazy: bool = False,
+        health_check_interval: float = 30,
+    ):
+        super().__init__(
+            params=params,
+            cache_tools_list=cache_tools_list,
+            name=name,
+            client_session_timeout_seconds=timeout,
+        )
+        self.lazy = lazy
+        self._health_check_interval = health_check_interval
+        self._last_list_tools_seconds = 0.0
+
+        self._supervisor: asyncio.Task | None = None
+        self._first_attempt: asyncio.Future | None = None
+        self._ready = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._check_health = asyncio.Event()
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the server is connected and answering.
+        """
+        return self._ready.is_set()
+
+    async def start(self) -> bool:
+        """
+        Starts the supervisor and waits for the first connection attempt.
+        Returns whether the server is connected; if not, it keeps retrying in
+        the background.
+        """
+        if self._supervisor is None:
+            self._first_attempt = asyncio.get_running_loop().create_future()
+            self._supervisor = asyncio.create_task(
+                self._supervise(), name=f"mcp-server-{self.name}"
+            )
+        await asyncio.shield(self._first_attempt)
+        return self._ready.is_set()
+
+    async def stop(self) -> None:
+        if self._supervisor is None:
+            return
+
+        self._stopping.set()
+        self._check_health.set()
+        await self._supervisor
+        self._supervisor = None
+
+    async def _supervise(self) -> None:
+        backoff = _INITIAL_RESTART_BACKOFF_SECONDS
+        kind = "start"
+        while not self._stopping.is_set():
+            start = time.perf_counter()
+            try:
+                await self.connect()
+            except Exception as e:
+                logging.error(
+                    f"MCP server {self.name} failed to {kind}, "
+                    f"retrying in {backoff:.0f}s: {e}"
+                )
+                self._resolve_first_attempt()
+                _server_restarts.inc(server=self.name)
+                await self._sleep_unless_stopping(backoff)
+                backoff = min(backoff * 2, _MAX_RESTART_BACKOFF_SECONDS)
+                kind = "restart"
+                continue
+
+            elapsed = time.perf_counter() - start
+            _server_start_latency.observe(elapsed, server=self.name, kind=kind)
+            _server_up.set(1, server=self.name)
+            logging.info(f"MCP server {self.name} {kind}ed in {elapsed:.2f}s.")
+            backoff = _INITIAL_RESTART_BACKOFF_SECONDS
+            self.invalidate_tools_cache()
+            self._ready.set()
+            self._resolve_first_attempt()
+
+            await self._monitor()
+
+            self._ready.clear()
+            _server_up.set(0, server=self.name)
+            await self.cleanup()
+            if not self._stopping.is_set():
+                _server_restarts.inc(server=self.name)
+                kind = "restart"
+
+    async def _monitor(self) -> None:
+        # Returns when the server should be stopped or restarted.
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(
+                    self._check_health.wait(),
+                    timeout=self._health_check_interval or None,
+                )
+            except TimeoutError:
+                pass
+            self._check_health.clear()
+            if self._stopping.is_set():
+                return
+
+            try:
+                await asyncio.wait_for(
+                    self.session.send_ping(),
+                    timeout=self.client_session_timeout_seconds,
+                )
+            except Exception as e:
+                logging.warning(
+                    f"MCP server {self.name} failed its health check: {e!r}. Restarting."
+                )
+                return
+
+    async def _sleep_unless_stopping(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except TimeoutError:
+            pass
+
+    def _resolve_first_attempt(self) -> None:
+        if self._first_attempt is not None and not self._first_attempt.done():
+            self._first_attempt.set_result(None)
+
+    async def _wait_until_ready(self) -> None:
+        if self._supervisor is None:
+            logging.info(f"Lazily starting MCP server {self.name} on first use.")
+            await self.start()
+        if not self._ready.is_set():
+            await asyncio.wait_for(
+                self._ready.wait(), timeout=self.client_session_timeout_seconds
+            )
+
+    async def connect(self):
+        # Mirrors MCPServerStdio.connect, plus a message handler so that tool
+        # list changes pushed by the server invalidate the cache.
+        try:
+            read, write = await self.exit_stack.enter_async_context(
+                self.create_streams()
+            )
+            session = await self.exit_stack.enter_async_context(
+                ClientSession(
+                    read,
+                    write,
+                    timedelta(seconds=self.client_session_timeout_seconds)
+                    if self.client_session_timeout_seconds
+                    else None,
+                    message_handler=self._handle_message,
+                )
+            )
+            await session.initialize()
+            self.session = session
+        except Exception as e:
+            logging.error(f"Error initializing MCP server {self.name}: {e}")
+            await self.cleanup()
+            raise
+
+    async def list_tools(self) -> list[MCPTool]:
+        await self._wait_until_ready()
+        if self.cache_tools_list and not self._cache_dirty and self._tools_list:
+            _list_tools_cache_hits.inc(server=self.name)
+            _list_tools_saved.inc(self._last_list_tools_seconds, server=self.name)
+            return self._tools_list
+
+        start = time.perf_counter()
+        tools = await super().list_tools()
+        self._last_list_tools_seconds = time.perf_counter() - start
+        _list_tools_latency.observe(self._last_list_tools_seconds, server=self.name)
+        return tools
+
+    async def call_tool(
+        self, tool_name: str, arguments: dict[str, Any] | None
+    ) -> mcp.types.CallToolResult:
+        await self._wait_until_ready()
+
+        # Calls made for a turn give up with it, rather than after the
+        # session's timeout.
+        remaining = remaining_seconds()
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError(f"No time left to call tool {tool_name}.")
+
+        try:
+            async with asyncio.timeout(remaining) as deadline:
+                return await self.session.call_tool(tool_name, arguments)
+        except Exception:
+            # Tool failures come back as results; an exception other than the
+            # turn running out of time hints at a dead or stuck server, so
+            # check on it right away.
+            if not deadline.expired():
+                self._check_health.set()
+            raise
+
+    async def _handle_message(self, message: Any) -> None:
+        if isinstance(message, mcp.types.ServerNotification) and isinstance(
+            message.root, mcp.types.ToolListChangedNotification
+        ):
+            logging.info(f"Tool list of MCP server {self.name} changed.")
+            self.invalidate_tools_cache()
+
+
+class MCPServerPool(MCPServer):
+    """
+    Set of instances of one MCP server that look like a single server to the
+    agents. Each tool call goes to the instance with the fewest calls in
+    flight, so a slow call does not hold up unrelated conversations. While
+    every instance stays busy for longer than scale_up_after, another
+    instance is spawned, up to max_instances; instances idle for longer than
+    scale_down_after are stopped again, down to min_instances.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        create_instance: Callable[[str], ManagedMCPServer],
+        min_instances: int = 1,
+        max_instances: int = 1,
+        lazy: bool = False,
+        scale_up_after: float = 2.0,
+        scale_down_after: float = 300.0,
+        result_cache: ToolResultCache | None = None,
+        result_ttls: Dict[str, float] | None = None,
+    ):
+        self._name = name
+        self._create_instance = create_instance
+        self._min_instances = max(min_instances, 1)
+        self._max_instances = max(max_instances, self._min_instances)
+        self.lazy = lazy
+        self._scale_up_after = scale_up_after
+        self._scale_down_after = scale_down_after
+
+        self._next_instance_id = 0
+        self._instances: List[ManagedMCPServer] = [
+            self._new_instance() for _ in range(self._min_instances)
+        ]
+        self._in_flight: Dict[str, int] = {}
+        self._last_used: Dict[str, float] = {}
+        self._busy_since: float | None = None
+        self._scaling: asyncio.Task | None = None
+        # Instances being stopped after scaling down.
+        self._stopping: Set[asyncio.Task] = set()
+
+        # tool name -> TTL in seconds, for the tools whose results are cached
+        self._result_cache = result_cache
+        self._result_ttls = result_ttls or {}
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def connect(self):
+        await self.start()
+
+    async def cleanup(self):
+        await self.stop()
+
+    async def start(self) -> bool:
+        connected = await asyncio.gather(
+            *(instance.start() for instance in self._instances)
+        )
+        return any(connected)
+
+    async def stop(self) -> None:
+        scaling = self._scaling
+        if scaling is not None:
+            scaling.cancel()
+            try:
+                await scaling
+            except asyncio.CancelledError:
+                pass
+        await asyncio.gather(
+            *(instance.stop() for instance in self._instances), *self._stopping
+        )
+
+    def invalidate_tools_cache(self) -> None:
+        for instance in self._instances:
+            instance.invalidate_tools_cache()
+
+    async def list_tools(self) -> list[MCPTool]:
+        # Every instance runs the same server, so any healthy one can answer.
+        instance = next(
+            (instance for instance in self._instances if instance.ready),
+            self._instances[0],
+        )
+        return await instance.list_tools()
+
+    async def call_tool(
+        self, tool_name: str, arguments: dict[str, Any] | None
+    ) -> mcp.types.CallToolResult:
+        start = time.perf_counter()
+        try:
+            result = await self._call_tool(tool_name, arguments)
+        except Exception:
+            _tool_call_errors.inc(server=self._name, tool=tool_name)
+            raise
+        finally:
+            _tool_call_latency.observe(
+                time.perf_counter() - start, server=self._name, tool=tool_name
+            )
+        if result.isError:
+            _tool_call_errors.inc(server=self._name, tool=tool_name)
+        return result
+
+    async def _call_tool(
+        self, tool_name: str, arguments: dict[str, Any] | None
+    ) -> mcp.types.CallToolResult:
+        ttl = self._result_ttls.get(tool_name)
+        if ttl is None or self._result_cache is None:
+            return await self._dispatch(tool_name, arguments)
+
+        key = ToolResultCache.make_key(self._name, tool_name, arguments)
+        result = await self._result_cache.get(self._name, tool_name, key)
+        if result is not None:
+            return result
+
+        result = await self._dispatch(tool_name, arguments)
+        if not result.isError:
+            await self._result_cache.set(key, result, ttl)
+        return result
+
+    async def _dispatch(
+        self, tool_name: str, arguments: dict[str, Any] | None
+    ) -> mcp.types.CallToolResult:
+        instance = self._pick_instance()
+        self._track(instance, 1)
+        try:
+            return await instance.call_tool(tool_name, arguments)
+        finally:
+            self._track(instance, -1)
+
+    def _new_instance(self) -> ManagedMCPServer:
+        instance_name = f"{self._name}#{self._next_instance_id}"
+        self._next_instance_id += 1
+        return self._create_instance(instance_name)
+
+    def _track(self, instance: ManagedMCPServer, delta: int) -> None:
+        in_flight = self._in_flight.get(instance.name, 0) + delta
+        self._in_flight[instance.name] = in_flight
+        self._last_used[instance.name] = time.monotonic()
+        _instance_in_flight.set(in_flight, server=self._name, instance=instance.name)
+
+    def _pick_instance(self) -> ManagedMCPServer:
+        instance = min(self._instances, key=lambda i: self._in_flight.get(i.name, 0))
+        now = time.monotonic()
+        if self._in_flight.get(instance.name, 0) == 0:
+            self._busy_since = None
+            self._maybe_scale_down(now)
+            return instance
+
+        if self._busy_since is None:
+            self._busy_since = now
+        elif (
+            now - self._busy_since >= self._scale_up_after
+            and len(self._instances) < self._max_instances
+            and self._scaling is None
+        ):
+            self._scaling = asyncio.create_task(self._scale_up())
+        return instance
+
+    async def _scale_up(self) -> None:
+        instance = self._new_instance()
+        try:
+            if await instance.start():
+                self._instances.append(instance)
+                self._busy_since = None
+                _pool_scale_ups.inc(server=self._name)
+                logging.info(
+                    f"Scaled MCP server {self._name} up to {len(self._instances)} instances."
+                )
+            else:
+                await instance.stop()
+        except asyncio.CancelledError:
+            # Stopped mid-start: do not leak the half-started instance.
+            await instance.stop()
+            raise
+        finally:
+            self._scaling = None
+
+    def _maybe_scale_down(self, now: float) -> None:
+        if len(self._instances) <= self._min_instances:
+            return
+
+        for instance in self._instances[self._min_instances :]:
+            if (
+                self._in_flight.get(instance.name, 0) == 0
+                and now - self._last_used.get(instance.name, now) >= self._scale_down_after
+            ):
+                self._instances.remove(instance)
+                self._in_flight.pop(instance.name, None)
+                self._last_used.pop(instance.name, None)
+                _instance_in_flight.set(0, server=self._name, instance=instance.name)
+                task = asyncio.create_task(instance.stop())
+                self._stopping.add(task)
+                task.add_done_callback(self._stopping.discard)
+                logging.info(
+                    f"Scaled MCP server {self._name} down to {len(self._instances)} instances."
+                )
+                return
 
 
 class MCPServerManager:
-    def __init__(self, mcp_server_config: Dict[str, Any], timeout: int = 60):
+    def __init__(
+        self,
+        mcp_server_config: Dict[str, Any],
+        timeout: int = 60,
+        redis_config: RedisConfig | None = None,
+    ):
+        result_cache_config = mcp_server_config.get("resultCache", {})
+        self._result_cache = ToolResultCache(
+            max_entries=result_cache_config.get("maxEntries", 1024),
+            redis_client=get_redis_client(redis_config)
+            if result_cache_config.get("redis", False) and redis_config is not None
+            else None,
+        )
         self._mcp_servers = [
-            (
-                server_name,
-                MCPServerStdio(
-                    params={
-                        "command": server_config.get("command"),
-                        "args": server_config.get("args"),
-                        "env": server_config.get("env"),
-                    },
-                    client_session_timeout_seconds=timeout,
-                ),
-            )
+            (server_name, self._create_pool(server_name, server_config, timeout))
             for server_name, server_config in mcp_server_config.get(
                 "servers", {}
             ).items()
         ]
 
+    def _create_pool(
+        self, server_name: str, server_config: Dict[str, Any], timeout: int
+    ) -> MCPServerPool:
+        lazy = server_config.get("lazy", False)
+        return MCPServerPool(
+            name=server_name,
+            create_instance=lambda instance_name: ManagedMCPServer(
+                name=instance_name,
+                params={
+                    "command": server_config.get("command"),
+                    "args": server_config.get("args"),
+                    "env": server_config.get("env"),
+                },
+                cache_tools_list=server_config.get("cacheTools", True),
+                timeout=timeout,
+                lazy=lazy,
+                health_check_interval=server_config.get(
+                    "healthCheckIntervalSeconds", 30
+                ),
+            ),
+            min_instances=server_config.get("min", 1),
+            max_instances=server_config.get("max", 1),
+            lazy=lazy,
+            scale_up_after=server_config.get("scaleUpAfterSeconds", 2.0),
+            scale_down_after=server_config.get("scaleDownAfterSeconds", 300.0),
+            result_cache=self._result_cache,
+            result_ttls={
+                tool_name: tool_config.get("ttlSeconds", 60)
+                for tool_name, tool_config in server_config.get(
+                    "cacheResults", {}
+                ).items()
+            },
+        )
+
     async def start(self):
         if not self._mcp_servers:
             raise ValueError("No MCP servers configured to start.")
 
-        logging.info(f"Starting {len(self._mcp_servers)} MCP servers...")
-        for name, server in self._mcp_servers:
-            logging.info(f"  Starting MCP server: {name}")
-            await server.connect()
+        eager = [(name, server) for name, server in self._mcp_servers if not server.lazy]
+        logging.info(
+            f"Starting {len(eager)} MCP servers, "
+            f"{len(self._mcp_servers) - len(eager)} more on first use..."
+        )
+        start = time.perf_counter()
+        connected = await asyncio.gather(*(server.start() for _, server in eager))
         logging.info(
-            f"{len(self._mcp_servers)} MCP servers started. [{
-                ', '.join([name for name, _ in self._mcp_servers])
+            f"{sum(connected)}/{len(eager)} MCP servers started in "
+            f"{time.perf_counter() - start:.2f}s. [{
+                ', '.join([name for (name, _), ok in zip(eager, connected) if ok])
             }]"
         )
 
     def get(self):
         return [server for _, server in self._mcp_servers]
 
+    def invalidate_tools_cache(self, server_name: str | None = None) -> list[str]:
+        """
+        Drops the cached tool schemas of the given server, or of every server.
+        Returns the names of the servers that were invalidated.
+        """
+        invalidated = []
+        for name, server in self._mcp_servers:
+            if server_name is None or name == server_name:
+                server.invalidate_tools_cache()
+                invalidated.append(name)
+        return invalidated
+
     async def stop(self):
         if not self._mcp_servers:
             raise ValueError("No MCP servers configured to stop.")
 
         logging.info(f"Stopping {len(self._mcp_servers)} MCP servers...")
-
-        for name, server in self._mcp_servers:
-            logging.info(f"  Stopping MCP server: {name}")
-            await server.cleanup()
-
-        logging.info(f"{len(self._mcp_servers)} MCP servers stopped.")
+        start = time.perf_counter()
+        await asyncio.gather(*(server.stop() for _, server in self._mcp_servers))
+        logging.info(
+            f"{len(self._mcp_servers)} MCP servers stopped in "
+            f"{time.perf_counter() - start:.2f}s."
+        )
@@ -1,17 +1,29 @@
-import base64
+import asyncio
 import logging
 import os
-from typing import override
+from typing import AsyncIterator, List, Tuple, override
 
-import logfire
-import nest_asyncio
-from agents import Agent, Runner, set_default_openai_key
-from openai.types.responses import EasyInputMessageParam
+import openai
+from agents import Agent, RunConfig, Runner, set_default_openai_key
+from agents.result import RunResultBase
+from openai.types.responses import EasyInputMessageParam, ResponseTextDeltaEvent
 
 from ..config.config import Config
-from ..llm.llm import LLMInteractor
+from ..llm.context_window import (
+    ContextWindow,
+    HistoryCompactor,
+    estimate_tokens,
+)
+from ..llm.llm import (
+    LLMInteractor,
+    active_sessions,
+    observe_llm_call,
+    retry_after_seconds,
+)
 from ..llm.mcp_server import MCPServerManager
-from ..repository.chat_session import ChatSessionStorage, Record
+from ..repository.chat_session import ChatSession, ChatSessionStorage, Record
+from ..repository.session_index import SessionIndex
+from ..tracing import is_sampled
 
 
 class OpenAiAgent(LLMInteractor):
@@ -24,34 +36,28 @@ class OpenAiAgent(LLMInteractor):
         self._config = config
         self._mcp_server_manager = mcp_server_manager
         self._chat_session_storage = chat_session_storage
+        self._session_index = SessionIndex(chat_session_storage)
 
-        self._set_up_langfuse()
-        self._initialize()
-
-    def _set_up_langfuse(self):
-        os.environ["LANGFUSE_SECRET_KEY"] = self._config.llm.openai.tracing.langfuse.secret_key
-        os.environ["LANGFUSE_PUBLIC_KEY"] = self._config.llm.openai.tracing.langfuse.public_key
-        os.environ["LANGFUSE_HOST"] = self._config.llm.openai.tracing.langfuse.host
-        LANGFUSE_AUTH = base64.b64encode(
-            f"{os.environ.get('LANGFUSE_PUBLIC_KEY')}:{os.environ.get('LANGFUSE_SECRET_KEY')}".encode()
-        ).decode()
-        os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"] = (
-            os.environ.get("LANGFUSE_HOST") + "/api/public/otel"
+        context_window_config = config.llm.openai.context_window
+        self._context_window = ContextWindow(
+            max_tokens=context_window_config.budget_for(config.llm.openai.model),
         )
-        os.environ["OTEL_EXPORTER_OTLP_HEADERS"] = (
-            f"Authorization=Basic {LANGFUSE_AUTH}"
+        self._compactor = (
+            HistoryCompactor(
+                chat_session_storage=chat_session_storage,
+                summarize=self._summarize,
+            )
+            if context_window_config.compaction
+            else None
         )
-        os.environ["OPENAI_API_KEY"] = self._config.llm.openai.api_key
-
-        nest_asyncio.apply()
 
-        logfire.configure(
-            service_name="my_agent_service",
-            send_to_logfire=False,
+        self._initialize()
+        active_sessions.set_function(
+            lambda: len(self._session_index), agent=self.get_name()
         )
-        logfire.instrument_openai_agents()
 
     def _initialize(self):
+        os.environ["OPENAI_API_KEY"] = self._config.llm.openai.api_key
         set_default_openai_key(self._config.llm.openai.api_key)
         self._agent = Agent(
             name=self._config.llm.agent_name,
@@ -59,59 +65,168 @@ class OpenAiAgent(LLMInteractor):
             model=self._config.llm.openai.model,
             mcp_servers=[s for s in self._mcp_server_manager.get()],
         )
+        self._summary_agent = Agent(
+            name=f"{self._config.llm.agent_name} summarizer",
+            instructions=(
+                "Summarise the conversation you are given so that it can replace "
+                "it as context for the rest of the chat. Keep facts, decisions, "
+                "open questions and user preferences; drop pleasantries."
+            ),
+            model=self._config.llm.openai.context_window.summary_model
+            or self._config.llm.openai.model,
+        )
+
+    @override
+    async def start(self) -> None:
+        await self._session_index.start()
 
     @override
-    def start_new_chat_session(self, session_id: str) -> None:
-        self._chat_session_storage.create_session(
+    async def stop(self) -> None:
+        await self._session_index.stop()
+        if self._compactor is not None:
+            await self._compactor.stop()
+
+    @override
+    async def start_new_chat_session(self, session_id: str) -> None:
+        await self._chat_session_storage.create_session(
             session_id=session_id,
             system_prompt=self._config.llm.system_prompt,
         )
+        self._session_index.add(session_id)
 
     @override
     async def send_message(self, message: str, user_id: str, session_id: str) -> str:
-        chat_session = self._chat_session_storage.get_session(session_id)
-        if chat_session is None:
-            raise ValueError(f"Unknown session ID: {session_id}")
-
-        chat_session = self._chat_session_storage.add_message(
-            session_id=chat_session.id,
-            record=Record(
-                user_id=user_id,
-                role="user",
-                message=message,
-            ),
+        chat_session, input_messages = await self._begin_turn(
+            message=message, user_id=user_id, session_id=session_id
         )
 
-        res = await Runner.run(
-            starting_agent=self._agent,
-            input=[
-                EasyInputMessageParam(
-                    content=r.message,
-                    role=r.role,
-                    type="message",
-                )
-                for r in chat_session.history
-            ],
+        with self._observe_call():
+            res = await Runner.run(
+                starting_agent=self._agent,
+                input=input_messages,
+                run_config=self._run_config(),
+            )
+
+        self._report_run_usage(session_id, res)
+        if res.final_output is None:
+            logging.warning("No final output from OpenAI agent")
+            return None
+
+        await self._record_reply(chat_session.id, res.final_output)
+        return res.final_output
+
+    @override
+    async def stream_message(
+        self, message: str, user_id: str, session_id: str
+    ) -> AsyncIterator[str]:
+        chat_session, input_messages = await self._begin_turn(
+            message=message, user_id=user_id, session_id=session_id
         )
 
+        with self._observe_call():
+            res = Runner.run_streamed(
+                starting_agent=self._agent,
+                input=input_messages,
+                run_config=self._run_config(),
+            )
+            try:
+                async for event in res.stream_events():
+                    if event.type == "raw_response_event" and isinstance(
+                        event.data, ResponseTextDeltaEvent
+                    ):
+                        yield event.data.delta
+            finally:
+                res.cancel()
+
+        self._report_run_usage(session_id, res)
+        # stream_events swallows the cancellation of this turn, by its deadline
+        # or by a newer message, and just ends the stream; raise it again.
+        task = asyncio.current_task()
+        if task is not None and task.cancelling():
+            raise asyncio.CancelledError()
         if res.final_output is None:
             logging.warning("No final output from OpenAI agent")
+            return
+
+        await self._record_reply(chat_session.id, res.final_output)
+
+    def _run_config(self) -> RunConfig:
+        # Turns that are not sampled skip the SDK's tracing entirely.
+        return RunConfig(tracing_disabled=not is_sampled())
+
+    def _observe_call(self):
+        return observe_llm_call(
+            agent=self.get_name(),
+            model=self._config.llm.openai.model,
+            is_rate_limit=lambda e: isinstance(e, openai.RateLimitError),
+        )
+
+    def _report_run_usage(self, session_id: str, res: RunResultBase) -> None:
+        usage = res.context_wrapper.usage
+        self._report_usage(session_id, usage.requests, usage.total_tokens)
+
+    @override
+    def retry_after(self, error: Exception) -> float | None:
+        if not isinstance(error, openai.RateLimitError):
             return None
+        return retry_after_seconds(error.response.headers) or 0.0
 
-        self._chat_session_storage.add_message(
-            session_id=chat_session.id,
+    async def _begin_turn(
+        self, message: str, user_id: str, session_id: str
+    ) -> Tuple[ChatSession, List[EasyInputMessageParam]]:
+        chat_session = await self._chat_session_storage.add_message(
+            session_id=session_id,
+            record=Record(
+                user_id=user_id,
+                role="user",
+                message=message,
+                token_count=estimate_tokens(message),
+            ),
+        )
+        if chat_session is None:
+            # The storage may have dropped the session since it was indexed.
+            self._session_index.discard(session_id)
+            raise ValueError(f"Unknown session ID: {session_id}")
+
+        context = self._context_window.select(chat_session)
+        if context.compact_until and self._compactor is not None:
+            self._compactor.schedule(chat_session, context.compact_until)
+
+        return chat_session, [
+            EasyInputMessageParam(
+                content=r.message,
+                role=r.role,
+                type="message",
+            )
+            for r in context.records
+        ]
+
+    async def _record_reply(self, session_id: str, reply: str) -> None:
+        await self._chat_session_storage.add_message(
+            session_id=session_id,
             record=Record(
                 user_id="bot",
                 role="assistant",
-                message=res.final_output,
+                message=reply,
+                token_count=estimate_tokens(reply),
             ),
         )
 
+    async def _summarize(self, summary: Record | None, records: List[Record]) -> str:
+        transcript = "\n".join(f"{r.role}: {r.message}" for r in records)
+        if summary is not None:
+            transcript = f"{summary.message}\n\n{transcript}"
+
+        res = await Runner.run(
+            starting_agent=self._summary_agent,
+            input=transcript,
+            run_config=self._run_config(),
+        )
         return res.final_output
 
     @override
-    def is_known_chat_session(self, session_id: str) -> bool:
-        return self._chat_session_storage.get_session(session_id) is not None
+    async def is_known_chat_session(self, session_id: str) -> bool:
+        return session_id in self._session_index
 
     @override
     def get_name(self) -> str:
@@ -0,0 +1,430 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Sequence, Tuple, override
+
+import redis.asyncio as redis
+
+from ..config.config import Config, QuotaConfig, RateLimitConfig, RedisConfig
+from ..metrics import registry
+from ..repository.redis_client import get_redis_client
+from .context_window import estimate_tokens
+from .llm import LLMInteractor
+
+_wait_latency = registry.histogram(
+    "llm_rate_limit_wait_seconds",
+    "Time a turn waited for the provider's rate limits before its model call.",
+    label_names=("agent",),
+)
+_concurrency_limit = registry.gauge(
+    "llm_concurrency_limit",
+    "Model calls allowed in flight, as adapted to the provider's rate limits.",
+    label_names=("agent",),
+)
+_limited_turns = registry.counter(
+    "llm_rate_limited_turns_total",
+    "Turns turned down by a quota or a rate limit, by reason.",
+    label_names=("agent", "reason"),
+)
+
+# Takes the cost of a call from every bucket, or from none of them if one is
+# short or the limit is paused, and returns how many milliseconds to wait
+# before trying again. With force set, the cost is taken regardless, which can
+# leave the buckets in debt.
+#
+# KEYS: pause, then one key per bucket
+# ARGV: force (0 or 1), then per bucket: capacity, refill per ms, cost
+_TAKE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local force = ARGV[1] == '1'
+local paused = redis.call('PTTL', KEYS[1])
+if paused > 0 and not force then
+    return paused
+end
+
+local wait = 0
+local left = {}
+for i = 2, #KEYS do
+    local capacity = tonumber(ARGV[3 * i - 4])
+    local rate = tonumber(ARGV[3 * i - 3])
+    local cost = tonumber(ARGV[3 * i - 2])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'at')
+    local tokens = tonumber(state[1]) or capacity
+    local at = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(now - at, 0) * rate)
+    local short = math.min(cost, capacity) - tokens
+    if short > 0 then
+        wait = math.max(wait, math.ceil(short / rate))
+    end
+    left[i] = math.min(capacity, tokens - cost)
+end
+if wait > 0 and not force then
+    return wait
+end
+
+for i = 2, #KEYS do
+    local capacity = tonumber(ARGV[3 * i - 4])
+    local rate = tonumber(ARGV[3 * i - 3])
+    redis.call('HSET', KEYS[i], 'tokens', tostring(left[i]), 'at', now)
+    -- A full bucket is the same as none.
+    redis.call('PEXPIRE', KEYS[i], math.ceil((capacity - math.min(left[i], 0)) / rate))
+end
+return 0
+"""
+
+
+@dataclass
+class BucketCost:
+    key: str
+    per_minute: float
+    cost: float
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Rate limited ({reason}), retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """
+    Token buckets that refill continuously up to a minute's worth of their
+    rate, kept in this process.
+    """
+
+    def __init__(self):
+        # key -> (tokens, monotonic time they were counted at)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._paused_until: Dict[str, float] = {}
+
+    async def take(self, pause_key: str | None, costs: Sequence[BucketCost]) -> float:
+        """
+        Takes the costs from their buckets if they all have enough tokens and
+        the limit is not paused. Returns 0 if so, or else how many seconds to
+        wait before trying again.
+        """
+        return self._take(pause_key, costs, force=False)
+
+    async def charge(self, pause_key: str | None, costs: Sequence[BucketCost]) -> None:
+        """
+        Takes the costs even if the buckets go in debt, e.g. to account for
+        what a call used beyond its estimate. Negative costs refund tokens.
+        """
+        self._take(pause_key, costs, force=True)
+
+    async def pause(self, pause_key: str, seconds: float) -> None:
+        self._paused_until[pause_key] = time.monotonic() + seconds
+
+    def _take(
+        self, pause_key: str | None, costs: Sequence[BucketCost], force: bool
+    ) -> float:
+        now = time.monotonic()
+        paused = self._paused_until.get(pause_key, 0.0) - now
+        if paused > 0 and not force:
+            return paused
+
+        wait = 0.0
+        left: List[float] = []
+        for cost in costs:
+            rate = cost.per_minute / 60
+            tokens, at = self._buckets.get(cost.key, (cost.per_minute, now))
+            tokens = min(cost.per_minute, tokens + (now - at) * rate)
+            wait = max(wait, (min(cost.cost, cost.per_minute) - tokens) / rate)
+            left.append(min(cost.per_minute, tokens - cost.cost))
+        if wait > 0 and not force:
+            return wait
+
+        for cost, tokens in zip(costs, left):
+            self._buckets[cost.key] = (tokens, now)
+        return 0.0
+
+
+class RedisTokenBuckets(TokenBuckets):
+    """
+    Token buckets in Redis, shared by every replica of a cluster. Their
+    clock is the Redis server's, so replicas need not agree on the time.
+
+    When Redis fails, calls go through unlimited rather than failing too.
+    """
+
+    def __init__(self, redis_config: RedisConfig):
+        super().__init__()
+        self._client = get_redis_client(redis_config)
+        self._take_script = self._client.register_script(_TAKE_SCRIPT)
+
+    @override
+    async def take(self, pause_key: str | None, costs: Sequence[BucketCost]) -> float:
+        return await self._run(pause_key, costs, force=False)
+
+    @override
+    async def charge(self, pause_key: str | None, costs: Sequence[BucketCost]) -> None:
+        await self._run(pause_key, costs, force=True)
+
+    @override
+    async def pause(self, pause_key: str, seconds: float) -> None:
+        try:
+            await self._client.set(pause_key, 1, px=max(int(seconds * 1000), 1))
+        except redis.RedisError as e:
+            logging.warning(f"Failed to pause rate limit {pause_key}: {e}")
+
+    async def _run(
+        self, pause_key: str | None, costs: Sequence[BucketCost], force: bool
+    ) -> float:
+        args: List[object] = [1 if force else 0]
+        for cost in costs:
+            args += [cost.per_minute, cost.per_minute / 60000, cost.cost]
+        try:
+            wait_ms = await self._take_script(
+                keys=[pause_key or "", *(cost.key for cost in costs)], args=args
+            )
+        except redis.RedisError as e:
+            logging.warning(f"Failed to check rate limits, letting the call through: {e}")
+            return 0.0
+        return wait_ms / 1000
+
+
+def create_token_buckets(config: Config) -> TokenBuckets:
+    # Replicas of a cluster share the provider's limits, so they share buckets.
+    if config.cluster.enabled:
+        return RedisTokenBuckets(config.cluster.redis)
+    return TokenBuckets()
+
+
+class AdaptiveConcurrency:
+    """
+    Caps the calls in flight with AIMD: the cap halves when the provider
+    rate-limits a call and grows back by about one per cap's worth of calls
+    that succeed.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int):
+        self._max_limit = max_limit
+        self._min_limit = min_limit
+        self._limit = float(max_limit)
+        self._in_flight = 0
+        self._changed = asyncio.Condition()
+        self._decreased_at = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """
+        Waits for room under the cap and holds it for the block, which
+        receives the monotonic time the call started.
+        """
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        try:
+            yield time.monotonic()
+        finally:
+            async with self._changed:
+                self._in_flight -= 1
+                self._changed.notify_all()
+
+    def succeeded(self) -> None:
+        self._limit = min(self._max_limit, self._limit + 1 / self._limit)
+
+    def rate_limited(self, started_at: float) -> None:
+        # Calls already in flight at the last decrease ran into the same
+        # limit; counting them too would collapse the cap.
+        if started_at < self._decreased_at:
+            return
+        self._limit = max(self._min_limit, self._limit / 2)
+        self._decreased_at = time.monotonic()
+        logging.info(f"Rate limited, allowing {self.limit} calls in flight.")
+
+
+class RateLimitedAgent(LLMInteractor):
+    """
+    Keeps an agent within its provider's requests and tokens per minute for
+    the model, and adapts its concurrency to the rate limits it still hits.
+
+    A turn reserves one request and the tokens turns have been using lately
+    before it calls the model. Once it is over, what it actually used is
+    charged on top, as reported by the agent or else estimated from the text.
+    When the provider rate-limits a call anyway, every caller holds off for
+    as long as it asked and the turn is turned down.
+    """
+
+    def __init__(
+        self,
+        agent: LLMInteractor,
+        model: str | None,
+        limits: RateLimitConfig,
+        buckets: TokenBuckets,
+    ):
+        self._agent = agent
+        self._limits = limits
+        self._buckets = buckets
+        self._key = f"llm_rate_limit:{agent.get_name()}:{model}"
+        self._concurrency = AdaptiveConcurrency(
+            max_limit=limits.max_concurrency, min_limit=limits.min_concurrency
+        )
+        # Tokens a turn is expected to use, learnt from the turns before it.
+        self._expected_tokens = 0.0
+        # session ID -> (requests, tokens) reported for its running turn
+        self._usage: Dict[str, Tuple[int, int]] = {}
+
+        agent.report_usage(self._add_usage)
+        _concurrency_limit.set_function(
+            lambda: self._concurrency.limit, agent=agent.get_name()
+        )
+
+    @override
+    async def start(self) -> None:
+        await self._agent.start()
+
+    @override
+    async def stop(self) -> None:
+        await self._agent.stop()
+
+    @override
+    async def start_new_chat_session(self, session_id: str) -> None:
+        await self._agent.start_new_chat_session(session_id)
+
+    @override
+    async def send_message(self, message: str, user_id: str, session_id: str) -> str:
+        async with self._admitted(message, session_id) as reply:
+            response = await self._agent.send_message(
+                message=message, user_id=user_id, session_id=session_id
+            )
+            reply.append(response or "")
+        return response
+
+    @override
+    async def stream_message(
+        self, message: str, user_id: str, session_id: str
+    ) -> AsyncIterator[str]:
+        async with self._admitted(message, session_id) as reply:
+            async for chunk in self._agent.stream_message(
+                message=message, user_id=user_id, session_id=session_id
+            ):
+                reply.append(chunk)
+                yield chunk
+
+    @override
+    def retry_after(self, error: Exception) -> float | None:
+        return self._agent.retry_after(error)
+
+    @override
+    async def is_known_chat_session(self, session_id: str) -> bool:
+        return await self._agent.is_known_chat_session(session_id)
+
+    @override
+    def get_name(self) -> str:
+        return self._agent.get_name()
+
+    @asynccontextmanager
+    async def _admitted(self, message: str, session_id: str) -> AsyncIterator[List[str]]:
+        """
+        Waits until the call fits the limits and records how it went. The
+        block appends the reply's text to the list it receives.
+        """
+        reserved = max(estimate_tokens(message), round(self._expected_tokens))
+        reply: List[str] = []
+        start = time.perf_counter()
+        async with self._concurrency.slot() as started_at:
+            await self._wait_for_room(reserved, start)
+            _wait_latency.observe(time.perf_counter() - start, agent=self.get_name())
+
+            self._usage.pop(session_id, None)
+            try:
+                yield reply
+            except Exception as e:
+                retry_after = self._agent.retry_after(e)
+                if retry_after is None:
+                    raise
+                self._concurrency.rate_limited(started_at)
+                # Providers that do not say how long to wait get a second.
+                retry_after = retry_after or 1.0
+                await self._buckets.pause(f"{self._key}:paused", retry_after)
+                _limited_turns.inc(agent=self.get_name(), reason="provider")
+                raise RateLimitExceeded("provider", retry_after) from e
+            else:
+                self._concurrency.succeeded()
+            finally:
+                await self._charge_usage(session_id, message, reply, reserved)
+
+    async def _wait_for_room(self, tokens: int, start: float) -> None:
+        while True:
+            wait = await self._buckets.take(
+                f"{self._key}:paused", self._costs(requests=1, tokens=tokens)
+            )
+            if wait <= 0:
+                return
+            waited = time.perf_counter() - start
+            if waited + wait > self._limits.max_wait_seconds:
+                _limited_turns.inc(agent=self.get_name(), reason="backlog")
+                raise RateLimitExceeded("backlog", wait)
+            await asyncio.sleep(wait)
+
+    async def _charge_usage(
+        self, session_id: str, message: str, reply: List[str], reserved: int
+    ) -> None:
+        requests, tokens = self._usage.pop(session_id, (1, 0))
+        if not tokens:
+            tokens = estimate_tokens(message) + estimate_tokens("".join(reply))
+        self._expected_tokens = 0.8 * self._expected_tokens + 0.2 * tokens
+        costs = self._costs(requests=requests - 1, tokens=tokens - reserved)
+        if costs:
+            await self._buckets.charge(None, costs)
+
+    def _add_usage(self, session_id: str, requests: int, tokens: int) -> None:
+        previous_requests, previous_tokens = self._usage.get(session_id, (0, 0))
+        self._usage[session_id] = (previous_requests + requests, previous_tokens + tokens)
+
+    def _costs(self, requests: int, tokens: int) -> List[BucketCost]:
+        costs = []
+        if self._limits.requests_per_minute is not None and requests:
+            costs.append(
+                BucketCost(
+                    f"{self._key}:requests", self._limits.requests_per_minute, requests
+                )
+            )
+        if self._limits.tokens_per_minute is not None and tokens:
+            costs.append(
+                BucketCost(f"{self._key}:tokens", self._limits.tokens_per_minute, tokens)
+            )
+        return costs
+
+
+class TurnQuotas:
+    """
+    Per-user and per-guild limits on the turns answered per minute, so that
+    one busy user or server cannot use up the provider's limits for everyone.
+    """
+
+    def __init__(self, config: QuotaConfig, buckets: TokenBuckets):
+        self._config = config
+        self._buckets = buckets
+
+    async def take(self, agent: str, user_id: str, guild_id: str) -> None:
+        """
+        Counts a turn against the quotas of its user and guild, or raises
+        RateLimitExceeded if either is used up.
+        """
+        costs = []
+        if self._config.user_turns_per_minute is not None:
+            costs.append(
+                BucketCost(
+                    f"turn_quota:user:{user_id}", self._config.user_turns_per_minute, 1
+                )
+            )
+        if self._config.guild_turns_per_minute is not None:
+            costs.append(
+                BucketCost(
+                    f"turn_quota:guild:{guild_id}", self._config.guild_turns_per_minute, 1
+                )
+            )
+        wait = await self._buckets.take(None, costs)
+        if wait > 0:
+            _limited_turns.inc(agent=agent, reason="quota")
+            raise RateLimitExceeded("quota", wait)
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+import redis.asyncio as redis
+from mcp.types import CallToolResult
+
+from ..metrics import registry
+
+_lookups = registry.counter(
+    "mcp_tool_result_cache_lookups_total",
+    "Lookups in the MCP tool result cache by outcome (memory, redis or miss).",
+    label_names=("server", "tool", "outcome"),
+)
+
+
+class ToolResultCache:
+    """
+    TTL + LRU cache of MCP tool results, keyed by server, tool and the
+    canonicalised arguments. The in-process tier is always used; the optional
+    Redis tier lets replicas share results.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        redis_client: redis.Redis | None = None,
+        key_prefix: str = "mcp_tool_result:",
+    ):
+        self._max_entries = max_entries
+        self._redis = redis_client
+        self._key_prefix = key_prefix
+        # key -> (expires at, monotonic clock; result)
+        self._entries: OrderedDict[str, Tuple[float, CallToolResult]] = OrderedDict()
+
+    @staticmethod
+    def make_key(server: str, tool: str, arguments: Dict[str, Any] | None) -> str:
+        canonical = json.dumps(
+            arguments or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+        digest = hashlib.sha256(canonical.encode()).hexdigest()
+        return f"{server}:{tool}:{digest}"
+
+    async def get(self, server: str, tool: str, key: str) -> CallToolResult | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                _lookups.inc(server=server, tool=tool, outcome="memory")
+                return result
+            del self._entries[key]
+
+        if self._redis is not None:
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    pipe.get(f"{self._key_prefix}{key}")
+                    pipe.pttl(f"{self._key_prefix}{key}")
+                    data, ttl_ms = await pipe.execute()
+            except redis.RedisError as e:
+                logging.warning(f"Tool result cache lookup in Redis failed: {e}")
+                data = None
+
+            if data is not None and ttl_ms > 0:
+                result = CallToolResult.model_validate_json(data)
+                self._put_local(key, result, ttl_ms / 1000)
+                _lookups.inc(server=server, tool=tool, outcome="redis")
+                return result
+
+        _lookups.inc(server=server, tool=tool, outcome="miss")
+        return None
+
+    async def set(self, key: str, result: CallToolResult, ttl: float) -> None:
+        self._put_local(key, result, ttl)
+
+        if self._redis is not None:
+            try:
+                await self._redis.set(
+                    f"{self._key_prefix}{key}",
+                    result.model_dump_json(),
+                    px=int(ttl * 1000),
+                )
+            except redis.RedisError as e:
+                logging.warning(f"Tool result cache write to Redis failed: {e}")
+
+    def _put_local(self, key: str, result: CallToolResult, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
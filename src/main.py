@@ -1,61 +1,215 @@
 import asyncio
+import importlib
 import logging
+import os
+import socket
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
 
-from src.llm.gemini import GeminiAgent
-
-from .config.config import load_config, load_mcp_server_config
+from .config.config import Config, load_config, load_mcp_server_config
 from .discord.discord_client import DiscordBot
+from .llm.llm import LLMInteractor
 from .llm.mcp_server import MCPServerManager
-from .llm.openai import OpenAiAgent
-from .repository.mem_chat_session_storage import MemChatSessionStorage
-from .repository.redis_chat_session_storage import RedisChatSessionStorage
+from .llm.rate_limit import RateLimitedAgent, create_token_buckets
+from .metrics import MetricsServer, registry
+from .repository.chat_session import ChatSessionStorage
+from .repository.redis_client import close_connection_pools
+from .repository.storage_factory import create_chat_session_storage
+from .scheduler.session_lease import SessionLeases
+from .scheduler.turn_queue import TurnQueue
+from .tracing import Tracing
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)8s] (%(name)s) %(message)s",
 )
 
+_startup_phase = registry.histogram(
+    "startup_phase_seconds",
+    "Time spent in each phase of startup.",
+    label_names=("phase",),
+)
+
+
+@contextmanager
+def startup_phase(phase: str) -> Iterator[None]:
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    _startup_phase.observe(elapsed, phase=phase)
+    logging.info(f"Startup phase {phase} took {elapsed:.2f}s.")
+
+
+def import_llm_providers(config: Config) -> None:
+    """
+    Imports the modules of the providers enabled in the config, and only those.
+    """
+    if config.llm.openai is not None:
+        importlib.import_module(".llm.openai", __package__)
+    if config.llm.gemini is not None:
+        importlib.import_module(".llm.gemini", __package__)
+
+
+def create_llm_agents(
+    config: Config,
+    mcp_server_manager: MCPServerManager,
+    chat_session_storage: ChatSessionStorage | None,
+) -> List[LLMInteractor]:
+    """
+    Creates the agents of the providers enabled in the config. Disabled
+    providers are never imported, so their SDKs cost nothing at startup.
+    """
+    llm_agents: List[LLMInteractor] = []
+    if config.llm.openai is not None:
+        from .llm.openai import OpenAiAgent
+
+        llm_agents.append(
+            OpenAiAgent(
+                config=config,
+                mcp_server_manager=mcp_server_manager,
+                chat_session_storage=chat_session_storage,
+            )
+        )
+    if config.llm.gemini is not None:
+        from .llm.gemini import GeminiAgent
+
+        llm_agents.append(
+            GeminiAgent(config=config, mcp_server_manager=mcp_server_manager)
+        )
+    return [wrap_in_rate_limits(config, agent) for agent in llm_agents]
+
+
+def wrap_in_rate_limits(config: Config, agent: LLMInteractor) -> LLMInteractor:
+    provider = getattr(config.llm, agent.get_name())
+    if provider.rate_limit is None:
+        return agent
+    return RateLimitedAgent(
+        agent,
+        model=provider.model,
+        limits=provider.rate_limit,
+        buckets=create_token_buckets(config),
+    )
+
+
+def get_replica_id(config: Config) -> str:
+    return config.cluster.replica_id or f"{socket.gethostname()}-{os.getpid()}"
+
+
+async def warm_up_mcp_servers(mcp_server_manager: MCPServerManager) -> None:
+    # Runs alongside the gateway login; tool calls wait for their server.
+    try:
+        with startup_phase("mcp"):
+            await mcp_server_manager.start()
+    except Exception as e:
+        logging.exception(f"Failed to start MCP servers: {e}")
+
+
+async def wait_for_gateway(discord_bot: DiscordBot) -> None:
+    with startup_phase("gateway"):
+        await discord_bot.wait_until_ready()
+
 
 async def main():
-    config = load_config()
-    mcp_server_config = load_mcp_server_config()
+    with startup_phase("config"):
+        config = load_config()
+        mcp_server_config = load_mcp_server_config()
 
-    mem_chat_session_storage = MemChatSessionStorage()
-    redis_chat_session_storage = RedisChatSessionStorage(
-        redis_config=config.llm.openai.chat_history.redis,
+    # Only the OpenAI agent keeps its history in a chat session storage.
+    chat_history = config.llm.openai.chat_history if config.llm.openai else None
+    chat_session_storage = (
+        create_chat_session_storage(chat_history) if chat_history else None
     )
 
     mcp_server_manager = MCPServerManager(
         mcp_server_config=mcp_server_config,
+        redis_config=chat_history.redis if chat_history else None,
     )
 
-    try:
-        await mcp_server_manager.start()
-
-        openai_agent = OpenAiAgent(
-            config=config,
-            mcp_server_manager=mcp_server_manager,
-            chat_session_storage=redis_chat_session_storage,
+    metrics_server = (
+        MetricsServer(
+            host=config.metrics.host,
+            port=config.metrics.port,
+            path=config.metrics.path,
         )
+        if config.metrics.enabled
+        else None
+    )
 
-        gemini_agent = GeminiAgent(
-            config=config,
-            mcp_server_manager=mcp_server_manager,
-        )
+    tracing = Tracing(config.tracing)
 
-        discord_bot = DiscordBot(
-            token=config.discord.bot_token,
-            llm_agents={
-                openai_agent.get_name(): openai_agent,
-                gemini_agent.get_name(): gemini_agent,
-            },
-            config=config,
+    session_leases = (
+        SessionLeases(
+            redis_config=config.cluster.redis,
+            replica_id=get_replica_id(config),
+            ttl_ms=config.cluster.lease_ttl_ms,
         )
+        if config.cluster.enabled
+        else None
+    )
+    # In the gateway role turns are queued for the workers (src.worker).
+    turn_queue = (
+        TurnQueue(config.cluster.redis, partitions=config.cluster.job_partitions)
+        if config.cluster.role == "gateway"
+        else None
+    )
+
+    # Filled in once the agents are up; the handlers only look agents up per
+    # message, so the bot can log in to Discord while they start.
+    llm_agents: Dict[str, LLMInteractor] = {}
+    discord_bot = DiscordBot(
+        token=config.discord.bot_token,
+        llm_agents=llm_agents,
+        config=config,
+        mcp_server_manager=mcp_server_manager,
+        session_leases=session_leases,
+        turn_queue=turn_queue,
+    )
+    startup_tasks: List[asyncio.Task] = []
+
+    try:
+        tracing.start()
+        # The gateway's agents only keep track of sessions; the workers use MCP.
+        if turn_queue is None:
+            startup_tasks.append(
+                asyncio.create_task(warm_up_mcp_servers(mcp_server_manager))
+            )
+        startup_tasks.append(asyncio.create_task(wait_for_gateway(discord_bot)))
+
+        with startup_phase("agents"):
+            # Provider SDKs take seconds to import; doing it off the event loop
+            # lets the MCP servers spawn and the bot log in meanwhile.
+            await asyncio.gather(
+                asyncio.to_thread(import_llm_providers, config),
+                discord_bot.login(),
+                *([metrics_server.start()] if metrics_server is not None else []),
+                *([chat_session_storage.start()] if chat_session_storage else []),
+                *([session_leases.start()] if session_leases is not None else []),
+            )
+            for agent in create_llm_agents(
+                config, mcp_server_manager, chat_session_storage
+            ):
+                llm_agents[agent.get_name()] = agent
+            await asyncio.gather(*(agent.start() for agent in llm_agents.values()))
+
         await discord_bot.start()
     except asyncio.CancelledError:
         logging.info("Shutting down gracefully...")
+        for task in startup_tasks:
+            task.cancel()
         await mcp_server_manager.stop()
         await discord_bot.stop()
+        await asyncio.gather(*(agent.stop() for agent in llm_agents.values()))
+        if chat_session_storage is not None:
+            await chat_session_storage.flush()
+            await chat_session_storage.close()
+        # Only once the history is written may another replica take over.
+        if session_leases is not None:
+            await session_leases.stop()
+        await close_connection_pools()
+        tracing.stop()
+        if metrics_server is not None:
+            await metrics_server.stop()
         logging.info("All servers closed.")
 
 
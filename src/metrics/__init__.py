@@ -0,0 +1,11 @@
+from .metrics import Counter, Gauge, Histogram, MetricsRegistry, registry
+from .server import MetricsServer
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "MetricsServer",
+    "registry",
+]
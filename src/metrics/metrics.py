@@ -0,0 +1,212 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+_DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(self.label_names, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> Iterator[str]:
+        for key, value in list(self.values.items()):
+            yield f"{self.name}{self._labels(key)} {_format_value(value)}"
+
+    def render(self) -> str:
+        description = self.description.replace("\\", "\\\\").replace("\n", "\\n")
+        lines = [
+            f"# HELP {self.name} {description}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels: object) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: object) -> None:
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels: object) -> None:
+        """
+        Reads the value from function whenever the gauge is collected.
+        """
+        self._functions[self._key(labels)] = function
+
+    def get(self, **labels: object) -> float:
+        key = self._key(labels)
+        if key in self._functions:
+            return self._functions[key]()
+        return self.values.get(key, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        yield from super().samples()
+        for key, function in list(self._functions.items()):
+            yield f"{self.name}{self._labels(key)} {_format_value(function())}"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = _DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (+Inf last), sum, count.
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = ([0] * (len(self.buckets) + 1), [0.0, 0.0])
+            self.values[key] = series
+
+        counts, totals = series
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, totals) in list(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{self._labels(key, le)} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {_format_value(totals[0])}"
+            yield f"{self.name}_count{self._labels(key)} {_format_value(totals[1])}"
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of metrics. Asking twice for the same name returns
+    the same metric, so modules can declare what they use at import time.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(
+        self, name: str, description: str, label_names: Sequence[str] = ()
+    ) -> Counter:
+        return self._get_or_create(Counter, name, description, label_names)
+
+    def gauge(
+        self, name: str, description: str, label_names: Sequence[str] = ()
+    ) -> Gauge:
+        return self._get_or_create(Gauge, name, description, label_names)
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = _DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = Histogram(name, description, label_names, buckets)
+            self._metrics[name] = metric
+        if not isinstance(metric, Histogram):
+            raise ValueError(f"Metric {name} is already registered as another type.")
+        return metric
+
+    def collect(self) -> List[_Metric]:
+        return list(self._metrics.values())
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        return "".join(f"{metric.render()}\n" for metric in self.collect())
+
+    def _get_or_create(self, cls, name, description, label_names):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(name, description, label_names)
+            self._metrics[name] = metric
+        if not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as another type.")
+        return metric
+
+
+registry = MetricsRegistry()
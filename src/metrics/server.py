@@ -0,0 +1,47 @@
+import logging
+
+from aiohttp import web
+
+from .metrics import MetricsRegistry, registry
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer:
+    """
+    Serves the metrics registry over HTTP in the Prometheus text format.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        path: str = "/metrics",
+        metrics_registry: MetricsRegistry = registry,
+    ):
+        self._host = host
+        self._port = port
+        self._path = path
+        self._registry = metrics_registry
+        self._runner: web.AppRunner | None = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get(self._path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+        logging.info(f"Serving metrics on http://{self._host}:{self._port}{self._path}")
+
+    async def stop(self) -> None:
+        if self._runner is None:
+            return
+
+        await self._runner.cleanup()
+        self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self._registry.render().encode(),
+            headers={"Content-Type": _CONTENT_TYPE},
+        )
@@ -1,16 +1,34 @@
+import functools
 import json
+import time
 from abc import ABC, abstractmethod
 from dataclasses import asdict, dataclass
-from typing import Any, Dict, List, Literal
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Literal
 
 from openai.types.responses import EasyInputMessageParam
 
+from src.metrics import registry
 
-@dataclass
+_operation_latency = registry.histogram(
+    "chat_session_storage_seconds",
+    "Latency of chat session storage operations, by backend and operation.",
+    label_names=("backend", "operation"),
+)
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You’re a versatile helper, assisting me with a wide range of questions."
+)
+
+# Rough per-record overhead of the Record object and its string headers.
+_RECORD_OVERHEAD_BYTES = 160
+
+
+@dataclass(slots=True)
 class Record:
     user_id: str
     role: Literal["user", "assistant", "system", "developer"]
     message: str
+    token_count: int | None = None
 
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
@@ -22,11 +40,20 @@ class Record:
     def from_dict(cls, data: Dict[str, Any]) -> "Record":
         return cls(**data)
 
+    def approximate_size(self) -> int:
+        """
+        Approximate memory footprint of the record in bytes.
+        """
+        return _RECORD_OVERHEAD_BYTES + len(self.message) + len(self.user_id)
+
 
 @dataclass
 class ChatSession:
     id: int
     history: List[Record]
+    # Summary of history[1:summary_until], written by history compaction.
+    summary: Record | None = None
+    summary_until: int = 0
 
     def get_history(self) -> List[EasyInputMessageParam]:
         return [
@@ -39,23 +66,108 @@ class ChatSession:
         ]
 
 
+@dataclass
+class SessionInfo:
+    id: str
+    length: int
+    # Whether the session currently lives in the cold archive.
+    archived: bool = False
+
+
+def timed(method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Records the latency of a storage method in chat_session_storage_seconds.
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self: "ChatSessionStorage", *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            _operation_latency.observe(
+                time.perf_counter() - start,
+                backend=self.backend,
+                operation=method.__name__,
+            )
+
+    return wrapper
+
+
 class ChatSessionStorage(ABC):
+    # Name of the backend in metrics.
+    backend = "unknown"
+
     @abstractmethod
-    def create_session(self, session_id: int, system_prompt: str | None) -> ChatSession:
+    async def create_session(
+        self, session_id: int, system_prompt: str | None
+    ) -> ChatSession:
         raise NotImplementedError
 
     @abstractmethod
-    def add_message(
+    async def add_message(
         self,
         session_id: int,
         record: Record,
-    ) -> ChatSession:
+    ) -> ChatSession | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_session(self, session_id: int) -> ChatSession | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_summary(
+        self, session_id: int, summary: Record, summary_until: int
+    ) -> None:
         raise NotImplementedError
 
     @abstractmethod
-    def get_session(self, session_id: int) -> ChatSession | None:
+    def get_all_sessions(self) -> AsyncIterator[ChatSession]:
+        """
+        Iterates over every stored session with its history, holding only a
+        batch of sessions in memory at a time.
+        """
         raise NotImplementedError
 
     @abstractmethod
-    def get_all_sessions(self) -> Dict[int, ChatSession]:
+    def list_sessions(self) -> AsyncIterator[SessionInfo]:
+        """
+        Iterates over the ID and length of every stored session without
+        reading or decoding their histories.
+        """
         raise NotImplementedError
+
+    async def scan_session_ids(self) -> AsyncIterator[str]:
+        """
+        Iterates over the IDs of every stored session.
+        """
+        async for info in self.list_sessions():
+            yield info.id
+
+    @abstractmethod
+    def watch_created_sessions(self) -> AsyncIterator[str | None]:
+        """
+        Iterates over the IDs of sessions as they are created, including by
+        other processes sharing the storage. Yields None each time the feed is
+        (re)established, since sessions created before that point are missed.
+        """
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        """
+        Starts any background work of the storage.
+        """
+        return None
+
+    async def flush(self) -> None:
+        """
+        Persists any write the storage has buffered.
+        """
+        return None
+
+    async def close(self) -> None:
+        """
+        Releases any connection held by the storage.
+        """
+        return None
@@ -0,0 +1,73 @@
+"""
+Exports the configured chat history as JSON lines, one session per line.
+
+Sessions are streamed from the storage, so the export never holds more than
+one batch of them in memory.
+
+    uv run -m src.repository.export_sessions [--metadata-only] > sessions.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from dataclasses import asdict
+
+from src.config.config import load_config
+from src.repository.redis_client import close_connection_pools
+from src.repository.storage_factory import create_chat_session_storage
+
+
+async def export(metadata_only: bool) -> None:
+    openai_config = load_config().llm.openai
+    if openai_config is None:
+        raise SystemExit("Chat history is kept by the OpenAI agent, which is disabled.")
+    chat_history = openai_config.chat_history
+    if chat_history.storage not in ("redis", "sqlite"):
+        raise SystemExit(f"Cannot export from {chat_history.storage!r} storage.")
+
+    storage = create_chat_session_storage(chat_history)
+    count = 0
+    try:
+        if metadata_only:
+            async for info in storage.list_sessions():
+                print(json.dumps(asdict(info)))
+                count += 1
+        else:
+            async for chat_session in storage.get_all_sessions():
+                print(
+                    json.dumps(
+                        {
+                            "id": str(chat_session.id),
+                            "history": [r.to_dict() for r in chat_session.history],
+                            "summary": chat_session.summary.to_dict()
+                            if chat_session.summary is not None
+                            else None,
+                            "summary_until": chat_session.summary_until,
+                        }
+                    )
+                )
+                count += 1
+    finally:
+        await storage.close()
+        await close_connection_pools()
+
+    logging.info(f"Exported {count} sessions.")
+
+
+if __name__ == "__main__":
+    # Logs go to stderr, so that stdout only holds the export.
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)8s] (%(name)s) %(message)s",
+        stream=sys.stderr,
+    )
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--metadata-only",
+        action="store_true",
+        help="only list the ID and length of each session",
+    )
+    args = parser.parse_args()
+    asyncio.run(export(args.metadata_only))
@@ -1,37 +1,239 @@
 import logging
-from typing import Dict
+import sys
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict
 
-from src.repository.chat_session import ChatSession, ChatSessionStorage, Record
+from src.metrics import registry
+from src.repository.chat_session import (
+    DEFAULT_SYSTEM_PROMPT,
+    ChatSession,
+    ChatSessionStorage,
+    Record,
+    SessionInfo,
+    timed,
+)
+
+_stored_bytes = registry.gauge(
+    "mem_chat_session_storage_bytes",
+    "Approximate memory held by the in-memory chat session storage.",
+)
+_stored_records = registry.gauge(
+    "mem_chat_session_storage_records",
+    "Records held by the in-memory chat session storage.",
+)
+_stored_sessions = registry.gauge(
+    "mem_chat_session_storage_sessions",
+    "Sessions held by the in-memory chat session storage.",
+)
+_evictions = registry.counter(
+    "mem_chat_session_storage_evictions_total",
+    "Sessions dropped from the in-memory chat session storage.",
+    label_names=("reason",),
+)
+
+
+def _compact(record: Record) -> Record:
+    # Roles and user IDs repeat across every session, so share one copy of each.
+    return Record(
+        user_id=sys.intern(str(record.user_id)),
+        role=sys.intern(record.role),
+        message=record.message,
+        token_count=record.token_count,
+    )
 
 
 class MemChatSessionStorage(ChatSessionStorage):
-    def __init__(self):
-        self.chat_sessions: Dict[int, ChatSession] = {}
+    """
+    Process-local session storage for single-node deployments.
+
+    Sessions are kept in LRU order and dropped once the total size or record
+    count goes over its cap, or once they have not been touched for
+    `idle_ttl` seconds. A cap or TTL of None disables that bound.
+    """
+
+    backend = "mem"
+
+    def __init__(
+        self,
+        max_bytes: int | None = None,
+        max_records: int | None = None,
+        idle_ttl: float | None = None,
+    ):
+        self._max_bytes = max_bytes
+        self._max_records = max_records
+        self._idle_ttl = idle_ttl
+
+        self.chat_sessions: OrderedDict[str, ChatSession] = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._last_access: Dict[str, float] = {}
+        self._total_bytes = 0
+        self._total_records = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._total_bytes
+
+    @property
+    def record_count(self) -> int:
+        return self._total_records
 
-    def create_session(self, session_id: int) -> ChatSession:
-        if session_id in self.chat_sessions:
+    @timed
+    async def create_session(
+        self, session_id: int, system_prompt: str | None
+    ) -> ChatSession:
+        session_id = str(session_id)
+        self._expire()
+
+        chat_session = self._touch(session_id)
+        if chat_session is not None:
             logging.warning(f"Session with ID {session_id} already exists. Ignoring.")
-            return self.chat_sessions.get(session_id)
+            return self._copy(chat_session)
+
+        chat_session = ChatSession(id=session_id, history=[])
+        self.chat_sessions[session_id] = chat_session
+        self._sizes[session_id] = 0
+        self._append(
+            chat_session,
+            Record(
+                user_id="developer",
+                role="system",
+                message=system_prompt or DEFAULT_SYSTEM_PROMPT,
+            ),
+        )
+        self._shrink()
+        return self._copy(chat_session)
 
-        new_session = ChatSession(id=session_id, history=[])
-        self.chat_sessions[session_id] = new_session
-        return new_session
+    @timed
+    async def add_message(self, session_id: int, record: Record) -> ChatSession | None:
+        session_id = str(session_id)
+        self._expire()
 
-    def add_message(self, session_id: int, record: Record) -> None:
-        if session_id not in self.chat_sessions:
+        chat_session = self._touch(session_id)
+        if chat_session is None:
             logging.error(
                 f"Session with ID {session_id} does not exist. Cannot add message."
             )
-            return
+            return None
 
-        self.chat_sessions[session_id].history.append(record)
+        self._append(chat_session, record)
+        self._shrink()
+        return self._copy(chat_session)
 
-    def get_session(self, session_id: int) -> ChatSession | None:
-        if session_id not in self.chat_sessions:
+    @timed
+    async def get_session(self, session_id: int) -> ChatSession | None:
+        session_id = str(session_id)
+        self._expire()
+
+        chat_session = self._touch(session_id)
+        if chat_session is None:
             logging.warning(f"Session with ID {session_id} does not exist.")
             return None
 
-        return self.chat_sessions.get(session_id)
+        return self._copy(chat_session)
+
+    @timed
+    async def set_summary(
+        self, session_id: int, summary: Record, summary_until: int
+    ) -> None:
+        session_id = str(session_id)
+        chat_session = self.chat_sessions.get(session_id)
+        if chat_session is None:
+            logging.error(
+                f"Session with ID {session_id} does not exist. Cannot set summary."
+            )
+            return
+
+        summary = _compact(summary)
+        delta = summary.approximate_size()
+        if chat_session.summary is not None:
+            delta -= chat_session.summary.approximate_size()
+
+        chat_session.summary = summary
+        chat_session.summary_until = summary_until
+        self._resize(session_id, delta, 0)
+        self._shrink()
+
+    async def get_all_sessions(self) -> AsyncIterator[ChatSession]:
+        self._expire()
+        for chat_session in list(self.chat_sessions.values()):
+            yield self._copy(chat_session)
+
+    async def list_sessions(self) -> AsyncIterator[SessionInfo]:
+        self._expire()
+        for chat_session in list(self.chat_sessions.values()):
+            yield SessionInfo(id=chat_session.id, length=len(chat_session.history))
+
+    async def watch_created_sessions(self) -> AsyncIterator[str | None]:
+        # Sessions never leave this process, so there is nothing to follow.
+        yield None
+
+    def _touch(self, session_id: str) -> ChatSession | None:
+        chat_session = self.chat_sessions.get(session_id)
+        if chat_session is not None:
+            self.chat_sessions.move_to_end(session_id)
+            self._last_access[session_id] = time.monotonic()
+        return chat_session
+
+    def _append(self, chat_session: ChatSession, record: Record) -> None:
+        record = _compact(record)
+        chat_session.history.append(record)
+        self._resize(chat_session.id, record.approximate_size(), 1)
+        self._last_access[chat_session.id] = time.monotonic()
+
+    def _resize(self, session_id: str, delta_bytes: int, delta_records: int) -> None:
+        self._sizes[session_id] += delta_bytes
+        self._total_bytes += delta_bytes
+        self._total_records += delta_records
+        self._report()
+
+    def _expire(self) -> None:
+        if self._idle_ttl is None:
+            return
+
+        # Sessions are in access order, so the idle ones are all at the front.
+        deadline = time.monotonic() - self._idle_ttl
+        while self.chat_sessions:
+            session_id = next(iter(self.chat_sessions))
+            if self._last_access[session_id] > deadline:
+                break
+            self._evict(session_id, reason="idle")
+
+    def _shrink(self) -> None:
+        # The most recently used session is kept even if it alone is over the
+        # cap, otherwise the session being written to would vanish under it.
+        while len(self.chat_sessions) > 1 and self._over_capacity():
+            self._evict(next(iter(self.chat_sessions)), reason="capacity")
+
+    def _over_capacity(self) -> bool:
+        return (
+            self._max_bytes is not None and self._total_bytes > self._max_bytes
+        ) or (
+            self._max_records is not None and self._total_records > self._max_records
+        )
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        chat_session = self.chat_sessions.pop(session_id)
+        self._total_bytes -= self._sizes.pop(session_id)
+        self._total_records -= len(chat_session.history)
+        del self._last_access[session_id]
+
+        _evictions.inc(reason=reason)
+        self._report()
+        logging.info(f"Evicted chat session {session_id} from memory ({reason}).")
+
+    def _report(self) -> None:
+        _stored_bytes.set(self._total_bytes)
+        _stored_records.set(self._total_records)
+        _stored_sessions.set(len(self.chat_sessions))
 
-    def get_all_sessions(self) -> Dict[int, ChatSession]:
-        return self.chat_sessions
+    @staticmethod
+    def _copy(chat_session: ChatSession) -> ChatSession:
+        # Callers get their own history list so that they cannot grow the
+        # stored session behind the accounting's back.
+        return ChatSession(
+            id=chat_session.id,
+            history=list(chat_session.history),
+            summary=chat_session.summary,
+            summary_until=chat_session.summary_until,
+        )
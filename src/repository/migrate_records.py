@@ -0,0 +1,97 @@
+"""
+Rewrites the JSON records of the Redis chat history in the compact format.
+
+Safe to run while the bot is serving: session lists are only ever appended
+to, so existing entries are replaced in place by index and new messages are
+left alone.
+
+    uv run -m src.repository.migrate_records [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+
+import redis.asyncio as redis
+
+from src.config.config import load_config
+from src.repository.record_codec import RecordCodec, is_json
+from src.repository.redis_client import close_connection_pools, get_redis_client
+
+_SESSION_KEY_PREFIX = "chat_session:"
+_SUMMARY_KEY_PREFIX = "chat_session_summary:"
+
+
+async def migrate_session(
+    client: redis.Redis, codec: RecordCodec, key: bytes, dry_run: bool
+) -> int:
+    entries = await client.lrange(key, 0, -1)
+    legacy = [(i, data) for i, data in enumerate(entries) if is_json(data)]
+    if not legacy or dry_run:
+        return len(legacy)
+
+    async with client.pipeline(transaction=False) as pipe:
+        for i, data in legacy:
+            pipe.lset(key, i, codec.encode(codec.decode(data)))
+        results = await pipe.execute(raise_on_error=False)
+
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        # The session was deleted or archived while it was being migrated.
+        logging.warning(f"Skipped {key.decode()}: {failed[0]}")
+        return 0
+    return len(legacy)
+
+
+async def migrate_summary(
+    client: redis.Redis, codec: RecordCodec, key: bytes, dry_run: bool
+) -> int:
+    data = await client.hget(key, "record")
+    if data is None or not is_json(data):
+        return 0
+    if not dry_run:
+        await client.hset(key, "record", codec.encode(codec.decode(data)))
+    return 1
+
+
+async def migrate(dry_run: bool) -> None:
+    openai_config = load_config().llm.openai
+    if openai_config is None:
+        raise SystemExit("Chat history is kept by the OpenAI agent, which is disabled.")
+    chat_history = openai_config.chat_history
+    client = get_redis_client(chat_history.redis)
+    codec = RecordCodec(
+        record_format="compact",
+        compress_threshold=chat_history.compress_threshold_bytes,
+    )
+
+    sessions = records = summaries = 0
+    try:
+        async for key in client.scan_iter(match=f"{_SESSION_KEY_PREFIX}*", count=500):
+            sessions += 1
+            records += await migrate_session(client, codec, key, dry_run)
+        async for key in client.scan_iter(match=f"{_SUMMARY_KEY_PREFIX}*", count=500):
+            summaries += await migrate_summary(client, codec, key, dry_run)
+    finally:
+        await client.aclose()
+        await close_connection_pools()
+
+    verb = "Would migrate" if dry_run else "Migrated"
+    logging.info(
+        f"{verb} {records} records and {summaries} summaries across {sessions} sessions."
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)8s] (%(name)s) %(message)s",
+    )
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only count the records that would be rewritten",
+    )
+    args = parser.parse_args()
+    asyncio.run(migrate(args.dry_run))
@@ -0,0 +1,107 @@
+import json
+import struct
+import zlib
+from typing import Literal
+
+from src.repository.chat_session import Record
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available.
+    zstandard = None
+
+# Version byte of the compact format. Legacy entries are JSON objects and so
+# always start with "{", which can never be mistaken for a version.
+FORMAT_V1 = 1
+
+_ROLES = ("user", "assistant", "system", "developer")
+_ROLE_IDS = {role: i for i, role in enumerate(_ROLES)}
+
+_FLAG_ZLIB = 0x01
+_FLAG_ZSTD = 0x02
+
+# version, role, flags, token_count + 1 (0 when unknown), user_id length
+_HEADER = struct.Struct("!BBBIH")
+
+
+def is_json(data: bytes) -> bool:
+    return data[:1] == b"{"
+
+
+class RecordCodec:
+    """
+    Encodes records as a packed header followed by the user ID and the
+    message, compressing messages above `compress_threshold` bytes. Decoding
+    accepts both this format and the JSON written by earlier versions.
+    """
+
+    def __init__(
+        self,
+        record_format: Literal["compact", "json"] = "compact",
+        compress_threshold: int = 1024,
+    ):
+        self._record_format = record_format
+        self._compress_threshold = compress_threshold
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=3)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, record: Record) -> bytes:
+        if self._record_format == "json":
+            return record.to_json().encode()
+
+        user_id = str(record.user_id).encode()
+        message = record.message.encode()
+        flags = 0
+        if len(message) >= self._compress_threshold:
+            message, flags = self._compress(message)
+
+        token_count = record.token_count + 1 if record.token_count is not None else 0
+        return (
+            _HEADER.pack(
+                FORMAT_V1, _ROLE_IDS[record.role], flags, token_count, len(user_id)
+            )
+            + user_id
+            + message
+        )
+
+    def decode(self, data: bytes) -> Record:
+        if is_json(data):
+            record = json.loads(data)
+            return Record(
+                user_id=str(record["user_id"]),
+                role=record["role"],
+                message=record["message"],
+                token_count=record.get("token_count"),
+            )
+
+        version, role, flags, token_count, user_id_len = _HEADER.unpack_from(data)
+        if version != FORMAT_V1:
+            raise ValueError(f"Unsupported record format version {version}")
+
+        body = memoryview(data)[_HEADER.size :]
+        message = bytes(body[user_id_len:])
+        if flags & _FLAG_ZSTD:
+            if zstandard is None:
+                raise ValueError("Record is zstd-compressed but zstandard is missing")
+            message = self._decompressor.decompress(message)
+        elif flags & _FLAG_ZLIB:
+            message = zlib.decompress(message)
+
+        return Record(
+            user_id=str(body[:user_id_len], "utf-8"),
+            role=_ROLES[role],
+            message=message.decode(),
+            token_count=token_count - 1 if token_count else None,
+        )
+
+    def _compress(self, message: bytes) -> tuple[bytes, int]:
+        if zstandard is not None:
+            compressed, flag = self._compressor.compress(message), _FLAG_ZSTD
+        else:
+            compressed, flag = zlib.compress(message), _FLAG_ZLIB
+
+        # Short or already dense messages can grow; keep them as they are.
+        if len(compressed) >= len(message):
+            return message, 0
+        return compressed, flag
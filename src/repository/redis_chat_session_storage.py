@@ -1,89 +1,754 @@
-import json
+import asyncio
 import logging
-from typing import Dict, List
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Tuple
 
-import redis
+import redis.asyncio as redis
 
-from src.config.config import RedisConfig
-from src.repository.chat_session import ChatSession, ChatSessionStorage, Record
+from src.config.config import (
+    RedisConfig,
+    SessionCacheConfig,
+    SessionLifecycleConfig,
+    WriteBehindConfig,
+)
+from src.metrics import registry
+from src.repository.chat_session import (
+    DEFAULT_SYSTEM_PROMPT,
+    ChatSession,
+    ChatSessionStorage,
+    Record,
+    SessionInfo,
+    timed,
+)
+from src.repository.record_codec import RecordCodec
+from src.repository.redis_client import get_redis_client
+from src.repository.session_archive import ArchivedSession, SessionArchive
+from src.repository.session_cache import SessionCache
+
+_rehydrate_latency = registry.histogram(
+    "chat_session_rehydrate_seconds",
+    "Time to restore an archived chat session into Redis.",
+)
+_flush_batch_size = registry.histogram(
+    "chat_session_write_behind_flush_records",
+    "Records written to Redis by one write-behind flush.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+_flush_lag = registry.histogram(
+    "chat_session_write_behind_lag_seconds",
+    "Age of the oldest buffered record when a write-behind flush starts.",
+)
+_archived_sessions = registry.counter(
+    "chat_session_archived_total",
+    "Idle chat sessions moved from Redis to the archive.",
+)
+
+# How long a flush marker outlives its batch; far longer than any retry.
+_FLUSH_MARKER_TTL_SECONDS = 86400
+
+# Creates the session with its system prompt unless it already exists, and
+# returns the stored history either way, in a single round-trip. New sessions
+# are announced on the events channel so other replicas can index them.
+#
+# KEYS: session list, activity set
+# ARGV: system prompt record, events channel, session ID, TTL, now
+_CREATE_SESSION_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('LRANGE', KEYS[1], 0, -1)
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+if ARGV[4] ~= '' then
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+if ARGV[5] ~= '' then
+    redis.call('ZADD', KEYS[2], ARGV[5], ARGV[3])
+end
+redis.call('PUBLISH', ARGV[2], ARGV[3])
+return {ARGV[1]}
+"""
+
+# Restores an archived session unless it was recreated in the meantime.
+#
+# KEYS: session list, summary hash, activity set
+# ARGV: session ID, TTL, now, summary until, summary record, records...
+_REHYDRATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+for i = 6, #ARGV, 1000 do
+    redis.call('RPUSH', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+if ARGV[5] ~= '' then
+    redis.call('HSET', KEYS[2], 'until', ARGV[4], 'record', ARGV[5])
+end
+if ARGV[2] ~= '' then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+return 1
+"""
+
+# Deletes an archived session from Redis, unless a message arrived after the
+# archiver picked it, in which case it is still active and stays.
+#
+# KEYS: session list, summary hash, activity set
+# ARGV: session ID, idle cutoff
+_EVICT_ARCHIVED_SCRIPT = """
+local last_active = redis.call('ZSCORE', KEYS[3], ARGV[1])
+if last_active and tonumber(last_active) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('DEL', KEYS[1], KEYS[2])
+redis.call('ZREM', KEYS[3], ARGV[1])
+return 1
+"""
 
 
 class RedisChatSessionStorage(ChatSessionStorage):
-    def __init__(self, redis_config: RedisConfig):
+    backend = "redis"
+
+    def __init__(
+        self,
+        redis_config: RedisConfig,
+        cache_config: SessionCacheConfig | None = None,
+        codec: RecordCodec | None = None,
+        lifecycle_config: SessionLifecycleConfig | None = None,
+        write_behind_config: WriteBehindConfig | None = None,
+    ):
         self._key_prefix = "chat_session:"
-        self._client = redis.Redis(
-            host=redis_config.host,
-            port=redis_config.port,
-            password=redis_config.password,
-            db=redis_config.db,
+        self._summary_key_prefix = "chat_session_summary:"
+        self._activity_key = "chat_session_activity"
+        self._archiver_lock_key = "chat_session_archiver_lock"
+        self._created_channel = "chat_session_events:created"
+        self._scan_count = redis_config.scan_count
+        self._archive_batch_size = 100
+        self._codec = codec or RecordCodec()
+        self._client = get_redis_client(redis_config)
+        self._create_session_script = self._client.register_script(
+            _CREATE_SESSION_SCRIPT
+        )
+        self._rehydrate_script = self._client.register_script(_REHYDRATE_SCRIPT)
+        self._evict_archived_script = self._client.register_script(
+            _EVICT_ARCHIVED_SCRIPT
         )
 
-    def create_session(self, session_id: int, system_prompt: str | None) -> ChatSession:
-        key = f"{self._key_prefix}{session_id}"
-        if self._client.exists(key):
-            history = self._get_full_message_history(key)
-            return ChatSession(id=session_id, history=history)
+        lifecycle_config = lifecycle_config or SessionLifecycleConfig(
+            idle_ttl_seconds=None, archive_path=None
+        )
+        self._idle_ttl = lifecycle_config.idle_ttl_seconds
+        self._archive_after = lifecycle_config.archive_after_seconds
+        self._archive_interval = lifecycle_config.archive_interval_seconds
+        self._archive = (
+            SessionArchive(lifecycle_config.archive_path)
+            if lifecycle_config.archive_path
+            else None
+        )
+        self._archiver_task: asyncio.Task | None = None
+        if (
+            self._archive is not None
+            and self._idle_ttl
+            and self._archive_after + self._archive_interval >= self._idle_ttl
+        ):
+            logging.warning(
+                "Chat sessions may expire before they are archived; "
+                "archiveAfterSeconds should be well below redisIdleTtlSeconds."
+            )
 
-        if system_prompt:
-            system_prompt_message = system_prompt
-        else:
-            system_prompt_message = "You’re a versatile helper, assisting me with a wide range of questions."
+        cache_config = cache_config or SessionCacheConfig()
+        self._cache = SessionCache(
+            max_sessions=cache_config.max_sessions,
+            max_bytes=cache_config.max_bytes,
+        )
+
+        write_behind_config = write_behind_config or WriteBehindConfig()
+        self._write_behind = write_behind_config.enabled
+        self._flush_interval = write_behind_config.flush_interval_ms / 1000
+        self._flush_max_records = write_behind_config.flush_max_records
+        self._durability = write_behind_config.durability
+        # Encoded records not yet written to Redis, per session, in order.
+        self._pending: Dict[str, List[bytes]] = {}
+        self._pending_records = 0
+        self._pending_since = 0.0
+        self._flushed: asyncio.Future | None = None
+        # Marker and per-session record counts of a batch whose transaction
+        # failed in a way that may still have applied it.
+        self._unconfirmed_batch: Tuple[str, Dict[str, int]] | None = None
+        self._flush_marker_prefix = "chat_session_flush_marker:"
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher_task: asyncio.Task | None = None
+        self._closing = False
+        # Summaries of the sessions served from the cache in write-behind mode.
+        self._summaries: Dict[str, Tuple[Record | None, int]] = {}
+
+    @property
+    def cache(self) -> SessionCache:
+        return self._cache
+
+    async def start(self) -> None:
+        if self._archive is not None:
+            self._archiver_task = asyncio.create_task(self._run_archiver())
+        if self._write_behind:
+            self._flusher_task = asyncio.create_task(self._run_flusher())
+
+    @timed
+    async def create_session(
+        self, session_id: int, system_prompt: str | None
+    ) -> ChatSession:
+        key = f"{self._key_prefix}{session_id}"
 
         system_prompt_record = Record(
             user_id="developer",
             role="system",
-            message=system_prompt_message,
+            message=system_prompt or DEFAULT_SYSTEM_PROMPT,
         )
-        self._client.rpush(key, system_prompt_record.to_json())
-
-        new_session = ChatSession(
-            id=session_id,
-            history=[system_prompt_record],
+        session_data = await self._create_session_script(
+            keys=[key, self._activity_key],
+            args=[
+                self._codec.encode(system_prompt_record),
+                self._created_channel,
+                str(session_id),
+                self._idle_ttl or "",
+                time.time() if self._archive is not None else "",
+            ],
         )
-        return new_session
 
-    def add_message(self, session_id: int, record: Record) -> ChatSession:
-        key = f"{self._key_prefix}{session_id}"
-        if not self._client.exists(key):
+        history = self._decode_history(session_data)
+        self._cache.put(str(session_id), history)
+        return ChatSession(id=session_id, history=list(history))
+
+    @timed
+    async def add_message(self, session_id: int, record: Record) -> ChatSession | None:
+        if self._write_behind:
+            return await self._buffer_message(session_id, record)
+
+        chat_session = await self._add_message(session_id, record)
+        if chat_session is None and await self._rehydrate(str(session_id)):
+            chat_session = await self._add_message(session_id, record)
+
+        if chat_session is None:
             logging.error(
                 f"Session with ID {session_id} does not exist. Cannot add message."
             )
+        return chat_session
+
+    @timed
+    async def get_session(self, session_id: int) -> ChatSession | None:
+        if self._write_behind:
+            cached = self._cache.peek(str(session_id))
+            if cached is not None and str(session_id) in self._summaries:
+                self._cache.record_hit(str(session_id))
+                summary, summary_until = self._summaries[str(session_id)]
+                return ChatSession(
+                    id=session_id,
+                    history=list(cached),
+                    summary=summary,
+                    summary_until=summary_until,
+                )
+            if str(session_id) in self._pending:
+                # Redis is behind the buffer; catch it up before reading.
+                await self.flush()
+
+        chat_session = await self._get_session(session_id)
+        if chat_session is None and await self._rehydrate(str(session_id)):
+            chat_session = await self._get_session(session_id)
+
+        if chat_session is None:
+            logging.warning(f"Session with ID {session_id} does not exist.")
+        return chat_session
+
+    @timed
+    async def set_summary(
+        self, session_id: int, summary: Record, summary_until: int
+    ) -> None:
+        summary_key = f"{self._summary_key_prefix}{session_id}"
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                summary_key,
+                mapping={"until": summary_until, "record": self._codec.encode(summary)},
+            )
+            if self._idle_ttl:
+                pipe.expire(summary_key, self._idle_ttl)
+            await pipe.execute()
+
+        if str(session_id) in self._summaries:
+            self._summaries[str(session_id)] = (summary, summary_until)
+
+    async def flush(self) -> None:
+        """
+        Writes every buffered record to Redis.
+
+        Each batch is written in one MULTI/EXEC transaction, so it is applied
+        entirely or not at all. The transaction also sets a marker key, so
+        that after an error that leaves this unknown, e.g. a timeout once the
+        server got the batch, the next flush can tell whether to write the
+        batch again or drop it.
+        """
+        async with self._flush_lock:
+            await self._settle_unconfirmed_batch()
+            if not self._pending:
+                return
+
+            pending, self._pending = self._pending, {}
+            flushed, self._flushed = self._flushed, None
+            records, self._pending_records = self._pending_records, 0
+            _flush_lag.observe(time.monotonic() - self._pending_since)
+            marker = f"{self._flush_marker_prefix}{uuid.uuid4().hex}"
+
+            try:
+                async with self._client.pipeline(transaction=True) as pipe:
+                    for session_id, entries in pending.items():
+                        key = f"{self._key_prefix}{session_id}"
+                        pipe.rpushx(key, *entries)
+                        if self._idle_ttl:
+                            pipe.expire(key, self._idle_ttl)
+                            pipe.expire(
+                                f"{self._summary_key_prefix}{session_id}",
+                                self._idle_ttl,
+                            )
+                        if self._archive is not None:
+                            pipe.zadd(self._activity_key, {session_id: time.time()})
+                    pipe.set(marker, 1, ex=_FLUSH_MARKER_TTL_SECONDS)
+                    results = await pipe.execute()
+            except BaseException as e:
+                # Put the records back in front of anything buffered since, and
+                # let the waiters ride on the next flush. A cancelled write is
+                # as ambiguous as a timeout, so it is settled the same way.
+                self._unconfirmed_batch = (
+                    marker,
+                    {session_id: len(entries) for session_id, entries in pending.items()},
+                )
+                self._requeue(pending, records)
+                if flushed is not None:
+                    if self._flushed is None:
+                        self._flushed = flushed
+                    else:
+                        self._flushed.add_done_callback(
+                            lambda _, flushed=flushed: flushed.done()
+                            or flushed.set_result(None)
+                        )
+                logging.warning(f"Failed to flush {records} chat records: {e!r}")
+                raise
+
+            try:
+                _flush_batch_size.observe(records)
+                commands_per_session = (len(results) - 1) // len(pending)
+                for session_id, length in zip(pending, results[::commands_per_session]):
+                    if length == 0:
+                        await self._flush_orphaned(session_id, pending[session_id])
+            finally:
+                if flushed is not None and not flushed.done():
+                    flushed.set_result(None)
+
+            if len(self._summaries) > 2 * max(len(self._cache), 1):
+                self._summaries = {
+                    session_id: summary
+                    for session_id, summary in self._summaries.items()
+                    if self._cache.peek(session_id) is not None
+                }
+
+    async def _settle_unconfirmed_batch(self) -> None:
+        """
+        Drops the records of the last failed batch from the buffer if its
+        transaction was applied after all, so that they are not written twice.
+        """
+        if self._unconfirmed_batch is None:
+            return
+        marker, counts = self._unconfirmed_batch
+        if not await self._client.delete(marker):
+            self._unconfirmed_batch = None
+            return
+
+        logging.info("The last failed flush of chat records was applied after all.")
+        for session_id, count in counts.items():
+            entries = self._pending.get(session_id, [])
+            del entries[:count]
+            self._pending_records -= count
+            if not entries:
+                self._pending.pop(session_id, None)
+        self._unconfirmed_batch = None
+
+    def _requeue(self, entries_by_session: Dict[str, List[bytes]], records: int) -> None:
+        # Goes in front of anything buffered since, to keep each session's order.
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        for session_id, entries in self._pending.items():
+            entries_by_session.setdefault(session_id, []).extend(entries)
+        self._pending = entries_by_session
+        self._pending_records += records
+
+    async def get_all_sessions(self) -> AsyncIterator[ChatSession]:
+        await self.flush()
+        async for session_ids in self._scan_session_ids():
+            async with self._client.pipeline(transaction=False) as pipe:
+                for session_id in session_ids:
+                    pipe.lrange(f"{self._key_prefix}{session_id}", 0, -1)
+                    pipe.hgetall(f"{self._summary_key_prefix}{session_id}")
+                results = await pipe.execute()
+
+            for session_id, entries, summary_data in zip(
+                session_ids, results[::2], results[1::2]
+            ):
+                # Expired or archived since the SCAN returned it.
+                if not entries:
+                    continue
+                yield self._to_chat_session(
+                    session_id, self._decode_history(entries), summary_data
+                )
+
+        # Archived sessions are still sessions; they come back on first use.
+        if self._archive is not None:
+            async for session_id, archived in self._archive.scan_sessions():
+                yield ChatSession(
+                    id=session_id,
+                    history=self._decode_history(archived.entries),
+                    summary=self._codec.decode(archived.summary)
+                    if archived.summary is not None
+                    else None,
+                    summary_until=archived.summary_until,
+                )
+
+    async def list_sessions(self) -> AsyncIterator[SessionInfo]:
+        await self.flush()
+        async for session_ids in self._scan_session_ids():
+            async with self._client.pipeline(transaction=False) as pipe:
+                for session_id in session_ids:
+                    pipe.llen(f"{self._key_prefix}{session_id}")
+                lengths = await pipe.execute()
+
+            for session_id, length in zip(session_ids, lengths):
+                if length:
+                    yield SessionInfo(id=session_id, length=length)
+
+        if self._archive is not None:
+            async for session_id, length in self._archive.list_sessions():
+                yield SessionInfo(id=session_id, length=length, archived=True)
+
+    async def watch_created_sessions(self) -> AsyncIterator[str | None]:
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self._created_channel)
+                yield None
+                async for message in pubsub.listen():
+                    yield message["data"].decode()
+            except redis.RedisError as e:
+                logging.warning(f"Lost session event subscription: {e}. Retrying...")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def close(self) -> None:
+        if self._flusher_task is not None:
+            # Stopped rather than cancelled, so that a batch being written is
+            # finished first.
+            self._closing = True
+            self._flush_requested.set()
+            await self._flusher_task
+            self._flusher_task = None
+        try:
+            await self.flush()
+        except redis.RedisError as e:
+            logging.error(
+                f"Lost {self._pending_records} buffered chat records on shutdown."
+            )
+            if self._flushed is not None and not self._flushed.done():
+                self._flushed.set_exception(e)
+        if self._archiver_task is not None:
+            self._archiver_task.cancel()
+            try:
+                await self._archiver_task
+            except asyncio.CancelledError:
+                pass
+            self._archiver_task = None
+        if self._archive is not None:
+            self._archive.close()
+        await self._client.aclose()
+
+    async def archive_idle_sessions(self) -> int:
+        """
+        Moves the sessions that have been idle for longer than the archive
+        threshold from Redis to the archive. Returns how many were moved.
+        """
+        # Records still in the buffer would be lost with the archived session.
+        await self.flush()
+
+        cutoff = time.time() - self._archive_after
+        session_ids = await self._client.zrangebyscore(
+            self._activity_key, "-inf", cutoff, start=0, num=self._archive_batch_size
+        )
+
+        archived = 0
+        for session_id in (s.decode() for s in session_ids):
+            key = f"{self._key_prefix}{session_id}"
+            summary_key = f"{self._summary_key_prefix}{session_id}"
+            async with self._client.pipeline(transaction=True) as pipe:
+                pipe.lrange(key, 0, -1)
+                pipe.hgetall(summary_key)
+                entries, summary_data = await pipe.execute()
+
+            if entries:
+                await self._archive.put(
+                    session_id,
+                    ArchivedSession(
+                        entries=entries,
+                        summary=summary_data.get(b"record"),
+                        summary_until=int(summary_data.get(b"until", 0)),
+                    ),
+                )
+
+            evicted = await self._evict_archived_script(
+                keys=[key, summary_key, self._activity_key], args=[session_id, cutoff]
+            )
+            if not evicted:
+                # A message arrived in the meantime; the copy is already stale.
+                if entries:
+                    await self._archive.delete(session_id)
+                continue
+
+            self._cache.evict(session_id)
+            if entries:
+                archived += 1
+                _archived_sessions.inc()
+
+        return archived
+
+    async def _run_archiver(self) -> None:
+        while True:
+            await asyncio.sleep(self._archive_interval)
+            try:
+                # Only one replica archives per interval.
+                if not await self._client.set(
+                    self._archiver_lock_key, 1, nx=True, ex=self._archive_interval
+                ):
+                    continue
+                archived = await self.archive_idle_sessions()
+                if archived:
+                    logging.info(f"Archived {archived} idle chat sessions.")
+            except Exception as e:
+                # Redis, SQLite or disk errors alike: try again next interval.
+                logging.warning(f"Failed to archive idle chat sessions: {e}")
+
+    async def _scan_session_ids(self) -> AsyncIterator[List[str]]:
+        """
+        Iterates over the session IDs one SCAN page at a time. SCAN can return
+        a key more than once while the keyspace is being resized, so the IDs
+        seen so far are remembered to list every session only once.
+        """
+        prefix_len = len(self._key_prefix)
+        seen = set()
+        cursor = 0
+        while True:
+            cursor, keys = await self._client.scan(
+                cursor, match=f"{self._key_prefix}*", count=self._scan_count
+            )
+            session_ids = [
+                session_id
+                for session_id in (key.decode()[prefix_len:] for key in keys)
+                if session_id not in seen
+            ]
+            seen.update(session_ids)
+            if session_ids:
+                yield session_ids
+            if cursor == 0:
+                return
+
+    async def _flush_orphaned(self, session_id: str, entries: List[bytes]) -> None:
+        """
+        Handles buffered records whose session was no longer in Redis when they
+        were flushed, most likely because another replica archived it.
+        """
+        try:
+            if await self._rehydrate(session_id) and await self._client.rpushx(
+                f"{self._key_prefix}{session_id}", *entries
+            ):
+                return
+        except Exception as e:
+            # Retried with the next flush, rather than lost with the others.
+            logging.warning(
+                f"Failed to restore chat session {session_id} for "
+                f"{len(entries)} buffered records: {e}"
+            )
+            self._requeue({session_id: entries}, len(entries))
             return
 
-        self._client.rpush(
-            key,
-            Record(
-                user_id=record.user_id,
-                role=record.role,
-                message=record.message,
-            ).to_json(),
+        self._cache.evict(session_id)
+        self._summaries.pop(session_id, None)
+        logging.error(
+            f"Dropped {len(entries)} buffered records of chat session "
+            f"{session_id}, which no longer exists."
         )
 
-        sess = self.get_session(session_id)
-        logging.info("current sess")
-        logging.info(sess)
-        return sess
+    async def _run_flusher(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), timeout=self._flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            if self._closing:
+                # close() flushes whatever is left itself.
+                return
+            try:
+                await self.flush()
+            except redis.RedisError:
+                await asyncio.sleep(self._flush_interval)
+
+    async def _buffer_message(
+        self, session_id: int, record: Record
+    ) -> ChatSession | None:
+        # Loads the session into the cache, which then stays ahead of Redis by
+        # the buffered records.
+        chat_session = await self.get_session(session_id)
+        if chat_session is None:
+            logging.error(
+                f"Session with ID {session_id} does not exist. Cannot add message."
+            )
+            return None
+
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending.setdefault(str(session_id), []).append(self._codec.encode(record))
+        self._pending_records += 1
+        self._cache.extend(str(session_id), [record])
+        chat_session.history.append(record)
+
+        if self._pending_records >= self._flush_max_records:
+            self._flush_requested.set()
+        if self._durability == "flushed":
+            if self._flushed is None:
+                self._flushed = asyncio.get_running_loop().create_future()
+            await asyncio.shield(self._flushed)
+        return chat_session
+
+    async def _rehydrate(self, session_id: str) -> bool:
+        if self._archive is None:
+            return False
+
+        with _rehydrate_latency.time():
+            archived = await self._archive.get(session_id)
+            if archived is None:
+                return False
+
+            await self._rehydrate_script(
+                keys=[
+                    f"{self._key_prefix}{session_id}",
+                    f"{self._summary_key_prefix}{session_id}",
+                    self._activity_key,
+                ],
+                args=[
+                    session_id,
+                    self._idle_ttl or "",
+                    time.time(),
+                    archived.summary_until,
+                    archived.summary or "",
+                    *archived.entries,
+                ],
+            )
+            await self._archive.delete(session_id)
+
+        logging.info(f"Rehydrated chat session {session_id} from the archive.")
+        return True
 
-    def get_session(self, session_id: int) -> ChatSession | None:
+    async def _add_message(
+        self, session_id: int, record: Record
+    ) -> ChatSession | None:
         key = f"{self._key_prefix}{session_id}"
-        if not self._client.exists(key):
-            logging.warning(f"Session with ID {session_id} does not exist.")
+        summary_key = f"{self._summary_key_prefix}{session_id}"
+        cached = self._cache.peek(str(session_id))
+        cached_len = len(cached) if cached is not None else 0
+
+        # RPUSHX only appends to an existing list, so the existence check, the
+        # write and the read of everything not yet cached share one round-trip.
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.rpushx(key, self._codec.encode(record))
+            pipe.lrange(key, cached_len, -1)
+            pipe.hgetall(summary_key)
+            if self._idle_ttl:
+                pipe.expire(key, self._idle_ttl)
+                pipe.expire(summary_key, self._idle_ttl)
+            if self._archive is not None:
+                pipe.zadd(self._activity_key, {str(session_id): time.time()})
+            length, tail_data, summary_data, *_ = await pipe.execute()
+
+        if length == 0:
+            self._cache.evict(str(session_id))
             return None
 
-        history = self._get_full_message_history(key)
-        return ChatSession(id=session_id, history=history)
+        history = await self._apply_tail(
+            session_id, key, cached, cached_len, length, tail_data
+        )
+        return self._to_chat_session(session_id, history, summary_data)
 
-    def get_all_sessions(self) -> Dict[int, ChatSession]:
-        logging.warning("not implemented yet")
+    async def _get_session(self, session_id: int) -> ChatSession | None:
+        key = f"{self._key_prefix}{session_id}"
+        cached = self._cache.peek(str(session_id))
+        cached_len = len(cached) if cached is not None else 0
+
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.llen(key)
+            pipe.lrange(key, cached_len, -1)
+            pipe.hgetall(f"{self._summary_key_prefix}{session_id}")
+            length, tail_data, summary_data = await pipe.execute()
 
-    def _get_full_message_history(self, key) -> List[Record]:
-        session_data = self._client.lrange(key, 0, -1)
+        # A session always holds at least its system prompt, so an empty list
+        # means the session does not exist.
+        if length == 0:
+            self._cache.evict(str(session_id))
+            return None
 
-        return [
-            Record(
-                user_id=record["user_id"],
-                role=record["role"],
-                message=record["message"],
+        history = await self._apply_tail(
+            session_id, key, cached, cached_len, length, tail_data
+        )
+        chat_session = self._to_chat_session(session_id, history, summary_data)
+        if self._write_behind:
+            self._summaries[str(session_id)] = (
+                chat_session.summary,
+                chat_session.summary_until,
             )
-            for record in [json.loads(data) for data in session_data]
-        ]
+        return chat_session
+
+    async def _apply_tail(
+        self,
+        session_id: int,
+        key: str,
+        cached: List[Record] | None,
+        offset: int,
+        length: int,
+        tail_data: List[bytes],
+    ) -> List[Record]:
+        """
+        Merges the records read past the cached prefix into the cache and
+        returns the full history. Falls back to a full read when the list no
+        longer lines up with the cached prefix, e.g. after it was rewritten.
+        """
+        history = self._cache.merge_tail(
+            str(session_id), cached, offset, length, tail_data, self._decode_history
+        )
+        if history is None:
+            history = self._decode_history(await self._client.lrange(key, 0, -1))
+            self._cache.put(str(session_id), history)
+        return history
+
+    def _to_chat_session(
+        self,
+        session_id: int,
+        history: List[Record],
+        summary_data: Dict[bytes, bytes],
+    ) -> ChatSession:
+        if not summary_data:
+            return ChatSession(id=session_id, history=list(history))
+
+        return ChatSession(
+            id=session_id,
+            history=list(history),
+            summary=self._decode_history([summary_data[b"record"]])[0],
+            summary_until=int(summary_data[b"until"]),
+        )
+
+    def _decode_history(self, session_data: List[bytes]) -> List[Record]:
+        return [self._codec.decode(data) for data in session_data]
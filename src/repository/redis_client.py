@@ -0,0 +1,40 @@
+from typing import Dict, Tuple
+
+import redis.asyncio as redis
+
+from src.config.config import RedisConfig
+
+_connection_pools: Dict[Tuple, redis.BlockingConnectionPool] = {}
+
+
+def get_redis_client(redis_config: RedisConfig) -> redis.Redis:
+    """
+    Returns an asyncio Redis client backed by a connection pool that is shared
+    by every caller using the same Redis instance. When every connection is in
+    use, commands wait for one to be released rather than failing at once.
+    """
+    pool_key = (
+        redis_config.host,
+        redis_config.port,
+        redis_config.db,
+        redis_config.password,
+    )
+    pool = _connection_pools.get(pool_key)
+    if pool is None:
+        pool = redis.BlockingConnectionPool(
+            host=redis_config.host,
+            port=redis_config.port,
+            password=redis_config.password,
+            db=redis_config.db,
+            max_connections=redis_config.max_connections,
+            timeout=redis_config.pool_timeout_seconds,
+        )
+        _connection_pools[pool_key] = pool
+
+    return redis.Redis(connection_pool=pool)
+
+
+async def close_connection_pools() -> None:
+    for pool in _connection_pools.values():
+        await pool.aclose()
+    _connection_pools.clear()
@@ -0,0 +1,138 @@
+import asyncio
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Tuple
+
+_LENGTH = struct.Struct("!I")
+
+
+@dataclass
+class ArchivedSession:
+    entries: List[bytes]
+    summary: bytes | None
+    summary_until: int
+
+
+def _pack(entries: List[bytes]) -> bytes:
+    return zlib.compress(b"".join(_LENGTH.pack(len(e)) + e for e in entries))
+
+
+def _unpack(blob: bytes) -> List[bytes]:
+    data = zlib.decompress(blob)
+    entries, offset = [], 0
+    while offset < len(data):
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        entries.append(data[offset : offset + length])
+        offset += length
+    return entries
+
+
+class SessionArchive:
+    """
+    Cold tier for idle chat sessions: the encoded records of each session are
+    stored as one compressed blob in a local SQLite database.
+
+    Queries run in a worker thread so they never block the event loop.
+    """
+
+    def __init__(self, path: str, page_size: int = 500):
+        self._page_size = page_size
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS archived_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    length INTEGER NOT NULL,
+                    records BLOB NOT NULL,
+                    summary BLOB,
+                    summary_until INTEGER NOT NULL,
+                    archived_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+
+    async def put(self, session_id: str, session: ArchivedSession) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO archived_sessions VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                session_id,
+                len(session.entries),
+                _pack(session.entries),
+                session.summary,
+                session.summary_until,
+                time.time(),
+            ),
+        )
+
+    async def get(self, session_id: str) -> ArchivedSession | None:
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT records, summary, summary_until FROM archived_sessions"
+            " WHERE session_id = ?",
+            (session_id,),
+        )
+        if not rows:
+            return None
+
+        records, summary, summary_until = rows[0]
+        return ArchivedSession(
+            entries=_unpack(records), summary=summary, summary_until=summary_until
+        )
+
+    async def delete(self, session_id: str) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM archived_sessions WHERE session_id = ?",
+            (session_id,),
+        )
+
+    async def list_sessions(self) -> AsyncIterator[Tuple[str, int]]:
+        """
+        Iterates over the ID and length of every archived session.
+        """
+        async for session_id, length in self._paginate("session_id, length"):
+            yield session_id, length
+
+    async def scan_sessions(self) -> AsyncIterator[Tuple[str, ArchivedSession]]:
+        async for session_id, records, summary, summary_until in self._paginate(
+            "session_id, records, summary, summary_until"
+        ):
+            yield session_id, ArchivedSession(
+                entries=_unpack(records), summary=summary, summary_until=summary_until
+            )
+
+    async def _paginate(self, columns: str) -> AsyncIterator[tuple]:
+        # Keyset pagination, so that only one page is held at a time.
+        last_id = ""
+        while True:
+            rows = await asyncio.to_thread(
+                self._execute,
+                f"SELECT {columns} FROM archived_sessions WHERE session_id > ?"
+                " ORDER BY session_id LIMIT ?",
+                (last_id, self._page_size),
+            )
+            for row in rows:
+                yield row
+            if len(rows) < self._page_size:
+                return
+            last_id = rows[-1][0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.commit()
+            return rows
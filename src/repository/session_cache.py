@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Sequence, TypeVar
+
+from src.repository.chat_session import Record
+
+T = TypeVar("T")
+
+
+class SessionCache:
+    """
+    Process-local LRU cache of decoded session histories, bounded by both the
+    number of sessions and an approximate memory budget.
+    """
+
+    def __init__(self, max_sessions: int, max_bytes: int):
+        self._max_sessions = max_sessions
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, List[Record]] = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def peek(self, session_id: str) -> List[Record] | None:
+        """
+        Returns the cached history without touching the LRU order or the
+        hit/miss counters.
+        """
+        return self._entries.get(session_id)
+
+    def record_hit(self, session_id: str) -> None:
+        self.hits += 1
+        if session_id in self._entries:
+            self._entries.move_to_end(session_id)
+
+    def record_miss(self) -> None:
+        self.misses += 1
+
+    def put(self, session_id: str, records: List[Record]) -> None:
+        self.evict(session_id)
+        self._entries[session_id] = records
+        self._sizes[session_id] = sum(r.approximate_size() for r in records)
+        self._total_bytes += self._sizes[session_id]
+        self._shrink()
+
+    def extend(self, session_id: str, records: List[Record]) -> None:
+        cached = self._entries.get(session_id)
+        if cached is None:
+            return
+
+        added = sum(r.approximate_size() for r in records)
+        cached.extend(records)
+        self._sizes[session_id] += added
+        self._total_bytes += added
+        self._entries.move_to_end(session_id)
+        self._shrink()
+
+    def merge_tail(
+        self,
+        session_id: str,
+        cached: List[Record] | None,
+        offset: int,
+        length: int,
+        tail: Sequence[T],
+        decode: Callable[[Sequence[T]], List[Record]],
+    ) -> List[Record] | None:
+        """
+        Merges the records read from `offset` to the end of a history of
+        `length` records into the entry that was `cached` when the read was
+        issued, and returns the full history. Returns None when the read does
+        not line up with the cache; the caller then has to read the whole
+        history and `put` it.
+        """
+        if (
+            cached is not None
+            and self.peek(session_id) is cached
+            and offset + len(tail) == length
+        ):
+            # Another coroutine may have extended the entry while this one was
+            # waiting on the read; only the records past that point are new.
+            unseen = tail[len(cached) - offset :]
+            self.record_hit(session_id)
+            self.extend(session_id, decode(unseen))
+            return cached
+
+        self.record_miss()
+        if offset == 0 and len(tail) == length:
+            history = decode(tail)
+            self.put(session_id, history)
+            return history
+        return None
+
+    def evict(self, session_id: str) -> None:
+        if self._entries.pop(session_id, None) is not None:
+            self._total_bytes -= self._sizes.pop(session_id)
+
+    def _shrink(self) -> None:
+        while self._entries and (
+            len(self._entries) > self._max_sessions
+            or self._total_bytes > self._max_bytes
+        ):
+            session_id, _ = self._entries.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(session_id)
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Protocol, Set
+
+_SEED_TIMEOUT_SECONDS = 60.0
+_INITIAL_RETRY_BACKOFF_SECONDS = 1.0
+_MAX_RETRY_BACKOFF_SECONDS = 30.0
+
+
+class SessionFeed(Protocol):
+    """
+    What a SessionIndex needs of a storage; see ChatSessionStorage.
+    """
+
+    def scan_session_ids(self) -> AsyncIterator[str]: ...
+
+    def watch_created_sessions(self) -> AsyncIterator[str | None]: ...
+
+
+class SessionIndex:
+    """
+    In-memory set of the session IDs held by a storage, so that callers can
+    tell whether a channel is a chat session without any I/O.
+
+    The index is seeded from the storage on start and then follows the
+    sessions created by other processes through the storage's event feed.
+    Failures of either are retried with backoff, but start() gives up if the
+    index cannot be seeded within seed_timeout seconds.
+    """
+
+    def __init__(
+        self, storage: SessionFeed, seed_timeout: float = _SEED_TIMEOUT_SECONDS
+    ):
+        self._storage = storage
+        self._seed_timeout = seed_timeout
+        self._session_ids: Set[str] = set()
+        self._ready = asyncio.Event()
+        self._last_error: Exception | None = None
+        self._watch_task: asyncio.Task | None = None
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._session_ids
+
+    def __len__(self) -> int:
+        return len(self._session_ids)
+
+    def add(self, session_id: str) -> None:
+        self._session_ids.add(session_id)
+
+    def discard(self, session_id: str) -> None:
+        self._session_ids.discard(session_id)
+
+    async def start(self) -> None:
+        self._watch_task = asyncio.create_task(self._watch())
+        try:
+            await asyncio.wait_for(self._ready.wait(), self._seed_timeout)
+        except TimeoutError:
+            error = self._last_error
+            await self.stop()
+            raise RuntimeError(
+                f"Could not seed the session index within {self._seed_timeout:g}s."
+            ) from error
+        logging.info(f"Session index seeded with {len(self)} sessions.")
+
+    async def stop(self) -> None:
+        if self._watch_task is None:
+            return
+
+        self._watch_task.cancel()
+        try:
+            await self._watch_task
+        except asyncio.CancelledError:
+            pass
+        self._watch_task = None
+
+    async def _watch(self) -> None:
+        backoff = _INITIAL_RETRY_BACKOFF_SECONDS
+        while True:
+            try:
+                async for session_id in self._storage.watch_created_sessions():
+                    if session_id is None:
+                        # (Re)subscribed: anything created while we were not
+                        # listening is picked up by a fresh scan.
+                        await self._seed()
+                        self._ready.set()
+                        backoff = _INITIAL_RETRY_BACKOFF_SECONDS
+                        continue
+                    self._session_ids.add(session_id)
+                return
+            except Exception as e:
+                self._last_error = e
+                logging.warning(
+                    f"Session index lost its feed, retrying in {backoff:.0f}s: {e}"
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, _MAX_RETRY_BACKOFF_SECONDS)
+
+    async def _seed(self) -> None:
+        async for session_id in self._storage.scan_session_ids():
+            self._session_ids.add(session_id)
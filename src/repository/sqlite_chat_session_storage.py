@@ -0,0 +1,374 @@
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Callable, List, Sequence, Tuple
+
+from src.config.config import SessionCacheConfig, SqliteConfig
+from src.metrics import registry
+from src.repository.chat_session import (
+    DEFAULT_SYSTEM_PROMPT,
+    ChatSession,
+    ChatSessionStorage,
+    Record,
+    SessionInfo,
+    timed,
+)
+from src.repository.record_codec import RecordCodec
+from src.repository.session_cache import SessionCache
+
+_commit_batch_size = registry.histogram(
+    "sqlite_chat_session_commit_batch_size",
+    "Writes group-committed in one SQLite transaction.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    length INTEGER NOT NULL,
+    summary BLOB,
+    summary_until INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS records (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+# (write, arguments, future, loop)
+_Write = Tuple[Callable[..., Any], tuple, asyncio.Future, asyncio.AbstractEventLoop]
+
+# (length, records from the requested offset, summary, summary until)
+_Tail = Tuple[int, List[bytes], bytes | None, int]
+
+
+def _resolve(future: asyncio.Future, result: Any, error: BaseException | None) -> None:
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _read_tail(conn: sqlite3.Connection, session_id: str, offset: int) -> _Tail | None:
+    row = conn.execute(
+        "SELECT length, summary, summary_until FROM sessions WHERE session_id = ?",
+        (session_id,),
+    ).fetchone()
+    if row is None:
+        return None
+
+    length, summary, summary_until = row
+    tail = conn.execute(
+        "SELECT data FROM records WHERE session_id = ? AND seq >= ? ORDER BY seq",
+        (session_id, offset),
+    ).fetchall()
+    return length, [data for (data,) in tail], summary, summary_until
+
+
+def _create_session(
+    conn: sqlite3.Connection, session_id: str, system_prompt: bytes
+) -> _Tail:
+    created = conn.execute(
+        "INSERT OR IGNORE INTO sessions (session_id, length) VALUES (?, 1)",
+        (session_id,),
+    ).rowcount
+    if created:
+        conn.execute(
+            "INSERT INTO records (session_id, seq, data) VALUES (?, 0, ?)",
+            (session_id, system_prompt),
+        )
+    return _read_tail(conn, session_id, 0)
+
+
+def _append(
+    conn: sqlite3.Connection, session_id: str, data: bytes, offset: int
+) -> _Tail | None:
+    row = conn.execute(
+        "UPDATE sessions SET length = length + 1 WHERE session_id = ? RETURNING length",
+        (session_id,),
+    ).fetchone()
+    if row is None:
+        return None
+
+    conn.execute(
+        "INSERT INTO records (session_id, seq, data) VALUES (?, ?, ?)",
+        (session_id, row[0] - 1, data),
+    )
+    return _read_tail(conn, session_id, offset)
+
+
+def _set_summary(
+    conn: sqlite3.Connection, session_id: str, summary: bytes, summary_until: int
+) -> None:
+    conn.execute(
+        "UPDATE sessions SET summary = ?, summary_until = ? WHERE session_id = ?",
+        (summary, summary_until, session_id),
+    )
+
+
+class SqliteChatSessionStorage(ChatSessionStorage):
+    """
+    Durable single-node session storage on SQLite in WAL mode.
+
+    Writes go through a queue to one writer thread, which commits whatever has
+    queued up since its last commit in a single transaction. Reads run on
+    worker threads with their own connections, which WAL lets proceed while
+    the writer is committing.
+    """
+
+    backend = "sqlite"
+
+    def __init__(
+        self,
+        sqlite_config: SqliteConfig,
+        cache_config: SessionCacheConfig | None = None,
+        codec: RecordCodec | None = None,
+    ):
+        self._path = sqlite_config.path
+        self._max_batch_size = sqlite_config.max_batch_size
+        self._page_size = 500
+        self._codec = codec or RecordCodec()
+        self._readers = threading.local()
+        self._reader_conns: List[sqlite3.Connection] = []
+        self._reader_conns_lock = threading.Lock()
+
+        cache_config = cache_config or SessionCacheConfig()
+        self._cache = SessionCache(
+            max_sessions=cache_config.max_sessions,
+            max_bytes=cache_config.max_bytes,
+        )
+
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.close()
+
+        self._writes: queue.SimpleQueue[_Write | None] = queue.SimpleQueue()
+        self._writer = threading.Thread(
+            target=self._write_loop, name="sqlite-chat-session-writer", daemon=True
+        )
+        self._writer.start()
+
+    @property
+    def cache(self) -> SessionCache:
+        return self._cache
+
+    @timed
+    async def create_session(
+        self, session_id: int, system_prompt: str | None
+    ) -> ChatSession:
+        system_prompt_record = Record(
+            user_id="developer",
+            role="system",
+            message=system_prompt or DEFAULT_SYSTEM_PROMPT,
+        )
+        length, entries, summary, summary_until = await self._write(
+            _create_session, str(session_id), self._codec.encode(system_prompt_record)
+        )
+
+        history = self._decode_history(entries)
+        self._cache.put(str(session_id), history)
+        return self._to_chat_session(session_id, history, summary, summary_until)
+
+    @timed
+    async def add_message(self, session_id: int, record: Record) -> ChatSession | None:
+        cached = self._cache.peek(str(session_id))
+        cached_len = len(cached) if cached is not None else 0
+
+        tail = await self._write(
+            _append, str(session_id), self._codec.encode(record), cached_len
+        )
+        if tail is None:
+            self._cache.evict(str(session_id))
+            logging.error(
+                f"Session with ID {session_id} does not exist. Cannot add message."
+            )
+            return None
+
+        return await self._apply_tail(session_id, cached, cached_len, tail)
+
+    @timed
+    async def get_session(self, session_id: int) -> ChatSession | None:
+        cached = self._cache.peek(str(session_id))
+        cached_len = len(cached) if cached is not None else 0
+
+        tail = await self._read(_read_tail, str(session_id), cached_len)
+        if tail is None:
+            self._cache.evict(str(session_id))
+            logging.warning(f"Session with ID {session_id} does not exist.")
+            return None
+
+        return await self._apply_tail(session_id, cached, cached_len, tail)
+
+    @timed
+    async def set_summary(
+        self, session_id: int, summary: Record, summary_until: int
+    ) -> None:
+        await self._write(
+            _set_summary, str(session_id), self._codec.encode(summary), summary_until
+        )
+
+    async def get_all_sessions(self) -> AsyncIterator[ChatSession]:
+        async for page in self._paginate():
+            tails = await self._read(
+                lambda conn: [_read_tail(conn, session_id, 0) for session_id, _ in page]
+            )
+            for (session_id, _), tail in zip(page, tails):
+                _, entries, summary, summary_until = tail
+                yield self._to_chat_session(
+                    session_id, self._decode_history(entries), summary, summary_until
+                )
+
+    async def list_sessions(self) -> AsyncIterator[SessionInfo]:
+        async for page in self._paginate():
+            for session_id, length in page:
+                yield SessionInfo(id=session_id, length=length)
+
+    async def watch_created_sessions(self) -> AsyncIterator[str | None]:
+        # The database belongs to this process, so there is nothing to follow.
+        yield None
+
+    async def close(self) -> None:
+        self._writes.put(None)
+        await asyncio.to_thread(self._writer.join)
+        with self._reader_conns_lock:
+            for conn in self._reader_conns:
+                conn.close()
+            self._reader_conns.clear()
+
+    async def _paginate(self) -> AsyncIterator[List[Tuple[str, int]]]:
+        # Keyset pagination, so that only one page is held at a time.
+        last_id = ""
+        while True:
+            page = await self._read(
+                lambda conn: conn.execute(
+                    "SELECT session_id, length FROM sessions WHERE session_id > ?"
+                    " ORDER BY session_id LIMIT ?",
+                    (last_id, self._page_size),
+                ).fetchall()
+            )
+            if page:
+                yield page
+            if len(page) < self._page_size:
+                return
+            last_id = page[-1][0]
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self._path, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only loses the last commits on power loss, never
+        # corrupts the database, and saves an fsync per commit.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _write(self, write: Callable[..., Any], *args: Any) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._writes.put((write, args, future, loop))
+        return future
+
+    async def _read(self, read: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.to_thread(self._read_in_thread, read, args)
+
+    def _read_in_thread(self, read: Callable[..., Any], args: tuple) -> Any:
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._readers.conn = conn
+            with self._reader_conns_lock:
+                self._reader_conns.append(conn)
+
+        # One read transaction, so that the session row and its records come
+        # from the same snapshot.
+        conn.execute("BEGIN")
+        try:
+            return read(conn, *args)
+        finally:
+            conn.execute("COMMIT")
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self._writes.get()]
+            while len(batch) < self._max_batch_size:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                stopping = True
+                batch = [write for write in batch if write is not None]
+            if batch:
+                self._commit(conn, batch)
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[_Write]) -> None:
+        results: List[Tuple[Any, BaseException | None]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for write, args, _, _ in batch:
+                # A failing write only rolls back itself, not the whole batch.
+                conn.execute("SAVEPOINT write")
+                try:
+                    results.append((write(conn, *args), None))
+                    conn.execute("RELEASE write")
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    results.append((None, e))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logging.error(f"Failed to commit {len(batch)} chat session writes: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(None, e)] * len(batch)
+
+        for (_, _, future, loop), (result, error) in zip(batch, results):
+            loop.call_soon_threadsafe(_resolve, future, result, error)
+        # Metrics are not thread-safe, so they are updated on the event loop.
+        batch[0][3].call_soon_threadsafe(_commit_batch_size.observe, len(batch))
+
+    async def _apply_tail(
+        self,
+        session_id: int,
+        cached: List[Record] | None,
+        offset: int,
+        tail: _Tail,
+    ) -> ChatSession:
+        length, entries, summary, summary_until = tail
+        history = self._cache.merge_tail(
+            str(session_id), cached, offset, length, entries, self._decode_history
+        )
+        if history is None:
+            _, entries, summary, summary_until = await self._read(
+                _read_tail, str(session_id), 0
+            )
+            history = self._decode_history(entries)
+            self._cache.put(str(session_id), history)
+        return self._to_chat_session(session_id, history, summary, summary_until)
+
+    def _to_chat_session(
+        self,
+        session_id: int,
+        history: List[Record],
+        summary: bytes | None,
+        summary_until: int,
+    ) -> ChatSession:
+        return ChatSession(
+            id=session_id,
+            history=list(history),
+            summary=self._codec.decode(summary) if summary is not None else None,
+            summary_until=summary_until,
+        )
+
+    def _decode_history(self, entries: Sequence[bytes]) -> List[Record]:
+        return [self._codec.decode(data) for data in entries]
@@ -0,0 +1,38 @@
+from src.config.config import ChatHistoryConfig
+from src.repository.chat_session import ChatSessionStorage
+from src.repository.mem_chat_session_storage import MemChatSessionStorage
+from src.repository.record_codec import RecordCodec
+from src.repository.redis_chat_session_storage import RedisChatSessionStorage
+from src.repository.sqlite_chat_session_storage import SqliteChatSessionStorage
+
+
+def create_chat_session_storage(chat_history: ChatHistoryConfig) -> ChatSessionStorage:
+    """
+    Builds the chat session storage selected by `chatHistory.storage`.
+    """
+    codec = RecordCodec(
+        record_format=chat_history.record_format,
+        compress_threshold=chat_history.compress_threshold_bytes,
+    )
+
+    if chat_history.storage == "redis":
+        return RedisChatSessionStorage(
+            redis_config=chat_history.redis,
+            cache_config=chat_history.cache,
+            codec=codec,
+            lifecycle_config=chat_history.lifecycle,
+            write_behind_config=chat_history.write_behind,
+        )
+
+    if chat_history.storage == "sqlite":
+        return SqliteChatSessionStorage(
+            sqlite_config=chat_history.sqlite,
+            cache_config=chat_history.cache,
+            codec=codec,
+        )
+
+    return MemChatSessionStorage(
+        max_bytes=chat_history.mem.max_bytes,
+        max_records=chat_history.mem.max_records,
+        idle_ttl=chat_history.mem.idle_ttl_seconds,
+    )
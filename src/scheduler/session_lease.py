@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+import redis.asyncio as redis
+
+from ..config.config import RedisConfig
+from ..metrics import registry
+from ..repository.redis_client import get_redis_client
+
+_lease_results = registry.counter(
+    "session_lease_acquisitions_total",
+    "Attempts to take or extend the lease of a session, by result.",
+    label_names=("result",),
+)
+_leases_lost = registry.counter(
+    "session_leases_lost_total",
+    "Leases that expired or were taken over while a turn was running.",
+)
+_leases_held = registry.gauge(
+    "session_leases_held", "Sessions this replica currently holds the lease of."
+)
+
+# Takes the lease if it is free or already ours, and (re)sets its expiry.
+#
+# KEYS: lease
+# ARGV: replica ID, TTL in milliseconds
+_ACQUIRE_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner and owner ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+# Deletes the lease, unless another replica has taken it over meanwhile.
+#
+# KEYS: lease
+# ARGV: replica ID
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SessionLeases:
+    """
+    Redis-backed leases that make exactly one replica the owner of a session.
+
+    A replica answers a session only while it holds the session's lease. The
+    lease is taken on the first message, kept alive while a turn runs and
+    otherwise left to expire after the TTL, so that the owner keeps a busy
+    thread and another replica takes it over once the owner stops renewing,
+    e.g. because it died.
+    """
+
+    def __init__(
+        self,
+        redis_config: RedisConfig,
+        replica_id: str,
+        ttl_ms: int,
+        key_prefix: str = "session_lease:",
+    ):
+        self._client = get_redis_client(redis_config)
+        self._acquire_script = self._client.register_script(_ACQUIRE_SCRIPT)
+        self._release_script = self._client.register_script(_RELEASE_SCRIPT)
+        self._key_prefix = key_prefix
+        self._replica_id = replica_id
+        self._ttl_ms = ttl_ms
+
+        # session ID -> monotonic time until which the lease is surely ours
+        self._held: Dict[str, float] = {}
+        # Sessions with a turn running, whose leases are renewed.
+        self._active: Counter[str] = Counter()
+        self._renew_task: asyncio.Task | None = None
+
+        _leases_held.set_function(lambda: len(self._held))
+
+    @property
+    def replica_id(self) -> str:
+        return self._replica_id
+
+    async def start(self) -> None:
+        self._renew_task = asyncio.create_task(self._renew())
+        logging.info(f"Holding session leases as replica {self._replica_id}.")
+
+    async def stop(self) -> None:
+        """
+        Stops renewing and hands every held lease back, so that other
+        replicas can take the sessions over right away.
+        """
+        if self._renew_task is not None:
+            self._renew_task.cancel()
+            try:
+                await self._renew_task
+            except asyncio.CancelledError:
+                pass
+            self._renew_task = None
+
+        if not self._held:
+            return
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                for session_id in self._held:
+                    await self._release_script(
+                        keys=[self._key(session_id)],
+                        args=[self._replica_id],
+                        client=pipe,
+                    )
+                await pipe.execute()
+        except redis.RedisError as e:
+            logging.warning(f"Failed to release {len(self._held)} session leases: {e}")
+        self._held.clear()
+
+    async def release(self, session_id: str) -> None:
+        """
+        Hands the lease back early, unless another replica already has it.
+        """
+        self._held.pop(session_id, None)
+        await self._release_script(
+            keys=[self._key(session_id)], args=[self._replica_id]
+        )
+
+    async def acquire(self, session_id: str) -> bool:
+        """
+        Returns whether this replica owns the session, taking or extending
+        its lease if needed. Leases far from expiry are checked without I/O.
+        """
+        now = time.monotonic()
+        if self._held.get(session_id, 0.0) - now > self._ttl_ms / 2000:
+            return True
+
+        try:
+            acquired = await self._acquire_script(
+                keys=[self._key(session_id)], args=[self._replica_id, self._ttl_ms]
+            )
+        except redis.RedisError as e:
+            # Without Redis no replica can tell who owns the session, so none
+            # should answer rather than all of them.
+            logging.warning(f"Failed to acquire the lease of session {session_id}: {e}")
+            _lease_results.inc(result="error")
+            return False
+
+        if acquired:
+            self._held[session_id] = now + self._ttl_ms / 1000
+            _lease_results.inc(result="acquired")
+            return True
+
+        self._held.pop(session_id, None)
+        _lease_results.inc(result="contended")
+        return False
+
+    @asynccontextmanager
+    async def hold(self, session_id: str) -> AsyncIterator[None]:
+        """
+        Keeps the lease of the session alive for as long as the block runs.
+        """
+        self._active[session_id] += 1
+        try:
+            yield
+        finally:
+            self._active[session_id] -= 1
+            if self._active[session_id] <= 0:
+                del self._active[session_id]
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(self._ttl_ms / 3000)
+            now = time.monotonic()
+            for session_id in [s for s, t in self._held.items() if t <= now]:
+                del self._held[session_id]
+
+            session_ids = list(self._active)
+            if not session_ids:
+                continue
+            try:
+                async with self._client.pipeline(transaction=False) as pipe:
+                    for session_id in session_ids:
+                        await self._acquire_script(
+                            keys=[self._key(session_id)],
+                            args=[self._replica_id, self._ttl_ms],
+                            client=pipe,
+                        )
+                    results = await pipe.execute()
+            except redis.RedisError as e:
+                logging.warning(f"Failed to renew {len(session_ids)} session leases: {e}")
+                continue
+
+            for session_id, renewed in zip(session_ids, results):
+                if renewed:
+                    self._held[session_id] = now + self._ttl_ms / 1000
+                elif self._held.pop(session_id, None) is not None:
+                    _leases_lost.inc()
+                    logging.warning(
+                        f"Lost the lease of session {session_id} to another replica."
+                    )
+
+    def _key(self, session_id: str) -> str:
+        return f"{self._key_prefix}{session_id}"
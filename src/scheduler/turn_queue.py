@@ -0,0 +1,201 @@
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+import redis.asyncio as redis
+
+from ..config.config import RedisConfig
+from ..metrics import registry
+from ..repository.redis_client import get_redis_client
+
+_enqueued_jobs = registry.counter(
+    "turn_jobs_enqueued_total", "Turn jobs handed to the workers."
+)
+_acked_jobs = registry.counter(
+    "turn_jobs_acked_total", "Turn jobs acknowledged by a worker."
+)
+_claimed_jobs = registry.counter(
+    "turn_jobs_redelivered_total",
+    "Unacknowledged turn jobs claimed again, e.g. from a worker that died.",
+)
+
+
+@dataclass
+class TurnJob:
+    # Stream entry ID, unique within the partition.
+    id: str
+    partition: int
+    session_id: str
+    guild_id: str
+    agent: str
+    channel_id: str
+    user_id: str
+    content: str
+    # Wall-clock time, since the job crosses processes.
+    enqueued_at: float
+
+    @staticmethod
+    def _decode(partition: int, entry_id: bytes, fields: Dict[bytes, bytes]) -> "TurnJob":
+        values = {key.decode(): value.decode() for key, value in fields.items()}
+        return TurnJob(
+            id=entry_id.decode(),
+            partition=partition,
+            session_id=values["session_id"],
+            guild_id=values["guild_id"],
+            agent=values["agent"],
+            channel_id=values["channel_id"],
+            user_id=values["user_id"],
+            content=values["content"],
+            enqueued_at=float(values["enqueued_at"]),
+        )
+
+
+class TurnQueue:
+    """
+    Durable queue of turn jobs between the gateway and the workers, on Redis
+    Streams.
+
+    Jobs are spread over a fixed number of partition streams by session, so
+    that all jobs of a session sit in one stream, in order. Every partition
+    has one consumer group; a job stays pending until a worker acknowledges
+    it, and is claimed again by whichever worker owns the partition next if
+    its worker dies first.
+    """
+
+    def __init__(self, redis_config: RedisConfig, partitions: int):
+        self._client = get_redis_client(redis_config)
+        self._partitions = partitions
+        self._stream_prefix = "turn_jobs:"
+        self._group = "turn-workers"
+        self._workers_key = "turn_workers"
+
+    @property
+    def partitions(self) -> int:
+        return self._partitions
+
+    def partition_of(self, session_id: str) -> int:
+        # Stable across processes, unlike hash().
+        return zlib.crc32(session_id.encode()) % self._partitions
+
+    def stream(self, partition: int) -> str:
+        return f"{self._stream_prefix}{partition}"
+
+    async def enqueue(
+        self,
+        session_id: str,
+        guild_id: str,
+        agent: str,
+        channel_id: str,
+        user_id: str,
+        content: str,
+    ) -> None:
+        await self._client.xadd(
+            self.stream(self.partition_of(session_id)),
+            {
+                "session_id": session_id,
+                "guild_id": guild_id,
+                "agent": agent,
+                "channel_id": channel_id,
+                "user_id": user_id,
+                "content": content,
+                "enqueued_at": repr(time.time()),
+            },
+        )
+        _enqueued_jobs.inc()
+
+    async def create_groups(self) -> None:
+        for partition in range(self._partitions):
+            try:
+                await self._client.xgroup_create(
+                    self.stream(partition), self._group, id="0", mkstream=True
+                )
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def read(
+        self, consumer: str, partitions: Iterable[int], count: int, block_ms: int
+    ) -> List[TurnJob]:
+        """
+        Returns the next jobs of the given partitions that no worker has been
+        handed yet, waiting up to block_ms for some to arrive.
+        """
+        streams = {self.stream(partition): ">" for partition in partitions}
+        if not streams:
+            return []
+        response = await self._client.xreadgroup(
+            self._group, consumer, streams, count=count, block=block_ms
+        )
+        return [
+            TurnJob._decode(self._partition_of_stream(stream), entry_id, fields)
+            for stream, entries in response or []
+            for entry_id, fields in entries
+        ]
+
+    async def claim(self, consumer: str, partition: int, min_idle_ms: int) -> List[TurnJob]:
+        """
+        Takes over the jobs of the partition that were handed out but not
+        acknowledged for at least min_idle_ms, oldest first.
+        """
+        jobs = []
+        start_id = "0-0"
+        while True:
+            start_id, entries, *_ = await self._client.xautoclaim(
+                self.stream(partition),
+                self._group,
+                consumer,
+                min_idle_time=min_idle_ms,
+                start_id=start_id,
+            )
+            jobs.extend(
+                TurnJob._decode(partition, entry_id, fields)
+                for entry_id, fields in entries
+                # Entries deleted while pending come back empty.
+                if fields
+            )
+            if start_id in (b"0-0", "0-0"):
+                break
+        _claimed_jobs.inc(len(jobs))
+        return jobs
+
+    async def ack(self, jobs: Iterable[TurnJob]) -> None:
+        """
+        Acknowledges the jobs and deletes them, so that the streams only hold
+        jobs that are still to be answered.
+        """
+        by_stream: Dict[str, List[str]] = {}
+        for job in jobs:
+            by_stream.setdefault(self.stream(job.partition), []).append(job.id)
+        if not by_stream:
+            return
+
+        async with self._client.pipeline(transaction=True) as pipe:
+            for stream, ids in by_stream.items():
+                pipe.xack(stream, self._group, *ids)
+                pipe.xdel(stream, *ids)
+            await pipe.execute()
+        _acked_jobs.inc(sum(len(ids) for ids in by_stream.values()))
+
+    async def heartbeat(self, consumer: str) -> None:
+        await self._client.zadd(self._workers_key, {consumer: time.time()})
+
+    async def live_workers(self, timeout: float) -> int:
+        """
+        Counts the workers that sent a heartbeat within the timeout, and
+        forgets the others.
+        """
+        cutoff = time.time() - timeout
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self._workers_key, "-inf", cutoff)
+            pipe.zcard(self._workers_key)
+            _, live = await pipe.execute()
+        return live
+
+    async def leave(self, consumer: str) -> None:
+        await self._client.zrem(self._workers_key, consumer)
+
+    def _partition_of_stream(self, stream: bytes | str) -> int:
+        if isinstance(stream, bytes):
+            stream = stream.decode()
+        return int(stream[len(self._stream_prefix) :])
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List
+
+from ..metrics import registry
+
+_queued_turns = registry.gauge(
+    "scheduler_queued_turns", "Turns waiting for a worker, including coalesced ones."
+)
+_in_flight_turns = registry.gauge(
+    "scheduler_in_flight_turns", "Turns currently being processed."
+)
+_rejected_turns = registry.counter(
+    "scheduler_rejected_turns_total", "Messages rejected because the queue was full."
+)
+_queue_wait = registry.histogram(
+    "scheduler_queue_wait_seconds", "Time a turn waited before a worker picked it up."
+)
+_superseded_turns = registry.counter(
+    "scheduler_superseded_turns_total",
+    "Running turns aborted because a newer message arrived for the session.",
+)
+
+
+@dataclass
+class Turn:
+    session_id: str
+    guild_id: str
+    agent: str
+    # Everything that arrived for the session before a worker picked the turn
+    # up; these are answered together as a single turn.
+    payloads: List[Any] = field(default_factory=list)
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # Set when a newer message aborted the turn while it ran.
+    superseded: bool = False
+
+
+@dataclass
+class SubmitResult:
+    accepted: bool
+    # Turns that will be started before this one; 0 means it starts right away.
+    position: int = 0
+    coalesced: bool = False
+
+
+class TurnScheduler:
+    """
+    Runs conversation turns on a bounded pool of workers.
+
+    Each session has at most one turn in flight and one pending; messages that
+    arrive meanwhile are coalesced into the pending turn, so a session's turns
+    run in order. Ready sessions are served round-robin, first across guilds
+    and then across the sessions of a guild, so a busy guild or thread cannot
+    starve the others.
+
+    With latest_message_wins, a message for a session whose turn is running
+    cancels that turn instead, and the next turn answers from there; the
+    cancelled turn sees a CancelledError and has `superseded` set.
+    """
+
+    def __init__(
+        self,
+        run_turn: Callable[[Turn], Awaitable[None]],
+        max_workers: int,
+        max_queued_turns: int,
+        latest_message_wins: bool = False,
+    ):
+        self._run_turn = run_turn
+        self._max_workers = max_workers
+        self._max_queued_turns = max_queued_turns
+        self._latest_message_wins = latest_message_wins
+
+        self._pending: Dict[str, Turn] = {}
+        self._running: Dict[str, Turn] = {}
+        # session ID -> worker running its turn
+        self._running_workers: Dict[str, asyncio.Task] = {}
+        # guild ID -> sessions whose pending turn may start now
+        self._ready: OrderedDict[str, Deque[str]] = OrderedDict()
+        self._ready_count = asyncio.Semaphore(0)
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def queued_turns(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"turn-worker-{i}")
+            for i in range(self._max_workers)
+        ]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(
+        self, session_id: str, guild_id: str, agent: str, payload: Any
+    ) -> SubmitResult:
+        if self._latest_message_wins and session_id in self._running:
+            self._supersede(session_id)
+
+        pending = self._pending.get(session_id)
+        if pending is not None:
+            pending.payloads.append(payload)
+            return SubmitResult(accepted=True, position=self._position(session_id), coalesced=True)
+
+        if len(self._pending) >= self._max_queued_turns:
+            _rejected_turns.inc()
+            return SubmitResult(accepted=False)
+
+        self._pending[session_id] = Turn(
+            session_id=session_id,
+            guild_id=guild_id,
+            agent=agent,
+            payloads=[payload],
+        )
+        _queued_turns.set(len(self._pending))
+
+        # A session with a turn in flight becomes ready once that turn is done.
+        if session_id not in self._running:
+            self._make_ready(guild_id, session_id)
+        return SubmitResult(accepted=True, position=self._position(session_id))
+
+    def _supersede(self, session_id: str) -> None:
+        turn = self._running[session_id]
+        if turn.superseded:
+            return
+        turn.superseded = True
+        # The worker is inside run_turn, its only await while a turn runs.
+        self._running_workers[session_id].cancel()
+        _superseded_turns.inc()
+        logging.info(f"Superseding the running turn of session {session_id}.")
+
+    def _make_ready(self, guild_id: str, session_id: str) -> None:
+        self._ready.setdefault(guild_id, deque()).append(session_id)
+        self._ready_count.release()
+
+    def _position(self, session_id: str) -> int:
+        idle_workers = self._max_workers - len(self._running)
+        if session_id in self._running:
+            # Waits for the session's running turn however many workers are
+            # idle, then queues behind whatever they have not picked up.
+            ready = sum(len(sessions) for sessions in self._ready.values())
+            return 1 + max(ready - idle_workers, 0)
+
+        ahead = 0
+        for sessions in self._ready.values():
+            if session_id in sessions:
+                ahead += sessions.index(session_id)
+                break
+            ahead += len(sessions)
+        return max(ahead + 1 - idle_workers, 0)
+
+    def _next_turn(self) -> Turn:
+        guild_id, sessions = next(iter(self._ready.items()))
+        session_id = sessions.popleft()
+        if sessions:
+            self._ready.move_to_end(guild_id)
+        else:
+            del self._ready[guild_id]
+        return self._pending.pop(session_id)
+
+    async def _work(self) -> None:
+        while True:
+            await self._ready_count.acquire()
+            turn = self._next_turn()
+            self._running[turn.session_id] = turn
+            _queued_turns.set(len(self._pending))
+            _in_flight_turns.set(len(self._running))
+            _queue_wait.observe(time.monotonic() - turn.enqueued_at)
+
+            worker = asyncio.current_task()
+            self._running_workers[turn.session_id] = worker
+            try:
+                await self._run_turn(turn)
+            except asyncio.CancelledError:
+                if not turn.superseded:
+                    raise
+            except Exception as e:
+                logging.exception(f"Turn for session {turn.session_id} failed: {e}")
+            finally:
+                # Only the turn was cancelled, not the worker, unless it is
+                # being stopped as well.
+                if turn.superseded and worker.cancelling():
+                    worker.uncancel()
+                del self._running_workers[turn.session_id]
+                del self._running[turn.session_id]
+                _in_flight_turns.set(len(self._running))
+                pending = self._pending.get(turn.session_id)
+                if pending is not None:
+                    self._make_ready(pending.guild_id, pending.session_id)
+            if worker.cancelling():
+                raise asyncio.CancelledError()
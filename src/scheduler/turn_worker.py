@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import math
+from contextlib import AsyncExitStack
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+
+import redis.asyncio as redis
+
+from ..metrics import registry
+from .session_lease import SessionLeases
+from .turn_queue import TurnJob, TurnQueue
+from .turn_scheduler import Turn, TurnScheduler
+
+_ACK_ATTEMPTS = 3
+_ACK_RETRY_DELAY_SECONDS = 0.5
+
+_owned_partitions = registry.gauge(
+    "turn_worker_partitions", "Turn job partitions this worker consumes."
+)
+
+
+class TurnWorker:
+    """
+    Consumes turn jobs from a TurnQueue and runs them on a TurnScheduler.
+
+    Each partition is consumed by one worker at a time, the holder of the
+    partition's lease, so the jobs of a session are started in order and
+    coalesced like in-process turns. Workers split the partitions evenly
+    between the live ones; a worker that takes over a partition first claims
+    the jobs its previous owner left unacknowledged. A job is acknowledged
+    once its turn is over, whether it succeeded, failed or was superseded,
+    but not when the worker stops in the middle of it.
+    """
+
+    def __init__(
+        self,
+        queue: TurnQueue,
+        partition_leases: SessionLeases,
+        run_turn: Callable[[Turn], Awaitable[None]],
+        max_workers: int,
+        max_queued_turns: int,
+        rebalance_interval: float,
+        reclaim_after_ms: int,
+        latest_message_wins: bool = False,
+    ):
+        self._queue = queue
+        self._leases = partition_leases
+        self._run_turn = run_turn
+        self._consumer = partition_leases.replica_id
+        self._max_queued_turns = max_queued_turns
+        self._rebalance_interval = rebalance_interval
+        self._reclaim_after_ms = reclaim_after_ms
+
+        self._scheduler = TurnScheduler(
+            run_turn=self._run_jobs,
+            max_workers=max_workers,
+            max_queued_turns=max_queued_turns,
+            latest_message_wins=latest_message_wins,
+        )
+        # partition -> keeps its lease renewed while the partition is owned
+        self._owned: Dict[int, AsyncExitStack] = {}
+        # Jobs submitted to the scheduler and not yet acknowledged, as
+        # (partition, ID) since entry IDs are only unique within a stream.
+        self._in_flight: Set[Tuple[int, str]] = set()
+        # Acknowledgements still being written, which outlive their turn.
+        self._acking: Set[asyncio.Task] = set()
+        self._tasks: List[asyncio.Task] = []
+        # Held while reading, so that no partition is handed back with jobs
+        # delivered to this worker but not yet submitted.
+        self._reading = asyncio.Lock()
+
+        _owned_partitions.set_function(lambda: len(self._owned))
+
+    async def start(self) -> None:
+        await self._queue.create_groups()
+        self._scheduler.start()
+        await self._rebalance()
+        self._tasks = [
+            asyncio.create_task(self._keep_balanced(), name="turn-worker-balance"),
+            asyncio.create_task(self._consume(), name="turn-worker-consume"),
+        ]
+        logging.info(
+            f"Turn worker {self._consumer} consuming {len(self._owned)} of "
+            f"{self._queue.partitions} partitions."
+        )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Unfinished turns stay unacknowledged for the next owner to redo.
+        await self._scheduler.stop()
+        await asyncio.gather(*self._acking)
+        # The leases themselves go back with SessionLeases.stop, which the
+        # caller awaits once the chat history is flushed.
+        for stack in self._owned.values():
+            await stack.aclose()
+        self._owned.clear()
+        await self._queue.leave(self._consumer)
+
+    async def _run_jobs(self, turn: Turn) -> None:
+        jobs: List[TurnJob] = turn.payloads
+        try:
+            await self._run_turn(turn)
+        except asyncio.CancelledError:
+            # A superseded turn is over, its messages are answered by the next
+            # one; one cut off by a shutdown is redone by the next owner.
+            if turn.superseded:
+                await self._ack(jobs)
+            raise
+        except Exception:
+            # Like an in-process turn, a failed one is dropped rather than
+            # retried, which would most likely fail the same way.
+            await self._ack(jobs)
+            raise
+        else:
+            await self._ack(jobs)
+        finally:
+            for job in jobs:
+                self._in_flight.discard((job.partition, job.id))
+
+    async def _ack(self, jobs: List[TurnJob]) -> None:
+        # Shielded, so that a turn superseded just as it ends is still
+        # acknowledged rather than answered twice.
+        task = asyncio.create_task(self._ack_with_retries(jobs))
+        self._acking.add(task)
+        task.add_done_callback(self._acking.discard)
+        await asyncio.shield(task)
+
+    async def _ack_with_retries(self, jobs: List[TurnJob]) -> None:
+        for attempt in range(_ACK_ATTEMPTS):
+            try:
+                await self._queue.ack(jobs)
+                return
+            except redis.RedisError as e:
+                if attempt + 1 == _ACK_ATTEMPTS:
+                    logging.error(
+                        f"Failed to acknowledge {len(jobs)} turn jobs, "
+                        f"they will be answered again: {e}"
+                    )
+                    return
+                await asyncio.sleep(_ACK_RETRY_DELAY_SECONDS * 2**attempt)
+
+    def _submit(self, jobs: List[TurnJob]) -> None:
+        for job in jobs:
+            if (job.partition, job.id) in self._in_flight:
+                continue
+            result = self._scheduler.submit(
+                session_id=job.session_id,
+                guild_id=job.guild_id,
+                agent=job.agent,
+                payload=job,
+            )
+            # Rejected jobs stay pending and are claimed again later.
+            if result.accepted:
+                self._in_flight.add((job.partition, job.id))
+
+    async def _consume(self) -> None:
+        while True:
+            room = self._max_queued_turns - self._scheduler.queued_turns
+            partitions = [
+                partition
+                for partition in self._owned
+                if await self._leases.acquire(self._queue.stream(partition))
+            ]
+            if room <= 0 or not partitions:
+                await asyncio.sleep(0.05 if partitions else self._rebalance_interval)
+                continue
+            async with self._reading:
+                try:
+                    jobs = await self._queue.read(
+                        self._consumer, partitions, count=room, block_ms=1000
+                    )
+                except redis.RedisError as e:
+                    logging.warning(f"Failed to read turn jobs: {e}")
+                    jobs = None
+                else:
+                    # Jobs of a partition lost meanwhile are left to its next
+                    # owner, which claims them.
+                    self._submit([job for job in jobs if job.partition in self._owned])
+            if jobs is None:
+                await asyncio.sleep(1)
+
+    async def _keep_balanced(self) -> None:
+        while True:
+            await asyncio.sleep(self._rebalance_interval)
+            try:
+                await self._rebalance()
+            except redis.RedisError as e:
+                logging.warning(f"Failed to rebalance turn job partitions: {e}")
+
+    async def _rebalance(self) -> None:
+        await self._queue.heartbeat(self._consumer)
+        live = await self._queue.live_workers(timeout=3 * self._rebalance_interval)
+        target = math.ceil(self._queue.partitions / max(live, 1))
+
+        for partition in list(self._owned):
+            if not await self._leases.acquire(self._queue.stream(partition)):
+                logging.warning(f"Lost turn job partition {partition}.")
+                await self._owned.pop(partition).aclose()
+
+        for partition in range(self._queue.partitions):
+            if len(self._owned) >= target:
+                break
+            if partition in self._owned or not await self._leases.acquire(
+                self._queue.stream(partition)
+            ):
+                continue
+            # Whatever the previous owner left pending comes before new jobs.
+            self._submit(await self._queue.claim(self._consumer, partition, 0))
+            self._owned[partition] = stack = AsyncExitStack()
+            await stack.enter_async_context(
+                self._leases.hold(self._queue.stream(partition))
+            )
+            logging.info(f"Took over turn job partition {partition}.")
+
+        # Hand back surplus partitions once none of their jobs is running.
+        if len(self._owned) > target:
+            async with self._reading:
+                busy = {partition for partition, _ in self._in_flight}
+                for partition in [p for p in self._owned if p not in busy]:
+                    if len(self._owned) <= target:
+                        break
+                    await self._give_up(partition)
+
+        # Jobs that were rejected for lack of room are picked up again.
+        async with self._reading:
+            for partition in list(self._owned):
+                self._submit(
+                    await self._queue.claim(
+                        self._consumer, partition, self._reclaim_after_ms
+                    )
+                )
+
+    async def _give_up(self, partition: int) -> None:
+        await self._owned.pop(partition).aclose()
+        try:
+            await self._leases.release(self._queue.stream(partition))
+        except redis.RedisError as e:
+            logging.warning(f"Failed to release turn job partition {partition}: {e}")
+        logging.info(f"Handed back turn job partition {partition}.")
@@ -0,0 +1,11 @@
+from .exporter import BoundedBatchSpanProcessor
+from .sampler import GuildSampler
+from .tracing import Tracing, is_sampled, turn_span
+
+__all__ = [
+    "BoundedBatchSpanProcessor",
+    "GuildSampler",
+    "Tracing",
+    "is_sampled",
+    "turn_span",
+]
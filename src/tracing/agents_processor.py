@@ -0,0 +1,74 @@
+import json
+from typing import Any, Dict
+
+from agents.tracing import Span as AgentsSpan
+from agents.tracing import Trace, TracingProcessor
+from opentelemetry import trace
+from opentelemetry.trace import Span, Status, StatusCode
+
+
+def _attribute(value: Any) -> Any:
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return json.dumps(value, default=str)
+
+
+class AgentsTraceProcessor(TracingProcessor):
+    """
+    Mirrors the traces of the OpenAI agents SDK as OpenTelemetry spans, under
+    whatever span is current when the agent runs. This replaces the SDK's own
+    export to OpenAI.
+    """
+
+    def __init__(self, tracer: trace.Tracer):
+        self._tracer = tracer
+        # agents SDK trace or span ID -> OpenTelemetry span
+        self._spans: Dict[str, Span] = {}
+
+    def on_trace_start(self, agents_trace: Trace) -> None:
+        current = trace.get_current_span()
+        # Nothing beneath an unsampled span is recorded, so do not create any.
+        self._spans[agents_trace.trace_id] = (
+            self._tracer.start_span(agents_trace.name)
+            if current.is_recording() or not current.get_span_context().is_valid
+            else current
+        )
+
+    def on_trace_end(self, agents_trace: Trace) -> None:
+        span = self._spans.pop(agents_trace.trace_id, None)
+        if span is not None:
+            span.end()
+
+    def on_span_start(self, agents_span: AgentsSpan[Any]) -> None:
+        parent = self._spans.get(agents_span.parent_id or agents_span.trace_id)
+        if parent is not None and not parent.is_recording():
+            self._spans[agents_span.span_id] = parent
+            return
+
+        data = agents_span.span_data
+        name = getattr(data, "name", None)
+        self._spans[agents_span.span_id] = self._tracer.start_span(
+            f"{data.type}: {name}" if name else data.type,
+            context=trace.set_span_in_context(parent) if parent is not None else None,
+        )
+
+    def on_span_end(self, agents_span: AgentsSpan[Any]) -> None:
+        span = self._spans.pop(agents_span.span_id, None)
+        if span is None:
+            return
+
+        # Exporting the span data is the expensive part; skip it for spans
+        # that were not sampled.
+        if span.is_recording():
+            for key, value in (agents_span.span_data.export() or {}).items():
+                if value is not None:
+                    span.set_attribute(f"agents.{key}", _attribute(value))
+            if agents_span.error:
+                span.set_status(Status(StatusCode.ERROR, agents_span.error["message"]))
+        span.end()
+
+    def shutdown(self) -> None:
+        pass
+
+    def force_flush(self) -> None:
+        pass
@@ -0,0 +1,122 @@
+import logging
+import queue
+import threading
+import time
+from typing import List
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from ..metrics import registry
+
+_dropped_spans = registry.counter(
+    "tracing_dropped_spans_total",
+    "Spans dropped because the export queue was full.",
+)
+_exported_spans = registry.counter(
+    "tracing_exported_spans_total",
+    "Spans handed to the exporter, by result.",
+    label_names=("result",),
+)
+_export_latency = registry.histogram(
+    "tracing_export_seconds",
+    "Latency of exporting one batch of spans.",
+)
+
+
+class BoundedBatchSpanProcessor(SpanProcessor):
+    """
+    Queues finished spans and exports them in batches from a background
+    thread. The queue is bounded: when the exporter falls behind, new spans
+    are dropped rather than making the code that ends them wait.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        max_queue_size: int = 2048,
+        max_export_batch_size: int = 256,
+        export_interval: float = 5.0,
+    ):
+        self._exporter = exporter
+        self._max_export_batch_size = max_export_batch_size
+        self._export_interval = export_interval
+        self._queue: queue.Queue[ReadableSpan] = queue.Queue(maxsize=max_queue_size)
+        self._stopping = threading.Event()
+        self._worker = threading.Thread(
+            target=self._export_loop, name="span-exporter", daemon=True
+        )
+        self._worker.start()
+
+    def on_start(self, span: Span, parent_context: Context | None = None) -> None:
+        pass
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if not span.context.trace_flags.sampled:
+            return
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            _dropped_spans.inc()
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        self._worker.join()
+        self._exporter.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        deadline = time.monotonic() + timeout_millis / 1000
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _export_loop(self) -> None:
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._export(batch)
+
+        # Export what is left on shutdown.
+        while batch := self._drain():
+            self._export(batch)
+
+    def _next_batch(self) -> List[ReadableSpan]:
+        # Wait for a full batch or for the interval to pass, whichever is first.
+        deadline = time.monotonic() + self._export_interval
+        batch: List[ReadableSpan] = []
+        while len(batch) < self._max_export_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or self._stopping.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(timeout, 0.5)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _drain(self) -> List[ReadableSpan]:
+        batch: List[ReadableSpan] = []
+        while len(batch) < self._max_export_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _export(self, batch: List[ReadableSpan]) -> None:
+        start = time.perf_counter()
+        try:
+            result = self._exporter.export(batch)
+        except Exception as e:
+            logging.warning(f"Failed to export {len(batch)} spans: {e}")
+            result = SpanExportResult.FAILURE
+        _export_latency.observe(time.perf_counter() - start)
+        _exported_spans.inc(
+            len(batch),
+            result="success" if result == SpanExportResult.SUCCESS else "failure",
+        )
+        for _ in batch:
+            self._queue.task_done()
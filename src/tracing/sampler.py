@@ -0,0 +1,46 @@
+from typing import Dict, Sequence
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace.sampling import Decision, Sampler, SamplingResult
+from opentelemetry.trace import Link, SpanKind
+from opentelemetry.trace.span import TraceState
+from opentelemetry.util.types import Attributes
+
+GUILD_ID_ATTRIBUTE = "discord.guild_id"
+
+_TRACE_ID_LIMIT = (1 << 64) - 1
+
+
+class GuildSampler(Sampler):
+    """
+    Head sampler for root spans: keeps a trace with the ratio configured for
+    the guild in its `discord.guild_id` attribute, or with the default ratio.
+
+    Like TraceIdRatioBased, the decision is derived from the trace ID, so it
+    is the same wherever it is made.
+    """
+
+    def __init__(self, ratio: float, guild_ratios: Dict[int, float] | None = None):
+        self._ratio = ratio
+        self._guild_ratios = {str(g): r for g, r in (guild_ratios or {}).items()}
+
+    def should_sample(
+        self,
+        parent_context: Context | None,
+        trace_id: int,
+        name: str,
+        kind: SpanKind | None = None,
+        attributes: Attributes = None,
+        links: Sequence[Link] | None = None,
+        trace_state: TraceState | None = None,
+    ) -> SamplingResult:
+        ratio = self._ratio
+        if attributes and GUILD_ID_ATTRIBUTE in attributes:
+            ratio = self._guild_ratios.get(str(attributes[GUILD_ID_ATTRIBUTE]), ratio)
+
+        if trace_id & _TRACE_ID_LIMIT < round(ratio * (_TRACE_ID_LIMIT + 1)):
+            return SamplingResult(Decision.RECORD_AND_SAMPLE, attributes, trace_state)
+        return SamplingResult(Decision.DROP, None, trace_state)
+
+    def get_description(self) -> str:
+        return f"GuildSampler{{{self._ratio}, {len(self._guild_ratios)} overrides}}"
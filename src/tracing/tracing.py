@@ -0,0 +1,127 @@
+import base64
+import logging
+from contextlib import contextmanager
+from typing import Iterator
+
+from agents import set_trace_processors, set_tracing_disabled
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased
+
+from ..config.config import TracingConfig
+from .agents_processor import AgentsTraceProcessor
+from .exporter import BoundedBatchSpanProcessor
+from .sampler import GUILD_ID_ATTRIBUTE, GuildSampler
+
+_tracer = trace.get_tracer("discord-mcp")
+
+
+class Tracing:
+    """
+    Sends traces of the conversation turns to Langfuse over OTLP.
+
+    Each turn is a root span, sampled by the ratio of its guild; the spans of
+    the OpenAI agents SDK and of Google ADK beneath it follow that decision.
+    Without Langfuse credentials, or with tracing disabled, no spans are
+    recorded at all.
+    """
+
+    def __init__(
+        self, config: TracingConfig | None, exporter: SpanExporter | None = None
+    ):
+        self._config = config
+        self._exporter = exporter
+        self._provider: TracerProvider | None = None
+
+    @property
+    def enabled(self) -> bool:
+        if self._config is None or not self._config.enabled:
+            return False
+        langfuse = self._config.langfuse
+        return self._exporter is not None or bool(
+            langfuse.host and langfuse.public_key and langfuse.secret_key
+        )
+
+    def start(self) -> None:
+        if not self.enabled:
+            # The agents SDK traces to OpenAI by default; skip that work too.
+            set_tracing_disabled(True)
+            logging.info("Tracing is disabled.")
+            return
+
+        self._provider = TracerProvider(
+            sampler=ParentBased(
+                root=GuildSampler(
+                    ratio=self._config.sample_ratio,
+                    guild_ratios=self._config.guild_sample_ratios,
+                )
+            ),
+            resource=Resource.create({"service.name": "discord-mcp"}),
+        )
+        self._provider.add_span_processor(
+            BoundedBatchSpanProcessor(
+                exporter=self._exporter or self._create_langfuse_exporter(),
+                max_queue_size=self._config.max_queue_size,
+                max_export_batch_size=self._config.max_export_batch_size,
+                export_interval=self._config.export_interval_ms / 1000,
+            )
+        )
+        # Google ADK records its spans through the global provider.
+        trace.set_tracer_provider(self._provider)
+        set_trace_processors(
+            [AgentsTraceProcessor(self._provider.get_tracer("openai-agents"))]
+        )
+        logging.info(
+            f"Tracing {self._config.sample_ratio:.0%} of turns "
+            f"({len(self._config.guild_sample_ratios)} guild overrides)."
+        )
+
+    def stop(self) -> None:
+        if self._provider is None:
+            return
+
+        self._provider.shutdown()
+        self._provider = None
+
+    def _create_langfuse_exporter(self) -> SpanExporter:
+        # Only deployments that trace pay for importing the OTLP exporter.
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        langfuse = self._config.langfuse
+        auth = base64.b64encode(
+            f"{langfuse.public_key}:{langfuse.secret_key}".encode()
+        ).decode()
+        return OTLPSpanExporter(
+            endpoint=f"{langfuse.host.rstrip('/')}/api/public/otel/v1/traces",
+            headers={"Authorization": f"Basic {auth}"},
+            timeout=self._config.export_timeout_ms / 1000,
+        )
+
+
+def is_sampled() -> bool:
+    """
+    Whether the current turn is traced. Callers can skip building spans that
+    would be dropped anyway.
+    """
+    return trace.get_current_span().is_recording()
+
+
+@contextmanager
+def turn_span(agent: str, guild_id: str, session_id: str) -> Iterator[None]:
+    """
+    Wraps a conversation turn in a root span, which decides whether the turn
+    is sampled. A no-op when tracing is not started.
+    """
+    with _tracer.start_as_current_span(
+        "discord turn",
+        attributes={
+            GUILD_ID_ATTRIBUTE: guild_id,
+            "discord.session_id": session_id,
+            "llm.agent": agent,
+        },
+    ):
+        yield
@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+import discord
+
+from .config.config import load_config, load_mcp_server_config
+from .discord.turn_responder import TurnResponder
+from .llm.llm import LLMInteractor
+from .llm.mcp_server import MCPServerManager
+from .main import (
+    create_llm_agents,
+    get_replica_id,
+    import_llm_providers,
+    startup_phase,
+    warm_up_mcp_servers,
+)
+from .metrics import MetricsServer
+from .repository.redis_client import close_connection_pools
+from .repository.storage_factory import create_chat_session_storage
+from .scheduler.session_lease import SessionLeases
+from .scheduler.turn_queue import TurnJob, TurnQueue
+from .scheduler.turn_scheduler import Turn
+from .scheduler.turn_worker import TurnWorker
+from .tracing import Tracing
+
+
+class TurnJobRunner:
+    """
+    Answers the turns of queued jobs. Replies are posted through the Discord
+    REST API, as workers have no gateway connection.
+    """
+
+    def __init__(self, rest_client: discord.Client, responder: TurnResponder):
+        self._rest_client = rest_client
+        self._responder = responder
+
+    async def run(self, turn: Turn) -> None:
+        jobs: List[TurnJob] = turn.payloads
+        latest = jobs[-1]
+        # The job's clock is the gateway's; only the elapsed time carries over.
+        waited = max(time.time() - jobs[0].enqueued_at, 0.0)
+        await self._responder.respond(
+            agent=turn.agent,
+            guild_id=turn.guild_id,
+            channel=self._rest_client.get_partial_messageable(int(latest.channel_id)),
+            content="\n".join(job.content for job in jobs),
+            user_id=latest.user_id,
+            session_id=turn.session_id,
+            received_at=time.monotonic() - waited,
+            superseded=lambda: turn.superseded,
+        )
+
+
+async def main(args: argparse.Namespace):
+    with startup_phase("config"):
+        config = load_config()
+        mcp_server_config = load_mcp_server_config()
+    if not config.cluster.enabled:
+        raise ValueError("Turn workers need cluster.enabled, with the gateway in the gateway role.")
+
+    chat_history = config.llm.openai.chat_history if config.llm.openai else None
+    chat_session_storage = (
+        create_chat_session_storage(chat_history) if chat_history else None
+    )
+    mcp_server_manager = MCPServerManager(
+        mcp_server_config=mcp_server_config,
+        redis_config=chat_history.redis if chat_history else None,
+    )
+    metrics_server = (
+        MetricsServer(
+            host=config.metrics.host,
+            port=args.metrics_port or config.metrics.port,
+            path=config.metrics.path,
+        )
+        if config.metrics.enabled
+        else None
+    )
+    tracing = Tracing(config.tracing)
+
+    rest_client = discord.Client(intents=discord.Intents.none())
+    llm_agents: Dict[str, LLMInteractor] = {}
+    partition_leases = SessionLeases(
+        redis_config=config.cluster.redis,
+        replica_id=get_replica_id(config),
+        ttl_ms=config.cluster.lease_ttl_ms,
+        key_prefix="turn_job_partition_lease:",
+    )
+    turn_worker = TurnWorker(
+        queue=TurnQueue(config.cluster.redis, partitions=config.cluster.job_partitions),
+        partition_leases=partition_leases,
+        run_turn=TurnJobRunner(
+            rest_client, TurnResponder(llm_agents=llm_agents, config=config)
+        ).run,
+        max_workers=config.scheduler.max_concurrent_turns,
+        max_queued_turns=config.scheduler.max_queued_turns,
+        rebalance_interval=config.cluster.lease_ttl_ms / 3000,
+        reclaim_after_ms=config.cluster.job_reclaim_after_ms,
+        latest_message_wins=config.scheduler.latest_message_wins,
+    )
+
+    mcp_warm_up: asyncio.Task | None = None
+    try:
+        tracing.start()
+        mcp_warm_up = asyncio.create_task(warm_up_mcp_servers(mcp_server_manager))
+
+        with startup_phase("agents"):
+            await asyncio.gather(
+                asyncio.to_thread(import_llm_providers, config),
+                rest_client.login(config.discord.bot_token),
+                partition_leases.start(),
+                *([metrics_server.start()] if metrics_server is not None else []),
+                *([chat_session_storage.start()] if chat_session_storage else []),
+            )
+            for agent in create_llm_agents(
+                config, mcp_server_manager, chat_session_storage
+            ):
+                llm_agents[agent.get_name()] = agent
+            await asyncio.gather(*(agent.start() for agent in llm_agents.values()))
+
+        await turn_worker.start()
+        await asyncio.Event().wait()
+    except asyncio.CancelledError:
+        logging.info("Shutting down gracefully...")
+        if mcp_warm_up is not None:
+            mcp_warm_up.cancel()
+        await turn_worker.stop()
+        await mcp_server_manager.stop()
+        await asyncio.gather(*(agent.stop() for agent in llm_agents.values()))
+        if chat_session_storage is not None:
+            await chat_session_storage.flush()
+            await chat_session_storage.close()
+        await partition_leases.stop()
+        await rest_client.close()
+        await close_connection_pools()
+        tracing.stop()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        logging.info("All servers closed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs turns queued by a bot in the gateway role."
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="overrides metrics.port, for several workers on one host",
+    )
+    asyncio.run(main(parser.parse_args()))